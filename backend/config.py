@@ -16,6 +16,8 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     DEBUG: bool = True
+    WARMUP_ON_STARTUP: bool = True  # Load models in the background right after startup
+    PREFORK_MEMORY_REPORT_SECONDS: float = 300  # How often `manage.py serve` logs per-worker memory (0 disables)
     
     # CORS Settings
     cors_origins_str: str = Field(default="http://localhost:3000,http://localhost:3001,http://127.0.0.1:3000", alias="CORS_ORIGINS")
@@ -27,6 +29,8 @@ class Settings(BaseSettings):
     # File Upload Settings
     UPLOAD_DIR: Path = Path(__file__).parent / "uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes read per write while streaming uploads to disk
+    ORPHAN_GRACE_SECONDS: int = 3600  # Unregistered uploads younger than this are never treated as orphans (uploads in flight)
     allowed_extensions_str: str = Field(default=".pdf,.txt,.docx,.xlsx", alias="ALLOWED_EXTENSIONS")
     
     @property
@@ -35,13 +39,85 @@ class Settings(BaseSettings):
     
     # ChromaDB Settings
     CHROMA_DB_DIR: Path = Path(__file__).parent / "chroma_db"
+    DOCUMENT_REGISTRY_PATH: Path = Path(__file__).parent / "chroma_db" / "documents.sqlite3"
     COLLECTION_NAME: str = "business_documents"
     
     # AI Model Settings
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "sentence-transformers"  # sentence-transformers (fp32) | int8 (dynamic quantized torch) | onnx (ONNX Runtime)
+    EMBEDDING_BATCH_SIZE: int = 64  # Texts per embedding forward pass (sorted by length within each call)
+    EMBEDDING_THREADS: int = 0  # Intra-op threads for embedding (0 = library default)
     LLM_MODEL: str = "gpt-3.5-turbo"  # Can be changed to local models
+    LOCAL_LLM_MODEL: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"  # Local model used for generation
+    LLM_BACKEND: str = "transformers"  # transformers (fp32) | int8 (dynamic quantized torch) | onnx (ONNX Runtime, KV-cache)
+    LLM_ARTIFACT_DIR: Path = Path(__file__).parent / "models"  # Converted int8/onnx models (python manage.py convert-llm)
+    LLM_THREADS: int = 0  # Intra-op threads per process for generation (0 = library default)
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    QUERY_EMBEDDING_CACHE_MB: float = 32  # Memory cap for cached query vectors
+    SEARCH_MODE: str = "hybrid"  # vector | lexical (BM25, no embedding) | hybrid (reciprocal rank fusion)
+    HYBRID_CANDIDATE_MULTIPLIER: int = 3  # Candidates per ranking = k * multiplier
+    HYBRID_RRF_K: int = 60  # Reciprocal rank fusion constant
+    
+    # Ingestion Settings
+    PDF_EXTRACT_PROCESSES: int = min(os.cpu_count() or 1, 4)  # Process pool size for PDF extraction
+    PDF_PAGES_PER_TASK: int = 16  # Pages extracted per process-pool task
+    INGEST_WORKERS: int = 2  # Documents ingested in parallel
+    INGEST_EMBED_BATCH_SIZE: int = 64  # Chunks embedded and inserted per batch
+    INGEST_JOB_RETENTION_SECONDS: int = 3600  # How long finished jobs stay queryable
+    BULK_EMBED_BATCH_SIZE: int = 64 * min(os.cpu_count() or 1, 8)  # Chunks embedded and inserted per batch in bulk ingestion, shared across files (64 per CPU core, up to 512)
+    MAX_BULK_UPLOAD_SIZE: int = 500 * 1024 * 1024  # 500MB per bulk upload request, and in total across its files and extracted archive members
+    MAX_BULK_FILES: int = 1000  # Files per bulk upload request, counting archive members
+    
+    # Inference Settings
+    INFERENCE_WORKERS: int = 4  # Concurrent chat requests; keep >= GENERATION_MAX_BATCH_SIZE when batching
+    INFERENCE_QUEUE_SIZE: int = 16  # Requests allowed to wait for a worker
+    INFERENCE_RETRY_AFTER: int = 5  # Seconds suggested to clients on 503
+    GENERATION_BATCHING: bool = True  # Generate concurrent requests together
+    GENERATION_MAX_BATCH_SIZE: int = 4
+    GENERATION_MAX_WAIT_MS: int = 20  # How long a request waits for others to join its batch
+    INFERENCE_MODE: str = "local"  # local (LLM in each API worker) | remote (separate processes, python manage.py inference)
+    INFERENCE_PROCESSES: int = 1  # Inference processes started by `manage.py inference`
+    INFERENCE_SOCKET_DIR: Path = Path(__file__).parent / "run"  # Unix sockets of the inference processes
+    INFERENCE_REQUEST_TIMEOUT_SECONDS: float = 120  # Longest generation before it is cancelled (and its process restarted)
+    INFERENCE_HEALTH_INTERVAL_SECONDS: float = 5  # Seconds between supervisor health checks
+    
+    # Response Cache Settings
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_SEMANTIC: bool = False  # Also match near-duplicate query embeddings
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    
+    # Chat Sessions
+    SESSION_STORE: str = "memory"  # memory (single worker) | sqlite (shared by all workers on a node)
+    SESSION_DB_PATH: Path = Path(__file__).parent / "sessions.sqlite3"
+    SESSION_TTL_SECONDS: int = 3600  # Idle time before a session expires (0 = never)
+    SESSION_MAX_COUNT: int = 10000  # Least recently used sessions are evicted beyond this
+    SESSION_MAX_MB: float = 64  # Memory cap for in-memory sessions
+    SESSION_MAX_MESSAGES: int = 200  # Messages kept per in-memory session
+    
+    # Conversation Settings
+    CONVERSATIONAL_MODE: bool = True  # Use recent turns for retrieval and in the prompt
+    HISTORY_MAX_MESSAGES: int = 10  # Recent messages considered per request
+    HISTORY_TOKEN_BUDGET: int = 384  # Maximum history tokens included in a prompt
+    CONDENSE_MAX_TURNS: int = 1  # Previous user turns prepended to follow-up retrieval queries
+    RETRIEVAL_TOP_K: int = 4  # Candidate chunks retrieved per question
+    CONTEXT_TOKEN_BUDGET: int = 768  # Maximum retrieved-context tokens in a prompt
+    
+    # Answer Settings
+    ANSWER_MODE: str = "generate"  # generate (LLM) | extractive (best matching passage, no LLM) | auto (passage if confident, else LLM)
+    EXTRACTIVE_MIN_SCORE: float = 0.6  # Best sentence similarity needed to answer extractively in auto mode
+    EXTRACTIVE_MAX_SENTENCES: int = 3  # Longest extractive passage, in sentences
+    EXTRACTIVE_MAX_CHARS: int = 600  # Longest extractive passage, in characters
+    EXTRACTIVE_CACHE_SENTENCES: int = 10000  # Sentence vectors kept in memory for extractive answers (0 disables)
+    
+    # Reranking Settings
+    RERANK_ENABLED: bool = False  # Rerank a larger candidate pool with a cross-encoder
+    RERANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20  # Chunks retrieved for reranking
+    RERANK_BATCH_SIZE: int = 16  # Query/chunk pairs scored per batch
+    RERANK_MAX_LATENCY_MS: float = 300  # Keep retrieval order if reranking would take longer
     
     # Admin Settings
     ADMIN_USERNAME: str = "admin"
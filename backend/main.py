@@ -1,13 +1,66 @@
+import time
+
+# Measured before anything else is imported, for the startup report
+_import_started_at = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from routes import chat_routes, document_routes, admin_routes
 from config import settings
+from middleware import BodySizeLimitMiddleware, MULTIPART_OVERHEAD
+from services.startup import startup_tracker, PHASE_FAILED, PHASE_READY
+from services.vector_store import vector_store_service
+from services.chatbot import chatbot_service
+from services.document_processor import document_processor
+from services.inference_executor import inference_executor
+from services.ingestion import ingestion_service
+from services.document_registry import document_registry
+import asyncio
+import logging
 import uvicorn
 
+logger = logging.getLogger(__name__)
+
+# Models are loaded lazily, so this does not include torch/transformers
+startup_tracker.record("imports", time.perf_counter() - _import_started_at)
+
+def warm_up():
+    """Load the embedding model, vector store, reranker and LLM ahead of the first request."""
+    try:
+        vector_store_service.warm_up()
+        if document_registry.count() == 0:
+            # Documents ingested before the registry existed
+            document_registry.backfill(vector_store_service.iter_chunk_metadatas())
+    except Exception as e:
+        logger.error(f"Error warming up vector store: {e}")
+    if chatbot_service.reranker:
+        chatbot_service.reranker.warm_up()
+    chatbot_service.ensure_llm()
+    logger.info(f"Warm-up finished: {startup_tracker.report()}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background warm-up and stop worker pools on shutdown."""
+    warmup_task = None
+    if settings.WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    
+    yield
+    
+    if warmup_task and not warmup_task.done():
+        logger.info("Shutting down while warm-up is still running")
+    await asyncio.to_thread(ingestion_service.shutdown)
+    await asyncio.to_thread(inference_executor.shutdown)
+    await asyncio.to_thread(chatbot_service.shutdown)
+    await asyncio.to_thread(document_processor.shutdown)
+
 app = FastAPI(
     title="AI Chatbot API",
     description="AI-powered chatbot for business websites with RAG capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -19,6 +72,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cap upload bodies before FastAPI parses them
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/api/documents/upload": settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+        "/api/documents/bulk-upload": settings.MAX_BULK_UPLOAD_SIZE + MULTIPART_OVERHEAD,
+    }
+)
+
 # Include routers
 app.include_router(chat_routes.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(document_routes.router, prefix="/api/documents", tags=["Documents"])
@@ -36,6 +98,31 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Report model load state.
+    
+    Returns 200 once the embedding model and vector store are loaded and the
+    LLM has finished loading (or failed, in which case retrieval-only
+    answers are served), and 503 while anything is still loading.
+    """
+    llm_state = chatbot_service.llm_state
+    ready = vector_store_service.is_ready and llm_state in (PHASE_READY, PHASE_FAILED)
+    
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "loading",
+            "models": {
+                "embedding_model": startup_tracker.status("embedding_model"),
+                "vector_store": startup_tracker.status("vector_store"),
+                "llm": llm_state
+            },
+            "startup_phases": startup_tracker.report()
+        }
+    )
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,259 @@
+"""
+Maintenance commands.
+
+Usage:
+    python manage.py reconcile [--fix]
+    python manage.py ingest <directory> [--recursive] [--batch-size N]
+    python manage.py convert-llm [--backend int8|onnx] [--model NAME] [--force]
+    python manage.py check-embeddings [--backend int8|onnx] [--sample N]
+    python manage.py serve [--workers N] [--no-preload] [--host HOST] [--port PORT]
+    python manage.py inference
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+logger = logging.getLogger("manage")
+
+
+def reconcile(args: argparse.Namespace) -> int:
+    """Report (and optionally repair) drift between uploads, the registry and the vector store."""
+    from services.maintenance import reconcile_storage
+
+    report = reconcile_storage(fix=args.fix)
+    print(json.dumps(report, indent=2))
+    drift = report["orphan_files"] or report["missing_files"] or report["size_mismatches"]
+    return 1 if drift and not args.fix else 0
+
+
+def ingest(args: argparse.Namespace) -> int:
+    """Ingest every supported document (and zip archive) in a directory as one bulk job."""
+    from config import settings
+    from services.document_processor import document_processor
+    from services.ingestion import ingestion_service
+
+    directory = Path(args.directory)
+    if not directory.is_dir():
+        print(f"Not a directory: {directory}", file=sys.stderr)
+        return 2
+
+    pattern = "**/*" if args.recursive else "*"
+    accepted = []
+    rejected = []
+    for path in sorted(directory.glob(pattern)):
+        if not path.is_file() or path.name.startswith('.'):
+            continue
+        extension = path.suffix.lower()
+        try:
+            if extension == '.zip':
+                stored, skipped, _ = document_processor.extract_archive(path)
+                accepted.extend(stored)
+                rejected.extend(skipped)
+            elif extension in settings.ALLOWED_EXTENSIONS:
+                with open(path, 'rb') as source:
+                    file_id, file_path, sha256 = document_processor.store_stream(source, path.name)
+                accepted.append((file_id, file_path, path.name, sha256))
+        except Exception as e:
+            rejected.append({"filename": path.name, "reason": str(e)})
+
+    if not accepted:
+        print("No supported documents found", file=sys.stderr)
+        return 1
+
+    if args.batch_size:
+        ingestion_service.bulk_embed_batch_size = args.batch_size
+
+    def report(job):
+        finished = job.files_completed + job.files_failed
+        eta = job.eta_seconds()
+        print(
+            f"[{finished}/{len(job.files)}] {job.chunks_embedded} chunks"
+            + (f", ~{eta:.0f}s left" if eta else ""),
+            flush=True
+        )
+
+    job = ingestion_service.create_bulk_job(accepted, rejected)
+    try:
+        ingestion_service.run_bulk(job, progress=report)
+    finally:
+        document_processor.shutdown()
+
+    summary = job.to_dict()
+    summary["files"] = [f for f in summary["files"] if f["status"] != "completed"]
+    print(json.dumps(summary, indent=2, default=str))
+    return 1 if job.files_failed or job.status != "completed" else 0
+
+
+def convert_llm(args: argparse.Namespace) -> int:
+    """Convert the local LLM for a quantized or ONNX backend and cache it on disk."""
+    from config import settings
+    from services.llm_backends import convert
+
+    backend = args.backend or settings.LLM_BACKEND
+    if backend == "transformers":
+        print("LLM_BACKEND is transformers; pass --backend int8 or --backend onnx", file=sys.stderr)
+        return 2
+
+    path = convert(args.model or settings.LOCAL_LLM_MODEL, backend, settings.LLM_ARTIFACT_DIR, force=args.force)
+    print(path)
+    return 0
+
+
+def check_embeddings(args: argparse.Namespace) -> int:
+    """Compare an embedding backend with the fp32 baseline on stored chunks."""
+    from config import settings
+    from services.embeddings import EMBEDDING_BACKEND_DEFAULT, SentenceTransformerEmbeddings, compare_embeddings
+    from services.vector_store import vector_store_service
+
+    backend = args.backend or settings.EMBEDDING_BACKEND
+    if backend == EMBEDDING_BACKEND_DEFAULT:
+        print("EMBEDDING_BACKEND is the fp32 baseline; pass --backend int8 or --backend onnx", file=sys.stderr)
+        return 2
+
+    texts = vector_store_service.collection.get(limit=args.sample, include=["documents"])["documents"]
+    if len(texts) < 2:
+        print("Need at least two stored chunks to compare; ingest some documents first", file=sys.stderr)
+        return 1
+
+    def encoder(name):
+        return SentenceTransformerEmbeddings(
+            settings.EMBEDDING_MODEL, name, settings.EMBEDDING_BATCH_SIZE, settings.EMBEDDING_THREADS
+        )
+
+    report = compare_embeddings(encoder(EMBEDDING_BACKEND_DEFAULT), encoder(backend), texts)
+    print(json.dumps(report, indent=2))
+    return 0 if report["cosine_mean"] >= args.min_cosine else 1
+
+
+def serve(args: argparse.Namespace) -> int:
+    """Run several workers that share model weights loaded once in the parent."""
+    from config import settings
+    from services.prefork import PreforkServer
+
+    # Import the app (and its services) once, so the workers inherit it
+    import main  # noqa: F401
+
+    def preload():
+        from services.chatbot import chatbot_service
+        from services.vector_store import vector_store_service
+
+        vector_store_service.preload_model()
+        chatbot_service.preload_model()
+
+    server = PreforkServer(
+        "main:app",
+        host=args.host or settings.HOST,
+        port=args.port or settings.PORT,
+        workers=args.workers,
+        preload=None if args.no_preload else preload,
+        memory_report_seconds=settings.PREFORK_MEMORY_REPORT_SECONDS
+    )
+    return server.run()
+
+
+def inference(args: argparse.Namespace) -> int:
+    """Run and supervise the INFERENCE_PROCESSES inference processes used with INFERENCE_MODE=remote."""
+    from config import settings
+    from services.inference_client import inference_socket_paths
+    from services.inference_server import InferenceSupervisor
+
+    supervisor = InferenceSupervisor(
+        inference_socket_paths(),
+        health_interval=settings.INFERENCE_HEALTH_INTERVAL_SECONDS,
+        request_timeout=settings.INFERENCE_REQUEST_TIMEOUT_SECONDS
+    )
+    return supervisor.run()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Business Assistant maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reconcile_parser = subparsers.add_parser(
+        "reconcile",
+        help="Check stored uploads, the document registry and the vector store for drift"
+    )
+    reconcile_parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="Delete orphan uploads, drop documents whose upload is missing and reset counters"
+    )
+    reconcile_parser.set_defaults(handler=reconcile)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest",
+        help="Ingest a folder of documents in one bulk job"
+    )
+    ingest_parser.add_argument("directory", help="Folder holding documents and/or .zip archives")
+    ingest_parser.add_argument("--recursive", action="store_true", help="Include subfolders")
+    ingest_parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Chunks embedded per batch (default: BULK_EMBED_BATCH_SIZE)"
+    )
+    ingest_parser.set_defaults(handler=ingest)
+
+    convert_parser = subparsers.add_parser(
+        "convert-llm",
+        help="Convert the local LLM for the int8 or onnx backend"
+    )
+    convert_parser.add_argument(
+        "--backend",
+        choices=["int8", "onnx"],
+        help="Backend to convert for (default: LLM_BACKEND)"
+    )
+    convert_parser.add_argument("--model", help="Model to convert (default: LOCAL_LLM_MODEL)")
+    convert_parser.add_argument("--force", action="store_true", help="Convert again even if cached")
+    convert_parser.set_defaults(handler=convert_llm)
+
+    check_parser = subparsers.add_parser(
+        "check-embeddings",
+        help="Compare an int8 or onnx embedding backend with the fp32 baseline"
+    )
+    check_parser.add_argument(
+        "--backend",
+        choices=["int8", "onnx"],
+        help="Backend to check (default: EMBEDDING_BACKEND)"
+    )
+    check_parser.add_argument("--sample", type=int, default=500, help="Stored chunks to compare")
+    check_parser.add_argument(
+        "--min-cosine",
+        type=float,
+        default=0.99,
+        help="Exit with 1 if the mean cosine similarity to the baseline is lower"
+    )
+    check_parser.set_defaults(handler=check_embeddings)
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Run several API workers sharing model weights loaded once before forking"
+    )
+    serve_parser.add_argument("--workers", type=int, default=2, help="Worker processes")
+    serve_parser.add_argument(
+        "--no-preload",
+        action="store_true",
+        help="Let each worker load its own models"
+    )
+    serve_parser.add_argument("--host", help="Address to bind (default: HOST)")
+    serve_parser.add_argument("--port", type=int, help="Port to bind (default: PORT)")
+    serve_parser.set_defaults(handler=serve)
+
+    inference_parser = subparsers.add_parser(
+        "inference",
+        help="Run the language model in separate, supervised processes (INFERENCE_MODE=remote)"
+    )
+    inference_parser.set_defaults(handler=inference)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
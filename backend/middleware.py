@@ -0,0 +1,88 @@
+from typing import Dict
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Allowance for multipart boundaries and part headers on top of the file data
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class RequestTooLargeError(Exception):
+    """Raised from receive() once a request body passes its limit."""
+
+
+class BodySizeLimitMiddleware:
+    """
+    Caps the request body size of upload endpoints before it is parsed.
+
+    FastAPI parses (and spools to disk) the whole multipart body before an
+    UploadFile handler runs, so a limit checked in the handler comes too
+    late. This ASGI middleware answers 413 straight away when Content-Length
+    is over the limit, and otherwise counts the body bytes as they are
+    received, so a missing or understated Content-Length is stopped as soon
+    as the limit is passed.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        """
+        Initialize the middleware.
+
+        Args:
+            app: ASGI app to wrap
+            limits: Maximum body size in bytes by request path
+        """
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise RequestTooLargeError()
+            return message
+
+        async def guarded_send(message):
+            # Drop whatever error response the app produced for the aborted body
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            logger.warning(f"Rejected {scope['path']} request: body over {limit} bytes")
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        body = json.dumps({"detail": f"Request body exceeds the maximum size of {limit} bytes"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
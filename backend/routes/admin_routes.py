@@ -2,7 +2,15 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from schemas import AdminLogin, AdminLoginResponse, AdminStats
 from config import settings
+from services.inference_executor import inference_executor
+from services.chatbot import chatbot_service
+from services.response_cache import response_cache
+from services.vector_store import vector_store_service
+from services.document_registry import document_registry
+from services.maintenance import reconcile_storage
+from services.prefork import process_memory
 from datetime import datetime, timedelta
+import asyncio
 import jwt
 import logging
 from pathlib import Path
@@ -79,22 +87,35 @@ async def get_admin_stats(username: str = Depends(verify_token)):
         AdminStats with system statistics
     """
     try:
-        # Count documents
-        total_documents = sum(1 for _ in settings.UPLOAD_DIR.glob("*") if _.is_file())
-        
-        # Calculate storage used
-        storage_bytes = sum(f.stat().st_size for f in settings.UPLOAD_DIR.glob("*") if f.is_file())
-        storage_mb = storage_bytes / (1024 * 1024)
+        # Count documents and storage from the registry's maintained counters
+        document_stats = document_registry.get_stats()
+        total_documents = document_stats["documents"]
+        storage_mb = document_stats["bytes"] / (1024 * 1024)
         storage_used = f"{storage_mb:.2f} MB"
         
-        # Get total chats (this would come from database in production)
-        total_chats = 0  # Placeholder
+        # Get total chats from the session store
+        total_chats = chatbot_service.session_store.count_sessions()
+        
+        # In remote mode this asks every inference process for its health
+        # over a socket, so keep it off the event loop
+        generation_metrics = (
+            await asyncio.to_thread(chatbot_service.batcher.get_metrics)
+            if chatbot_service.batcher else None
+        )
         
         return AdminStats(
             total_documents=total_documents,
             total_chats=total_chats,
             storage_used=storage_used,
-            last_updated=datetime.now()
+            last_updated=datetime.now(),
+            metrics={
+                "inference": inference_executor.get_metrics(),
+                "generation_batching": generation_metrics,
+                "response_cache": response_cache.get_metrics(),
+                "query_embedding_cache": vector_store_service.get_embedding_cache_metrics(),
+                "sessions": chatbot_service.session_store.get_metrics(),
+                "worker_memory": process_memory()
+            }
         )
         
     except Exception as e:
@@ -118,6 +139,25 @@ async def verify_admin_token(username: str = Depends(verify_token)):
         "message": "Token is valid"
     }
 
+@router.post("/reconcile")
+async def reconcile_documents(fix: bool = False, username: str = Depends(verify_token)):
+    """
+    Check stored uploads, the document registry and the vector store for drift.
+    
+    Args:
+        fix: Repair what is found (delete orphan uploads, drop documents whose
+            upload is missing, correct sizes and reset storage counters)
+        username: Verified admin username
+        
+    Returns:
+        Reconciliation report
+    """
+    try:
+        return await asyncio.to_thread(reconcile_storage, fix)
+    except Exception as e:
+        logger.error(f"Error reconciling documents: {e}")
+        raise HTTPException(status_code=500, detail="Error reconciling documents")
+
 @router.post("/change-password")
 async def change_admin_password(
     old_password: str,
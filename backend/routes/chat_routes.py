@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Optional
+from fastapi.responses import StreamingResponse
 from schemas import ChatMessage, ChatResponse
 from services.chatbot import chatbot_service
+from services.inference_executor import InferenceQueueFullError
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,7 +17,7 @@ async def send_message(chat_message: ChatMessage):
     Send a message to the chatbot and get a response.
     
     Args:
-        chat_message: ChatMessage with message and optional session_id
+        chat_message: ChatMessage with message, optional session_id and answer mode
         
     Returns:
         ChatResponse with answer, session_id, and sources
@@ -21,33 +25,111 @@ async def send_message(chat_message: ChatMessage):
     try:
         result = await chatbot_service.chat(
             message=chat_message.message,
-            session_id=chat_message.session_id
+            session_id=chat_message.session_id,
+            mode=chat_message.mode
         )
         
         return ChatResponse(
             response=result['response'],
             session_id=result['session_id'],
-            sources=result.get('sources', [])
+            sources=result.get('sources', []),
+            usage=result.get('usage')
         )
         
+    except InferenceQueueFullError as e:
+        logger.warning("Chat request rejected: inference queue is full")
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail="Error processing chat message")
 
+@router.post("/stream")
+async def stream_message(chat_message: ChatMessage, request: Request):
+    """
+    Send a message to the chatbot and stream the answer as Server-Sent Events.
+    
+    Events: "sources" (session_id and sources), "token" (generated text),
+    then "done" (full response) or "error".
+    
+    Args:
+        chat_message: ChatMessage with message, optional session_id and answer mode
+        request: Incoming request, used to detect client disconnects
+        
+    Returns:
+        StreamingResponse with a text/event-stream body
+    """
+    events = chatbot_service.stream_chat(
+        message=chat_message.message,
+        session_id=chat_message.session_id,
+        mode=chat_message.mode
+    )
+    
+    try:
+        # Pull the first event before responding, so a full queue is
+        # reported as a 503 instead of inside an already-started stream
+        first_event = await events.__anext__()
+    except InferenceQueueFullError as e:
+        logger.warning("Chat stream rejected: inference queue is full")
+        raise HTTPException(
+            status_code=503,
+            detail="The assistant is busy right now. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {e}")
+        await events.aclose()
+        raise HTTPException(status_code=500, detail="Error processing chat message")
+    
+    def format_event(event: dict) -> str:
+        return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    async def event_stream():
+        try:
+            yield format_event(first_event)
+            async for event in events:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping generation")
+                    break
+                yield format_event(event)
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/history/{session_id}")
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500)
+):
     """
-    Get chat history for a session.
+    Get chat history for a session, oldest first.
     
     Args:
         session_id: The session ID
+        offset: Number of messages to skip
+        limit: Maximum number of messages to return (all if omitted)
         
     Returns:
-        List of messages in the session
+        A page of messages in the session and the total message count
     """
     try:
-        history = chatbot_service.get_session_history(session_id)
-        return {"session_id": session_id, "history": history}
+        history = await chatbot_service.get_session_history(session_id, offset, limit)
+        return {
+            "session_id": session_id,
+            "history": history,
+            "total": await chatbot_service.count_session_messages(session_id),
+            "offset": offset,
+            "limit": limit
+        }
         
     except Exception as e:
         logger.error(f"Error getting chat history: {e}")
@@ -65,7 +147,7 @@ async def clear_session(session_id: str):
         Success message
     """
     try:
-        success = chatbot_service.clear_session(session_id)
+        success = await chatbot_service.clear_session(session_id)
         
         if success:
             return {"message": "Session cleared successfully", "session_id": session_id}
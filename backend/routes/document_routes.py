@@ -1,12 +1,19 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from fastapi.responses import JSONResponse
-from schemas import DocumentUploadResponse, DocumentListResponse, DocumentInfo, DocumentDeleteResponse
-from services.document_processor import document_processor
+from schemas import (
+    DocumentUploadResponse, DocumentListResponse, DocumentInfo, DocumentDeleteResponse,
+    IngestionJobStatus, BulkUploadResponse, BulkIngestionJobStatus
+)
+from services.document_processor import document_processor, UploadTooLargeError
 from services.vector_store import vector_store_service
+from services.ingestion import ingestion_service
+from services.document_registry import document_registry, SORT_FIELDS
 from config import settings
-from datetime import datetime
 import logging
 from pathlib import Path
+from typing import List, Optional
+import asyncio
+import zipfile
 
 logger = logging.getLogger(__name__)
 
@@ -15,13 +22,20 @@ router = APIRouter()
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(file: UploadFile = File(...)):
     """
-    Upload a document and add it to the vector store.
+    Upload a document and queue it for ingestion into the vector store.
+    
+    The file is saved and a job ID is returned immediately; extraction,
+    chunking and embedding run in the background. Poll
+    /api/documents/jobs/{job_id} for progress.
+    
+    The request body is capped by BodySizeLimitMiddleware before it is
+    parsed; the file itself is limited to MAX_UPLOAD_SIZE while saving.
     
     Args:
         file: The file to upload
         
     Returns:
-        DocumentUploadResponse with file details
+        DocumentUploadResponse with file details and the ingestion job ID
     """
     try:
         # Validate file extension
@@ -32,80 +46,210 @@ async def upload_document(file: UploadFile = File(...)):
                 detail=f"File type {file_extension} not allowed. Allowed types: {settings.ALLOWED_EXTENSIONS}"
             )
         
-        # Save file
-        file_id, file_path = await document_processor.save_upload_file(file, file.filename)
-        
-        # Extract text
-        text = document_processor.extract_text(file_path)
-        
-        if not text or len(text.strip()) < 10:
-            # Delete the file if no text extracted
-            await document_processor.delete_file(file_id)
-            raise HTTPException(
-                status_code=400,
-                detail="Could not extract text from the document or document is empty"
-            )
+        # Stream file to disk
+        file_id, file_path, sha256 = await document_processor.save_upload_file(file, file.filename)
         
-        # Get metadata
-        metadata = document_processor.get_file_metadata(file_path, file.filename, file_id)
+        # Extract, chunk and embed in the background
+        job = ingestion_service.submit(file_id, file_path, file.filename, sha256)
         
-        # Add to vector store
-        vector_store_service.add_documents([text], [metadata])
-        
-        logger.info(f"Document uploaded successfully: {file.filename}")
+        logger.info(f"Document queued for ingestion: {file.filename} (job {job.job_id})")
         
         return DocumentUploadResponse(
             filename=file.filename,
             file_id=file_id,
             size=file_path.stat().st_size,
-            status="success",
-            message="Document uploaded and processed successfully"
+            status="processing",
+            message="Document uploaded and queued for processing",
+            job_id=job.job_id
         )
         
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error uploading document: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
 
+@router.post("/bulk-upload", response_model=BulkUploadResponse)
+async def bulk_upload_documents(files: List[UploadFile] = File(...)):
+    """
+    Upload many documents (or zip archives of documents) as one ingestion job.
+    
+    Files are ingested together: extraction runs in parallel processes and
+    chunks from several files share embedding batches and Chroma writes.
+    Unsupported or oversized files are skipped and reported instead of
+    failing the whole request. Saved files and extracted archive members
+    together are capped at MAX_BULK_UPLOAD_SIZE bytes and MAX_BULK_FILES
+    files. Poll /api/documents/bulk-jobs/{job_id} for progress.
+    
+    Args:
+        files: Documents and/or .zip archives
+        
+    Returns:
+        BulkUploadResponse with the job ID and any rejected files
+    """
+    accepted = []
+    rejected = []
+    # Running totals across plain files and extracted archive members
+    remaining_bytes = settings.MAX_BULK_UPLOAD_SIZE
+    remaining_files = settings.MAX_BULK_FILES
+    try:
+        for file in files:
+            file_extension = Path(file.filename).suffix.lower()
+            
+            if remaining_files <= 0:
+                rejected.append({"filename": file.filename, "reason": "Too many files"})
+                continue
+            
+            if file_extension == '.zip':
+                _, archive_path, _ = await document_processor.save_upload_file(
+                    file, file.filename, max_size=settings.MAX_BULK_UPLOAD_SIZE
+                )
+                try:
+                    stored, skipped, written = await asyncio.to_thread(
+                        document_processor.extract_archive, archive_path, remaining_bytes, remaining_files
+                    )
+                    accepted.extend(stored)
+                    rejected.extend(skipped)
+                    remaining_bytes -= written
+                    remaining_files -= len(stored) + len(skipped)
+                except zipfile.BadZipFile:
+                    rejected.append({"filename": file.filename, "reason": "Not a valid zip archive"})
+                finally:
+                    archive_path.unlink(missing_ok=True)
+                continue
+            
+            remaining_files -= 1
+            if file_extension not in settings.ALLOWED_EXTENSIONS:
+                rejected.append({"filename": file.filename, "reason": "File type not allowed"})
+                continue
+            
+            limit = min(settings.MAX_UPLOAD_SIZE, remaining_bytes)
+            if limit <= 0:
+                rejected.append({"filename": file.filename, "reason": "Bulk upload size limit reached"})
+                continue
+            try:
+                file_id, file_path, sha256 = await document_processor.save_upload_file(
+                    file, file.filename, max_size=limit
+                )
+                accepted.append((file_id, file_path, file.filename, sha256))
+                remaining_bytes -= file_path.stat().st_size
+            except UploadTooLargeError:
+                reason = "File too large" if limit == settings.MAX_UPLOAD_SIZE else "Bulk upload size limit reached"
+                rejected.append({"filename": file.filename, "reason": reason})
+        
+        if not accepted:
+            raise HTTPException(status_code=400, detail="No supported documents in the upload")
+        
+        job = ingestion_service.submit_bulk(accepted, rejected)
+        logger.info(f"Bulk upload queued: {len(accepted)} files, {len(rejected)} rejected (job {job.job_id})")
+        
+        return BulkUploadResponse(
+            job_id=job.job_id,
+            files_accepted=len(accepted),
+            rejected=rejected,
+            message=f"{len(accepted)} documents queued for processing"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Nothing was queued, so drop what was already saved
+        for _, file_path, _, _ in accepted:
+            file_path.unlink(missing_ok=True)
+        if isinstance(e, UploadTooLargeError):
+            raise HTTPException(status_code=413, detail=str(e))
+        logger.error(f"Error in bulk upload: {e}")
+        raise HTTPException(status_code=500, detail=f"Error processing documents: {str(e)}")
+
+@router.get("/bulk-jobs/{job_id}", response_model=BulkIngestionJobStatus)
+async def get_bulk_ingestion_job(job_id: str):
+    """
+    Get the progress of a bulk ingestion job.
+    
+    Args:
+        job_id: The job ID returned by the bulk upload endpoint
+        
+    Returns:
+        BulkIngestionJobStatus with per-file status, counters and ETA
+    """
+    job = await asyncio.to_thread(ingestion_service.get_bulk_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return BulkIngestionJobStatus(**job)
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+async def get_ingestion_job(job_id: str):
+    """
+    Get the progress of a document ingestion job.
+    
+    Args:
+        job_id: The job ID returned by the upload endpoint
+        
+    Returns:
+        IngestionJobStatus with stage, progress counters and ETA
+    """
+    job = await asyncio.to_thread(ingestion_service.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return IngestionJobStatus(**job)
+
 @router.get("/list", response_model=DocumentListResponse)
-async def list_documents():
+async def list_documents(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    sort: str = Query("upload_date", description=f"One of: {', '.join(SORT_FIELDS)}"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    status: Optional[str] = None
+):
     """
-    Get list of all uploaded documents.
+    Get a page of uploaded documents from the document registry.
+    
+    Args:
+        offset: Number of documents to skip
+        limit: Maximum number of documents to return
+        sort: Field to sort by
+        order: "asc" or "desc"
+        status: Only documents with this status (processing, active or failed)
     
     Returns:
-        DocumentListResponse with list of documents
+        DocumentListResponse with a page of documents and the total count
     """
+    if sort not in SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sort by {sort}. Allowed fields: {', '.join(SORT_FIELDS)}"
+        )
+    
     try:
-        documents = []
-        seen_files = set()
-        
-        # Get documents from vector store
-        vector_docs = vector_store_service.get_all_documents()
-        
-        for doc in vector_docs:
-            file_id = doc['metadata'].get('file_id')
-            if file_id and file_id not in seen_files:
-                seen_files.add(file_id)
-                
-                # Find file on disk
-                file_path = None
-                for path in settings.UPLOAD_DIR.glob(f"{file_id}.*"):
-                    file_path = path
-                    break
-                
-                if file_path:
-                    documents.append(DocumentInfo(
-                        id=file_id,
-                        filename=doc['metadata'].get('filename', 'Unknown'),
-                        upload_date=datetime.fromtimestamp(file_path.stat().st_ctime),
-                        size=file_path.stat().st_size,
-                        status="active"
-                    ))
+        rows, total = document_registry.list(
+            offset=offset,
+            limit=limit,
+            sort=sort,
+            descending=order == "desc",
+            status=status
+        )
+        
+        documents = [
+            DocumentInfo(
+                id=row['file_id'],
+                filename=row['filename'],
+                upload_date=row['uploaded_at'],
+                size=row['size'],
+                status=row['status'],
+                chunk_count=row['chunk_count'],
+                sha256=row['sha256'],
+                error=row['error']
+            )
+            for row in rows
+        ]
         
         return DocumentListResponse(
             documents=documents,
-            total=len(documents)
+            total=total,
+            offset=offset,
+            limit=limit
         )
         
     except Exception as e:
@@ -127,10 +271,12 @@ async def delete_document(file_id: str):
         # Delete from vector store
         vector_deleted = vector_store_service.delete_documents(file_id)
         
-        # Delete from disk
-        file_deleted = await document_processor.delete_file(file_id)
+        # Delete from disk, using the registered path when there is one
+        file_deleted = await document_processor.delete_file(file_id, document_registry.get_path(file_id))
+        
+        registry_deleted = document_registry.delete(file_id)
         
-        if vector_deleted or file_deleted:
+        if vector_deleted or file_deleted or registry_deleted:
             return DocumentDeleteResponse(
                 message="Document deleted successfully",
                 deleted_id=file_id
@@ -156,6 +302,7 @@ async def clear_all_documents():
     try:
         # Clear vector store
         vector_store_service.clear_collection()
+        document_registry.clear()
         
         # Delete all files
         deleted_count = 0
@@ -1,16 +1,18 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 # Chat Models
 class ChatMessage(BaseModel):
     message: str = Field(..., min_length=1, max_length=2000)
     session_id: Optional[str] = None
+    mode: Optional[str] = Field(None, pattern="^(generate|extractive|auto)$")  # Overrides ANSWER_MODE
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     sources: Optional[List[str]] = []
+    usage: Optional[Dict[str, int]] = None  # Per-stage token counts of the generated answer
     timestamp: datetime = Field(default_factory=datetime.now)
 
 # Document Models
@@ -20,6 +22,53 @@ class DocumentUploadResponse(BaseModel):
     size: int
     status: str
     message: str
+    job_id: Optional[str] = None
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    file_id: str
+    filename: str
+    status: str
+    error: Optional[str] = None
+    pages_total: int
+    pages_parsed: int
+    chunks_total: int
+    chunks_embedded: int
+    chunks_cached: int  # Chunks whose embeddings were reused
+    created_at: datetime
+    elapsed_seconds: Optional[float] = None
+    eta_seconds: Optional[float] = None
+
+class BulkFileStatus(BaseModel):
+    file_id: str
+    filename: str
+    status: str
+    error: Optional[str] = None
+    chunks: int = 0
+
+class RejectedFile(BaseModel):
+    filename: str
+    reason: str
+
+class BulkIngestionJobStatus(BaseModel):
+    job_id: str
+    status: str
+    files_total: int
+    files_completed: int
+    files_failed: int
+    chunks_embedded: int
+    chunks_cached: int  # Chunks whose embeddings were reused
+    created_at: datetime
+    elapsed_seconds: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    files: List[BulkFileStatus]
+    rejected: List[RejectedFile] = []
+
+class BulkUploadResponse(BaseModel):
+    job_id: str
+    files_accepted: int
+    rejected: List[RejectedFile]
+    message: str
 
 class DocumentInfo(BaseModel):
     id: str
@@ -27,10 +76,15 @@ class DocumentInfo(BaseModel):
     upload_date: datetime
     size: int
     status: str
+    chunk_count: int = 0
+    sha256: Optional[str] = None
+    error: Optional[str] = None
 
 class DocumentListResponse(BaseModel):
     documents: List[DocumentInfo]
     total: int
+    offset: int = 0
+    limit: Optional[int] = None
 
 class DocumentDeleteResponse(BaseModel):
     message: str
@@ -51,6 +105,7 @@ class AdminStats(BaseModel):
     total_chats: int
     storage_used: str
     last_updated: datetime
+    metrics: Dict[str, Any] = {}
 
 # Vector Store Models
 class DocumentChunk(BaseModel):
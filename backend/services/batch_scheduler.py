@@ -0,0 +1,322 @@
+from concurrent.futures import Future
+from transformers import StoppingCriteria, StoppingCriteriaList, TextStreamer
+from transformers.generation.streamers import BaseStreamer
+from typing import Callable, Dict, List, Optional
+from collections import Counter
+import copy
+import logging
+import queue
+import threading
+import time
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackStreamer(TextStreamer):
+    """Text streamer that hands each decoded piece of text to a callback."""
+
+    def __init__(self, tokenizer, on_text: Callable[[str], None]):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.on_text = on_text
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.on_text(text)
+
+
+class CancelCriteria(StoppingCriteria):
+    """Stops generation once the given event is set (e.g. client disconnected)."""
+
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full(
+            (input_ids.shape[0],),
+            self.cancel_event.is_set(),
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
+
+class _GenerationRequest:
+    """A single caller's prompt waiting to be generated in a batch."""
+
+    __slots__ = ("prompt", "on_text", "cancel_event", "future", "enqueued_at")
+
+    def __init__(
+        self,
+        prompt: str,
+        on_text: Optional[Callable[[str], None]],
+        cancel_event: Optional[threading.Event]
+    ):
+        self.prompt = prompt
+        self.on_text = on_text
+        self.cancel_event = cancel_event
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+
+class _BatchStreamer(BaseStreamer):
+    """Routes the tokens of each batch row to that row's caller."""
+
+    def __init__(self, tokenizer, requests: List[_GenerationRequest]):
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.token_ids: List[List[int]] = [[] for _ in requests]
+        self.printed_len = [0] * len(requests)
+        self.finished = [False] * len(requests)
+        self.prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the (padded) prompt ids
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+
+        for row, token_id in enumerate(value.reshape(len(self.requests), -1)[:, -1].tolist()):
+            if self.finished[row]:
+                continue
+            if token_id == self.tokenizer.eos_token_id:
+                self.finished[row] = True
+                continue
+            self.token_ids[row].append(token_id)
+
+            request = self.requests[row]
+            if request.on_text is None or request.cancelled():
+                continue
+
+            text = self.tokenizer.decode(self.token_ids[row], skip_special_tokens=True)
+            # Hold back incomplete multi-byte characters until the next token
+            if text.endswith("\ufffd"):
+                continue
+            new_text = text[self.printed_len[row]:]
+            if new_text:
+                self.printed_len[row] = len(text)
+                request.on_text(new_text)
+
+    def end(self):
+        pass
+
+
+class _BatchCancelCriteria(StoppingCriteria):
+    """Stops each row of the batch once its caller has gone away."""
+
+    def __init__(self, requests: List[_GenerationRequest]):
+        self.requests = requests
+
+    def __call__(self, input_ids, scores, **kwargs) -> torch.BoolTensor:
+        return torch.tensor(
+            [request.cancelled() for request in self.requests],
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
+
+class GenerationBatcher:
+    """
+    Dynamic micro-batching scheduler for text generation.
+
+    Requests arriving within a short window are padded and generated together
+    in a single model.generate() call on a dedicated thread. Each caller still
+    gets its own result, and optionally its own token stream.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        generation_kwargs: Dict,
+        max_batch_size: int,
+        max_wait_ms: int
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            model: Causal language model
+            tokenizer: Tokenizer matching the model (copied; the batcher
+                pads with its own instance)
+            generation_kwargs: Keyword arguments passed to model.generate()
+            max_batch_size: Maximum number of prompts generated together
+            max_wait_ms: How long the first request waits for others to join
+        """
+        self.model = model
+        # Fast tokenizers must not be used from several threads at once, and
+        # the padding settings below must not leak into prompt token counting
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self.generation_kwargs = generation_kwargs
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        # Decoder-only models need left padding so generation continues
+        # directly after each prompt
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self._queue: "queue.Queue[Optional[_GenerationRequest]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._tokens_generated = 0
+        self._generation_time = 0.0
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="generation-batcher",
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        prompt: str,
+        on_text: Optional[Callable[[str], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Future:
+        """
+        Queue a prompt for batched generation.
+
+        Args:
+            prompt: Fully rendered prompt
+            on_text: Optional callback receiving text as it is decoded
+            cancel_event: Optional event; once set, the caller's row is dropped
+
+        Returns:
+            Future resolving to the generated text
+        """
+        request = _GenerationRequest(prompt, on_text, cancel_event)
+        self._queue.put(request)
+        return request.future
+
+    def generate(
+        self,
+        prompt: str,
+        on_text: Optional[Callable[[str], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> str:
+        """Queue a prompt and block until its generation is finished."""
+        return self.submit(prompt, on_text, cancel_event).result()
+
+    def _collect_batch(self, first: _GenerationRequest) -> List[_GenerationRequest]:
+        """Gather requests arriving within the wait window after the first one."""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Shutdown requested; finish this batch first
+                self._queue.put(None)
+                break
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        """Scheduler loop."""
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect_batch(first)
+
+            active = []
+            for request in batch:
+                if request.cancelled():
+                    request.future.cancel()
+                else:
+                    active.append(request)
+
+            if not active:
+                continue
+
+            try:
+                self._generate_batch(active)
+            except Exception as e:
+                logger.error(f"Error generating batch of {len(active)}: {e}")
+                for request in active:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _generate_batch(self, batch: List[_GenerationRequest]):
+        """Pad the prompts, generate them together and resolve each future."""
+        started_at = time.perf_counter()
+
+        inputs = self.tokenizer(
+            [request.prompt for request in batch],
+            return_tensors="pt",
+            padding=True
+        )
+        prompt_length = inputs["input_ids"].shape[1]
+
+        with torch.no_grad():
+            output = self.model.generate(
+                **inputs,
+                **self.generation_kwargs,
+                pad_token_id=self.tokenizer.pad_token_id,
+                streamer=_BatchStreamer(self.tokenizer, batch),
+                stopping_criteria=StoppingCriteriaList([_BatchCancelCriteria(batch)])
+            )
+
+        tokens_generated = 0
+        for row, request in enumerate(batch):
+            new_tokens = output[row, prompt_length:].tolist()
+            if self.tokenizer.eos_token_id in new_tokens:
+                new_tokens = new_tokens[:new_tokens.index(self.tokenizer.eos_token_id)]
+            tokens_generated += len(new_tokens)
+
+            if request.cancelled():
+                request.future.cancel()
+            else:
+                request.future.set_result(
+                    self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+                )
+
+        elapsed = time.perf_counter() - started_at
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+            self._requests += len(batch)
+            self._tokens_generated += tokens_generated
+            self._generation_time += elapsed
+
+        logger.debug(
+            f"Generated batch of {len(batch)} ({tokens_generated} tokens) in {elapsed:.2f}s"
+        )
+
+    def get_metrics(self) -> Dict:
+        """Get the batch-size histogram and throughput counters."""
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": int(self.max_wait * 1000),
+                "queued": self._queue.qsize(),
+                "batches": batches,
+                "requests": self._requests,
+                "batch_size_histogram": {
+                    str(size): count for size, count in sorted(self._batch_sizes.items())
+                },
+                "avg_batch_size": round(self._requests / batches, 2) if batches else 0.0,
+                "tokens_generated": self._tokens_generated,
+                "tokens_per_second": round(
+                    self._tokens_generated / self._generation_time, 2
+                ) if self._generation_time else 0.0,
+            }
+
+    def shutdown(self):
+        """Stop the scheduler after the queued requests have been generated."""
+        self._queue.put(None)
+        self._thread.join()
@@ -1,178 +1,704 @@
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from langchain_community.llms import HuggingFacePipeline
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
 import logging
+import threading
+import time
 import uuid
 from services.vector_store import vector_store_service
+from services.inference_executor import inference_executor, InferenceQueueFullError
+from services.inference_client import InferenceUnavailableError
+from services.response_cache import response_cache
+from services.session_store import session_store
+from services.prompt_builder import PromptBuilder, TokenCounter
+from services.context_builder import ContextBuilder
+from services.extractive import ExtractiveAnswerer
+from services.reranker import CrossEncoderReranker
+from services.startup import startup_tracker, PHASE_FAILED, PHASE_READY
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_RESPONSE = "I don't have enough information to answer that question. Please upload relevant documents or contact our support team."
+
+ANSWER_MODE_GENERATE = "generate"  # Language model answer over the retrieved context
+ANSWER_MODE_EXTRACTIVE = "extractive"  # Best matching passage of the retrieved chunks, no language model
+ANSWER_MODE_AUTO = "auto"  # Extractive when a sentence matches well enough, otherwise generate
+
+
 class ChatbotService:
     """RAG-based chatbot service for answering business queries."""
     
     def __init__(self):
-        """Initialize the chatbot with RAG pipeline."""
-        self.sessions: Dict[str, List[Dict]] = {}
-        self.qa_chain = None
-        self._initialize_llm()
+        """
+        Initialize the chatbot.
+        
+        The language model is loaded on first use (or by ensure_llm() during
+        warm-up), so importing this module does not pull in torch/transformers.
+        """
+        self.session_store = session_store
+        self.tokens = TokenCounter()
+        self.prompt_builder = PromptBuilder(
+            self.tokens,
+            history_token_budget=settings.HISTORY_TOKEN_BUDGET,
+            condense_max_turns=settings.CONDENSE_MAX_TURNS
+        )
+        self.context_builder = ContextBuilder(
+            self.tokens,
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            max_overlap=settings.CHUNK_OVERLAP
+        )
+        self.reranker = CrossEncoderReranker(
+            model_name=settings.RERANKER_MODEL,
+            batch_size=settings.RERANK_BATCH_SIZE,
+            max_latency_ms=settings.RERANK_MAX_LATENCY_MS
+        ) if settings.RERANK_ENABLED else None
+        self.extractive = ExtractiveAnswerer(
+            max_sentences=settings.EXTRACTIVE_MAX_SENTENCES,
+            max_chars=settings.EXTRACTIVE_MAX_CHARS,
+            cache_size=settings.EXTRACTIVE_CACHE_SENTENCES
+        )
+        self.llm = None
+        self.model = None
+        self.tokenizer = None
+        self.generation_kwargs: Dict = {}
+        self.batcher = None  # GenerationBatcher once the model is loaded (InferenceClient in remote mode)
+        self._preloaded: Optional[Tuple] = None  # (model, tokenizer) loaded by preload_model()
+        self._llm_lock = threading.Lock()
+        self._llm_initialized = False
+    
+    def ensure_llm(self):
+        """Load the language model if it has not been loaded (or attempted) yet."""
+        if self._llm_initialized:
+            return
+        with self._llm_lock:
+            if not self._llm_initialized:
+                self._initialize_llm()
+                self._llm_initialized = True
+    
+    def preload_model(self):
+        """
+        Load only the language model weights (no pipeline or scheduler thread).
+        
+        Used by the prefork server before forking workers, which then share
+        the weights copy-on-write and build the rest on first use. ONNX
+        Runtime sessions don't survive fork, so with the onnx backend each
+        worker loads its own.
+        """
+        from services.llm_backends import BACKEND_ONNX, load_causal_lm
+        
+        if settings.INFERENCE_MODE == "remote":
+            return
+        if settings.LLM_BACKEND == BACKEND_ONNX:
+            logger.info("Not preloading the ONNX language model; each worker loads its own")
+            return
+        with self._llm_lock:
+            if self._preloaded is None and not self._llm_initialized:
+                self._preloaded = load_causal_lm(
+                    settings.LOCAL_LLM_MODEL,
+                    settings.LLM_BACKEND,
+                    settings.LLM_ARTIFACT_DIR,
+                    threads=settings.LLM_THREADS
+                )
+    
+    @property
+    def llm_state(self) -> str:
+        """Load state of the language model (pending, loading, ready or failed)."""
+        return startup_tracker.status("llm")
+    
+    @property
+    def can_generate(self) -> bool:
+        """Whether answers are generated (rather than retrieval-only fallbacks)."""
+        return self.llm is not None or self.batcher is not None
     
     def _initialize_llm(self):
-        """Initialize the language model and QA chain."""
+        """Initialize the language model and generation pipeline."""
+        started_at = time.perf_counter()
+        startup_tracker.mark_loading("llm")
         try:
+            if settings.INFERENCE_MODE == "remote":
+                self._initialize_remote_llm()
+                startup_tracker.record("llm", time.perf_counter() - started_at, PHASE_READY)
+                return
+            
+            from langchain_community.llms import HuggingFacePipeline
+            from transformers import pipeline
+            from services.batch_scheduler import GenerationBatcher
+            from services.llm_backends import GENERATION_KWARGS, load_causal_lm
+            
             # For production, you can use OpenAI or other API-based models
             # This uses a local model for demonstration
-            logger.info("Initializing language model...")
+            logger.info(f"Initializing language model ({settings.LLM_BACKEND} backend)...")
             
-            # Using a smaller model for CPU inference
-            # You can change this to use OpenAI API instead
-            model_name = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
-            
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                device_map="cpu",
-                low_cpu_mem_usage=True
+            model, tokenizer = self._preloaded or load_causal_lm(
+                settings.LOCAL_LLM_MODEL,
+                settings.LLM_BACKEND,
+                settings.LLM_ARTIFACT_DIR,
+                threads=settings.LLM_THREADS
             )
+            self._preloaded = None
+            
+            # Shared by the pipeline and the streaming path
+            generation_kwargs = dict(GENERATION_KWARGS)
             
             # Create pipeline
             pipe = pipeline(
                 "text-generation",
                 model=model,
                 tokenizer=tokenizer,
-                max_new_tokens=512,
-                temperature=0.7,
-                top_p=0.95,
-                repetition_penalty=1.15
+                **generation_kwargs
             )
             
-            llm = HuggingFacePipeline(pipeline=pipe)
+            # Retrieval happens before generation (see _answer), so the
+            # retrieved chunks can be used to look up cached responses
+            self.llm = HuggingFacePipeline(pipeline=pipe)
+            self.model = model
+            self.tokenizer = tokenizer
+            self.generation_kwargs = generation_kwargs
+            self.tokens.tokenizer = tokenizer
             
-            # Create prompt template
-            prompt_template = """You are a helpful AI assistant for a business website. Use the following context to answer the user's question. If you don't know the answer based on the context, say so politely.
-
-Context: {context}
-
-Question: {question}
-
-Answer: """
-            
-            PROMPT = PromptTemplate(
-                template=prompt_template,
-                input_variables=["context", "question"]
-            )
-            
-            # Create QA chain
-            self.qa_chain = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=vector_store_service.vectorstore.as_retriever(
-                    search_kwargs={"k": 3}
-                ),
-                return_source_documents=True,
-                chain_type_kwargs={"prompt": PROMPT}
-            )
+            if settings.GENERATION_BATCHING:
+                self.batcher = GenerationBatcher(
+                    model=model,
+                    tokenizer=tokenizer,
+                    generation_kwargs=generation_kwargs,
+                    max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+                    max_wait_ms=settings.GENERATION_MAX_WAIT_MS
+                )
             
+            startup_tracker.record("llm", time.perf_counter() - started_at, PHASE_READY)
             logger.info("Language model initialized successfully")
             
         except Exception as e:
+            startup_tracker.record("llm", time.perf_counter() - started_at, PHASE_FAILED, str(e))
             logger.error(f"Error initializing LLM: {e}")
             logger.warning("Falling back to simple retrieval-based responses")
-            self.qa_chain = None
+            self.llm = None
+            self.model = None
+            self.tokenizer = None
+            self.batcher = None
+    
+    def _initialize_remote_llm(self):
+        """Send generation to the inference processes; only the tokenizer is loaded here."""
+        from services.inference_client import InferenceClient, inference_socket_paths
+        
+        self.batcher = InferenceClient(
+            inference_socket_paths(),
+            request_timeout=settings.INFERENCE_REQUEST_TIMEOUT_SECONDS
+        )
+        try:
+            from transformers import AutoTokenizer
+            
+            # Token budgets are counted with the model's tokenizer
+            self.tokens.tokenizer = AutoTokenizer.from_pretrained(settings.LOCAL_LLM_MODEL)
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer, token counts are estimated: {e}")
+        logger.info(f"Using remote inference processes: {self.batcher.health()}")
     
     def get_or_create_session(self, session_id: Optional[str] = None) -> str:
         """Get existing session or create a new one."""
-        if session_id and session_id in self.sessions:
+        if session_id and self.session_store.session_exists(session_id):
             return session_id
         
         new_session_id = str(uuid.uuid4())
-        self.sessions[new_session_id] = []
+        self.session_store.create_session(new_session_id)
         return new_session_id
     
     def add_to_history(self, session_id: str, role: str, content: str):
         """Add message to session history."""
-        if session_id in self.sessions:
-            self.sessions[session_id].append({
-                "role": role,
-                "content": content
-            })
+        self.session_store.append_message(session_id, role, content)
+    
+    async def _session_call(self, func: Callable, *args):
+        """Run a session call, in a thread if the store blocks (SQLite) so the event loop is never stalled."""
+        if self.session_store.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+    
+    def _recent_history(self, session_id: str) -> List[Dict]:
+        """Get the latest messages of a session used for conversational answers."""
+        if not settings.CONVERSATIONAL_MODE or settings.HISTORY_MAX_MESSAGES <= 0:
+            return []
+        total = self.session_store.count_messages(session_id)
+        offset = max(total - settings.HISTORY_MAX_MESSAGES, 0)
+        return self.session_store.get_history(session_id, offset, settings.HISTORY_MAX_MESSAGES)
     
-    async def chat(self, message: str, session_id: Optional[str] = None) -> Dict:
+    def _answer(
+        self,
+        message: str,
+        history: Optional[List[Dict]] = None,
+        mode: Optional[str] = None
+    ) -> Tuple[str, List[str], Dict[str, int]]:
         """
-        Process a chat message and return response.
+        Answer a message synchronously (blocking).
         
         Args:
             message: User's message
-            session_id: Optional session ID
+            history: Recent session messages, oldest first
+            mode: Answer mode (ANSWER_MODE if None)
             
         Returns:
-            Dictionary with response, session_id, and sources
+            Tuple of (response, sources, per-stage token usage)
+        """
+        history = history or []
+        query = self.prompt_builder.condense_query(message, history)
+        search_results = self._retrieve(query)
+        
+        extracted = self._answer_without_llm(query, search_results, mode or settings.ANSWER_MODE)
+        if extracted is not None:
+            response, sources = extracted
+            return response, sources, {}
+        
+        self.ensure_llm()
+        if not self.can_generate:
+            # Fallback to simple retrieval
+            response, sources = self._fallback_response(query, search_results)
+            return response, sources, {}
+        
+        prompt_history = self._prompt_history(message, history)
+        prompt, usage, included = self._build_prompt(message, search_results, prompt_history)
+        sources = self._extract_sources(included)
+        chunk_ids, query_embedding, cached = self._lookup_cache(message, search_results, prompt_history)
+        if cached is not None:
+            return cached, sources, {}
+        
+        generation_started_at = time.perf_counter()
+        if self.batcher:
+            # Generate together with concurrent requests
+            try:
+                response = self.batcher.generate(prompt)
+            except InferenceUnavailableError as e:
+                logger.warning(f"Inference unavailable, answering from retrieval: {e}")
+                response, sources = self._fallback_response(query, search_results)
+                return response, sources, {}
+        else:
+            response = self.llm.invoke(prompt)
+        
+        usage = self._complete_usage(usage, response, time.perf_counter() - generation_started_at)
+        if not prompt_history:
+            self._store_cache(message, chunk_ids, response, query_embedding)
+        return response, sources, usage
+    
+    def _prompt_history(self, message: str, history: List[Dict]) -> List[Dict]:
+        """
+        Get the history messages to include in a message's prompt.
+        
+        Only follow-ups depend on earlier turns; standalone questions are
+        answered without history, so their answers stay cacheable.
+        """
+        if not history or not self.prompt_builder.is_follow_up(message):
+            return []
+        prompt_history, _ = self.prompt_builder.select_history(history)
+        return prompt_history
+    
+    def _complete_usage(
+        self,
+        usage: Dict[str, int],
+        response: str,
+        generation_seconds: float
+    ) -> Dict[str, int]:
+        """Add completion and total token counts to a prompt's usage, and log it with the generation time."""
+        usage = dict(usage)
+        usage["completion_tokens"] = self.prompt_builder.count_tokens(response)
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        logger.info(
+            "Token usage: history=%d context=%d question=%d prompt=%d completion=%d; generation=%.0fms",
+            usage["history_tokens"], usage["context_tokens"], usage["question_tokens"],
+            usage["prompt_tokens"], usage["completion_tokens"], generation_seconds * 1000
+        )
+        return usage
+    
+    @staticmethod
+    def _lookup_cache(
+        message: str,
+        search_results: List[Dict],
+        prompt_history: Optional[List[Dict]] = None
+    ) -> Tuple[Tuple[str, ...], Optional[List[float]], Optional[str]]:
+        """
+        Look up a cached response for a message and its retrieved chunks.
+        
+        Answers that depend on conversation history are never cached.
+        
+        Returns:
+            Tuple of (chunk_ids, query_embedding, cached response or None)
+        """
+        if not settings.RESPONSE_CACHE_ENABLED or prompt_history:
+            return (), None, None
+        
+        chunk_ids = response_cache.chunk_ids(search_results)
+        query_embedding = (
+            vector_store_service.embedding_model.embed_query(message)
+            if response_cache.semantic else None
+        )
+        return chunk_ids, query_embedding, response_cache.get(message, chunk_ids, query_embedding)
+    
+    @staticmethod
+    def _store_cache(
+        message: str,
+        chunk_ids: Tuple[str, ...],
+        response: str,
+        query_embedding: Optional[List[float]]
+    ):
+        """Cache a generated response."""
+        if settings.RESPONSE_CACHE_ENABLED and response.strip():
+            response_cache.put(message, chunk_ids, response, query_embedding)
+    
+    def _retrieve(self, query: str) -> List[Dict]:
+        """
+        Retrieve the chunks used as context for a query.
+        
+        With reranking enabled, a larger candidate pool is retrieved and the
+        cross-encoder picks the best RETRIEVAL_TOP_K of it.
+        """
+        started_at = time.perf_counter()
+        if self.reranker is None:
+            results = vector_store_service.similarity_search(query, k=settings.RETRIEVAL_TOP_K)
+            logger.info(
+                f"Retrieval: search={(time.perf_counter() - started_at) * 1000:.1f}ms "
+                f"({len(results)} chunks)"
+            )
+            return results
+        
+        candidates = vector_store_service.similarity_search(query, k=settings.RERANK_CANDIDATES)
+        search_ms = (time.perf_counter() - started_at) * 1000
+        results, info = self.reranker.rerank(query, candidates, settings.RETRIEVAL_TOP_K)
+        logger.info(
+            f"Retrieval: search={search_ms:.1f}ms rerank={info['elapsed_ms']:.1f}ms"
+            f"{'' if info['reranked'] else ' (skipped)'} "
+            f"({len(candidates)} candidates -> {len(results)} chunks)"
+        )
+        return results
+    
+    @staticmethod
+    def _extract_sources(search_results: List[Dict]) -> List[str]:
+        """Get the unique source filenames of retrieved (or packed) chunks."""
+        return list(set([
+            r['metadata'].get('filename', 'Unknown')
+            for r in search_results
+        ]))
+    
+    def _build_prompt(
+        self,
+        question: str,
+        search_results: List[Dict],
+        history: Optional[List[Dict]] = None
+    ) -> Tuple[str, Dict[str, int], List[Dict]]:
+        """
+        Fill the prompt template with packed retrieved context (and history).
+        
+        Returns:
+            Tuple of (prompt, per-stage token usage, results that made it
+            into the context)
+        """
+        context, included = self.context_builder.build(search_results)
+        prompt, usage = self.prompt_builder.build(question, context, history)
+        return prompt, usage, included
+    
+    def _extractive_answer(
+        self,
+        query: str,
+        search_results: List[Dict],
+        min_score: Optional[float] = None
+    ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Answer with the retrieved passage that best matches the query.
+        
+        Returns:
+            Tuple of (response, [source filename]), or None if no sentence
+            qualifies (or scoring failed)
+        """
+        if not search_results:
+            return None
+        try:
+            answer = self.extractive.answer(
+                query, search_results, vector_store_service.embedding_model, min_score
+            )
+        except Exception as e:
+            logger.warning(f"Extractive answering failed: {e}")
+            return None
+        return (answer["text"], [answer["filename"]]) if answer else None
+    
+    def _answer_without_llm(
+        self,
+        query: str,
+        search_results: List[Dict],
+        mode: str
+    ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Answer before (or instead of) generation, as the answer mode asks.
+        
+        Returns:
+            Tuple of (response, sources), or None if the message should be
+            generated
+        """
+        if mode == ANSWER_MODE_EXTRACTIVE:
+            return self._fallback_response(query, search_results)
+        if mode == ANSWER_MODE_AUTO:
+            return self._extractive_answer(query, search_results, settings.EXTRACTIVE_MIN_SCORE)
+        return None
+    
+    def _fallback_response(self, query: str, search_results: List[Dict]) -> Tuple[str, List[str]]:
+        """
+        Build a retrieval-only response when no language model is used.
+        
+        Returns:
+            Tuple of (response, sources)
+        """
+        if not search_results:
+            return NO_CONTEXT_RESPONSE, []
+        
+        extracted = self._extractive_answer(query, search_results)
+        if extracted is not None:
+            return extracted
+        
+        # No scorable sentences: combine top results
+        context = "\n\n".join([r['content'] for r in search_results])
+        return f"Based on the available information:\n\n{context[:500]}...", self._extract_sources(search_results)
+    
+    def _generate_stream(
+        self,
+        prompt: str,
+        on_text: Callable[[str], None],
+        cancel_event: threading.Event
+    ) -> str:
+        """
+        Generate a completion, reporting text as it is decoded (blocking).
+        
+        Args:
+            prompt: Fully rendered prompt
+            on_text: Called with each newly decoded piece of text
+            cancel_event: Generation stops early once this is set
+            
+        Returns:
+            The generated text
+        """
+        import torch
+        from transformers import StoppingCriteriaList
+        from services.batch_scheduler import CallbackStreamer, CancelCriteria
+        
+        pieces: List[str] = []
+        
+        def collect(text: str):
+            pieces.append(text)
+            on_text(text)
+        
+        inputs = self.tokenizer(prompt, return_tensors="pt")
+        with torch.no_grad():
+            self.model.generate(
+                **inputs,
+                **self.generation_kwargs,
+                streamer=CallbackStreamer(self.tokenizer, collect),
+                stopping_criteria=StoppingCriteriaList([CancelCriteria(cancel_event)])
+            )
+        return "".join(pieces)
+    
+    def _stream_answer(
+        self,
+        message: str,
+        history: List[Dict],
+        emit: Callable[[str, Dict], None],
+        cancel_event: threading.Event,
+        mode: Optional[str] = None
+    ):
+        """
+        Answer a message, emitting sources, tokens and a final event (blocking).
+        
+        Always finishes with either a "done" or an "error" event.
         """
         try:
-            # Get or create session
-            session_id = self.get_or_create_session(session_id)
+            query = self.prompt_builder.condense_query(message, history)
+            search_results = self._retrieve(query)
+            
+            extracted = self._answer_without_llm(query, search_results, mode or settings.ANSWER_MODE)
+            if extracted is not None:
+                response, sources = extracted
+                emit("sources", {"sources": sources})
+                emit("token", {"text": response})
+                emit("done", {"response": response, "sources": sources})
+                return
+            
+            self.ensure_llm()
+            if not self.can_generate:
+                response, sources = self._fallback_response(query, search_results)
+                emit("sources", {"sources": sources})
+                emit("token", {"text": response})
+                emit("done", {"response": response, "sources": sources})
+                return
+            
+            prompt_history = self._prompt_history(message, history)
+            prompt, usage, included = self._build_prompt(message, search_results, prompt_history)
+            sources = self._extract_sources(included)
+            emit("sources", {"sources": sources})
             
-            # Add user message to history
-            self.add_to_history(session_id, "user", message)
+            chunk_ids, query_embedding, cached = self._lookup_cache(message, search_results, prompt_history)
+            if cached is not None:
+                emit("token", {"text": cached})
+                emit("done", {"response": cached, "sources": sources})
+                return
             
-            if self.qa_chain:
-                # Use RAG pipeline
-                result = self.qa_chain.invoke({"query": message})
-                response = result['result']
+            generation_started_at = time.perf_counter()
+            if self.batcher:
+                streamed = False
                 
-                # Extract source documents
-                sources = []
-                if 'source_documents' in result:
-                    for doc in result['source_documents']:
-                        if 'filename' in doc.metadata:
-                            sources.append(doc.metadata['filename'])
+                def on_text(text: str):
+                    nonlocal streamed
+                    streamed = True
+                    emit("token", {"text": text})
                 
-                sources = list(set(sources))  # Remove duplicates
+                try:
+                    response = self.batcher.generate(prompt, on_text=on_text, cancel_event=cancel_event)
+                except InferenceUnavailableError as e:
+                    if streamed:
+                        raise
+                    logger.warning(f"Inference unavailable, answering from retrieval: {e}")
+                    response, sources = self._fallback_response(query, search_results)
+                    emit("token", {"text": response})
+                    emit("done", {"response": response, "sources": sources})
+                    return
             else:
-                # Fallback to simple retrieval
-                search_results = vector_store_service.similarity_search(message, k=3)
-                
-                if search_results:
-                    # Combine top results
-                    context = "\n\n".join([r['content'] for r in search_results])
-                    response = f"Based on the available information:\n\n{context[:500]}..."
-                    
-                    sources = list(set([
-                        r['metadata'].get('filename', 'Unknown')
-                        for r in search_results
-                    ]))
-                else:
-                    response = "I don't have enough information to answer that question. Please upload relevant documents or contact our support team."
-                    sources = []
-            
-            # Add assistant response to history
-            self.add_to_history(session_id, "assistant", response)
+                response = self._generate_stream(
+                    prompt,
+                    lambda text: emit("token", {"text": text}),
+                    cancel_event
+                )
+            
+            usage = self._complete_usage(usage, response, time.perf_counter() - generation_started_at)
+            if not cancel_event.is_set() and not prompt_history:
+                self._store_cache(message, chunk_ids, response, query_embedding)
+            
+            emit("done", {"response": response, "sources": sources, "usage": usage})
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {e}")
+            emit("error", {"detail": "Error processing chat message"})
+    
+    async def chat(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        mode: Optional[str] = None
+    ) -> Dict:
+        """
+        Process a chat message and return response.
+        
+        Args:
+            message: User's message
+            session_id: Optional session ID
+            mode: Answer mode (generate, extractive or auto; ANSWER_MODE if None)
+            
+        Returns:
+            Dictionary with response, session_id, and sources
+        """
+        try:
+            history = await self._session_call(self._recent_history, session_id) if session_id else []
+            
+            # Run retrieval and generation on the inference pool
+            job = inference_executor.submit(self._answer, message, history, mode)
+            
+            # Only admitted requests get a session, so rejections under
+            # overload don't evict real sessions
+            session_id = await self._session_call(self.get_or_create_session, session_id)
+            response, sources, usage = await job
+            
+            # Record the exchange once it has been answered, so rejected
+            # requests don't leave dangling user messages in the history
+            await self._session_call(self.add_to_history, session_id, "user", message)
+            await self._session_call(self.add_to_history, session_id, "assistant", response)
             
             return {
                 "response": response,
                 "session_id": session_id,
-                "sources": sources
+                "sources": sources,
+                "usage": usage or None
             }
             
+        except InferenceQueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Error processing chat message: {e}")
             return {
                 "response": "I apologize, but I encountered an error processing your request. Please try again.",
-                "session_id": session_id or self.get_or_create_session(),
+                "session_id": session_id or await self._session_call(self.get_or_create_session),
                 "sources": []
             }
     
-    def get_session_history(self, session_id: str) -> List[Dict]:
-        """Get chat history for a session."""
-        return self.sessions.get(session_id, [])
+    async def stream_chat(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        mode: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Process a chat message and stream the response as it is generated.
+        
+        Yields events in order: "sources" (with session_id and sources), any
+        number of "token" events, then "done" or "error". Closing the generator
+        early stops generation. The exchange is only written to the session
+        history once generation completes.
+        
+        Args:
+            message: User's message
+            session_id: Optional session ID
+            mode: Answer mode (generate, extractive or auto; ANSWER_MODE if None)
+            
+        Yields:
+            Dictionaries with "event" and "data" keys
+            
+        Raises:
+            InferenceQueueFullError: If the inference queue is full (raised
+                before the first event)
+        """
+        history = await self._session_call(self._recent_history, session_id) if session_id else []
+        
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        cancel_event = threading.Event()
+        
+        def emit(event: str, data: Dict):
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+        
+        job = inference_executor.submit(self._stream_answer, message, history, emit, cancel_event, mode)
+        session_id = await self._session_call(self.get_or_create_session, session_id)
+        
+        try:
+            while True:
+                event, data = await events.get()
+                
+                if event == "sources":
+                    data = {"session_id": session_id, **data}
+                elif event == "done":
+                    await self._session_call(self.add_to_history, session_id, "user", message)
+                    await self._session_call(self.add_to_history, session_id, "assistant", data["response"])
+                    data = {"session_id": session_id, **data}
+                
+                yield {"event": event, "data": data}
+                
+                if event in ("done", "error"):
+                    break
+        finally:
+            # Stop generation if the consumer went away mid-stream
+            cancel_event.set()
+            if not job.done():
+                job.cancel()
+    
+    def shutdown(self):
+        """Stop the generation scheduler, if running."""
+        if self.batcher:
+            self.batcher.shutdown()
+    
+    async def get_session_history(
+        self,
+        session_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Get a page of chat history for a session, oldest first."""
+        return await self._session_call(self.session_store.get_history, session_id, offset, limit)
+    
+    async def count_session_messages(self, session_id: str) -> int:
+        """Get the number of messages in a session."""
+        return await self._session_call(self.session_store.count_messages, session_id)
     
-    def clear_session(self, session_id: str) -> bool:
+    async def clear_session(self, session_id: str) -> bool:
         """Clear a chat session."""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            return True
-        return False
+        return await self._session_call(self.session_store.delete_session, session_id)
 
 # Global instance
 chatbot_service = ChatbotService()
@@ -0,0 +1,94 @@
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SEPARATOR = "\n"
+
+
+class StreamingChunker:
+    """
+    Incremental chunker over a stream of text segments.
+
+    Segments (pages, paragraphs, sheet rows, ...) are appended to a bounded
+    buffer. Whenever the buffer holds a few chunks' worth of text it is split
+    with the regular text splitter; every chunk except the last is emitted,
+    and the buffer restarts at the last chunk, which already contains the
+    configured overlap. Chunk boundaries and overlap therefore follow the
+    same CHUNK_SIZE/CHUNK_OVERLAP semantics as splitting the whole text at
+    once, while memory stays bounded by the buffer size.
+    """
+
+    def __init__(self, text_splitter, chunk_size: int, window_chunks: int = 4):
+        """
+        Initialize the chunker.
+
+        Args:
+            text_splitter: Splitter created with add_start_index=True
+            chunk_size: Target chunk size in characters
+            window_chunks: Chunks' worth of text buffered before splitting
+        """
+        self.text_splitter = text_splitter
+        self.window_chars = chunk_size * max(window_chunks, 2)
+
+    def chunks(self, segments: Iterable[Tuple[str, Dict]]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Turn segments into overlapping chunks as they arrive.
+
+        Args:
+            segments: (text, metadata) pairs, e.g. ({"page": 3}) for PDF pages
+
+        Yields:
+            (chunk text, metadata of the segment the chunk starts in)
+        """
+        buffer = ""
+        # Start offset within the buffer of each segment still referenced
+        mark_offsets: List[int] = []
+        mark_metadatas: List[Dict] = []
+
+        for text, metadata in segments:
+            if not text:
+                continue
+            if buffer:
+                buffer += SEGMENT_SEPARATOR
+            mark_offsets.append(len(buffer))
+            mark_metadatas.append(metadata)
+            buffer += text
+
+            if len(buffer) < self.window_chars:
+                continue
+
+            documents = self.text_splitter.create_documents([buffer])
+            if len(documents) < 2:
+                continue
+
+            keep_from = documents[-1].metadata.get('start_index', -1)
+            if keep_from <= 0:
+                # Could not locate the tail chunk; keep buffering
+                continue
+
+            for document in documents[:-1]:
+                yield document.page_content, self._metadata_at(
+                    document.metadata.get('start_index', 0), mark_offsets, mark_metadatas
+                )
+
+            # Restart the buffer at the last (overlapping) chunk
+            first_mark = max(bisect_right(mark_offsets, keep_from) - 1, 0)
+            mark_offsets = [max(offset - keep_from, 0) for offset in mark_offsets[first_mark:]]
+            mark_metadatas = mark_metadatas[first_mark:]
+            buffer = buffer[keep_from:]
+
+        if buffer.strip():
+            for document in self.text_splitter.create_documents([buffer]):
+                yield document.page_content, self._metadata_at(
+                    document.metadata.get('start_index', 0), mark_offsets, mark_metadatas
+                )
+
+    @staticmethod
+    def _metadata_at(offset: int, mark_offsets: List[int], mark_metadatas: List[Dict]) -> Dict:
+        """Get the metadata of the segment containing the given buffer offset."""
+        if not mark_metadatas:
+            return {}
+        index = max(bisect_right(mark_offsets, max(offset, 0)) - 1, 0)
+        return mark_metadatas[index]
@@ -0,0 +1,143 @@
+from typing import Dict, List, Tuple
+from services.prompt_builder import TokenCounter
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SEPARATOR = "\n\n"
+
+# Shortest prefix of the next chunk used to locate its overlap with the previous one
+OVERLAP_ANCHOR_CHARS = 16
+
+# Don't bother adding a truncated run smaller than this
+MIN_PARTIAL_TOKENS = 32
+
+
+def merge_overlapping(previous: str, following: str, max_overlap: int) -> str:
+    """
+    Join two consecutive chunks, dropping the text they share.
+
+    Args:
+        previous: Earlier chunk
+        following: Chunk that starts inside the end of previous
+        max_overlap: Longest overlap to look for, in characters
+
+    Returns:
+        The joined text (or both texts separated, if they don't overlap)
+    """
+    anchor = following[:OVERLAP_ANCHOR_CHARS]
+    if anchor:
+        start = max(len(previous) - max_overlap, 0)
+        position = previous.find(anchor, start)
+        # The earliest match gives the longest overlap
+        while position != -1:
+            if following.startswith(previous[position:]):
+                return previous + following[len(previous) - position:]
+            position = previous.find(anchor, position + 1)
+    return previous + CHUNK_SEPARATOR + following
+
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into a token-bounded prompt context.
+
+    Duplicate chunks are dropped, consecutive chunks of the same file
+    (adjacent chunk_index values) are merged with their shared overlap
+    removed, and the resulting runs are added in order of relevance until
+    the token budget is used, truncating the last one if needed.
+    """
+
+    def __init__(self, tokens: TokenCounter, token_budget: int, max_overlap: int):
+        """
+        Initialize the builder.
+
+        Args:
+            tokens: Token counter for the language model
+            token_budget: Maximum tokens of context per prompt
+            max_overlap: Longest chunk overlap to remove, in characters
+        """
+        self.tokens = tokens
+        self.token_budget = token_budget
+        self.max_overlap = max_overlap
+
+    def build(self, search_results: List[Dict]) -> Tuple[str, List[Dict]]:
+        """
+        Build the context for a prompt.
+
+        Args:
+            search_results: Retrieved chunks, most relevant first
+
+        Returns:
+            Tuple of (context text, results that made it into the context)
+        """
+        runs = self._merge_runs(self._deduplicate(search_results))
+
+        parts: List[str] = []
+        included: List[Dict] = []
+        used = 0
+        for run in runs:
+            text = run['content']
+            tokens = self.tokens.count(text)
+            remaining = self.token_budget - used
+            if tokens > remaining:
+                if remaining < MIN_PARTIAL_TOKENS:
+                    break
+                text = self.tokens.truncate(text, remaining)
+                tokens = self.tokens.count(text)
+            parts.append(text)
+            included.extend(run['results'])
+            used += tokens
+            if used >= self.token_budget:
+                break
+
+        logger.debug(
+            f"Packed {len(included)}/{len(search_results)} chunks "
+            f"into {len(parts)} runs, {used} tokens"
+        )
+        return CHUNK_SEPARATOR.join(parts), included
+
+    @staticmethod
+    def _deduplicate(search_results: List[Dict]) -> List[Dict]:
+        """Drop chunks whose text is repeated in a more relevant chunk."""
+        unique: List[Dict] = []
+        for result in search_results:
+            content = result['content'].strip()
+            if not content or any(content in kept['content'] for kept in unique):
+                continue
+            unique.append(result)
+        return unique
+
+    def _merge_runs(self, search_results: List[Dict]) -> List[Dict]:
+        """
+        Merge chunks with consecutive chunk_index values from the same file.
+
+        Returns:
+            Runs ordered by their most relevant chunk, each with "content"
+            and the "results" it was built from
+        """
+        by_file: Dict[str, List[Tuple[int, int, Dict]]] = {}
+        runs: List[Dict] = []
+        for rank, result in enumerate(search_results):
+            metadata = result.get('metadata', {})
+            if 'file_id' in metadata and 'chunk_index' in metadata:
+                by_file.setdefault(metadata['file_id'], []).append(
+                    (int(metadata['chunk_index']), rank, result)
+                )
+            else:
+                runs.append({"rank": rank, "content": result['content'], "results": [result]})
+
+        for chunks in by_file.values():
+            chunks.sort(key=lambda chunk: chunk[0])
+            run = None
+            for chunk_index, rank, result in chunks:
+                if run is not None and chunk_index == run['last_index'] + 1:
+                    run['content'] = merge_overlapping(run['content'], result['content'], self.max_overlap)
+                    run['results'].append(result)
+                    run['rank'] = min(run['rank'], rank)
+                    run['last_index'] = chunk_index
+                    continue
+                run = {"rank": rank, "content": result['content'], "results": [result], "last_index": chunk_index}
+                runs.append(run)
+
+        runs.sort(key=lambda run: run['rank'])
+        return runs
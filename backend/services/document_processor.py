@@ -1,88 +1,364 @@
 from pathlib import Path
-from typing import Optional, Dict
+from typing import BinaryIO, Callable, Iterator, List, Optional, Dict, Tuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from collections import deque
+import multiprocessing
+import threading
 import aiofiles
+import hashlib
+import os
 import uuid
+import zipfile
 import logging
 from pypdf import PdfReader
 from docx import Document
 import openpyxl
-import pandas as pd
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_SIZE."""
+    
+    def __init__(self, max_size: int):
+        super().__init__(f"File exceeds the maximum upload size of {max_size} bytes")
+        self.max_size = max_size
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF (runs in a worker process)."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def _extract_file_segments(file_path: str) -> List[Tuple[str, Dict]]:
+    """Extract all text segments of a file (runs in a worker process)."""
+    return list(DocumentProcessor.iter_text_segments(Path(file_path), parallel=False))
+
 class DocumentProcessor:
     """Service for processing uploaded documents."""
     
+    _pdf_pool: Optional[ProcessPoolExecutor] = None
+    _pdf_pool_lock = threading.Lock()
+    
+    @classmethod
+    def _get_pdf_pool(cls) -> ProcessPoolExecutor:
+        """Get the shared extraction process pool (PDF pages and bulk files), creating it on first use."""
+        with cls._pdf_pool_lock:
+            if cls._pdf_pool is None:
+                # Spawn rather than fork: the server process is multi-threaded
+                cls._pdf_pool = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXTRACT_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return cls._pdf_pool
+    
+    @classmethod
+    def shutdown(cls):
+        """Stop the extraction process pool, if it was started."""
+        with cls._pdf_pool_lock:
+            if cls._pdf_pool is not None:
+                cls._pdf_pool.shutdown(wait=True, cancel_futures=True)
+                cls._pdf_pool = None
+    
     @staticmethod
-    async def save_upload_file(file, filename: str) -> tuple[str, Path]:
+    async def save_upload_file(
+        file,
+        filename: str,
+        max_size: Optional[int] = None
+    ) -> tuple[str, Path, str]:
         """
-        Save uploaded file to disk.
+        Stream an uploaded file to disk.
+        
+        The body is copied in UPLOAD_CHUNK_SIZE pieces, so memory use does not
+        grow with file size. MAX_UPLOAD_SIZE is enforced while streaming, a
+        SHA-256 of the content is computed along the way, and the file only
+        appears under its final name once fully written (temp file + rename).
         
         Args:
             file: Uploaded file object
             filename: Original filename
+            max_size: Size limit in bytes (defaults to MAX_UPLOAD_SIZE)
             
         Returns:
-            Tuple of (file_id, file_path)
+            Tuple of (file_id, file_path, sha256 hex digest)
+            
+        Raises:
+            UploadTooLargeError: If the file exceeds the size limit
         """
+        max_size = max_size or settings.MAX_UPLOAD_SIZE
+        
+        # Generate unique file ID
+        file_id = str(uuid.uuid4())
+        file_extension = Path(filename).suffix
+        new_filename = f"{file_id}{file_extension}"
+        file_path = settings.UPLOAD_DIR / new_filename
+        
+        # Partial files live in a subdirectory on the same filesystem, so
+        # they never show up as documents and the final rename is atomic
+        temp_dir = settings.UPLOAD_DIR / ".partial"
+        temp_dir.mkdir(exist_ok=True)
+        temp_path = temp_dir / f"{new_filename}.part"
+        
+        hasher = hashlib.sha256()
+        size = 0
+        
         try:
-            # Generate unique file ID
-            file_id = str(uuid.uuid4())
-            file_extension = Path(filename).suffix
-            new_filename = f"{file_id}{file_extension}"
-            file_path = settings.UPLOAD_DIR / new_filename
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadTooLargeError(max_size)
+                    
+                    hasher.update(chunk)
+                    await f.write(chunk)
             
-            # Save file
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+            os.replace(temp_path, file_path)
             
-            logger.info(f"File saved: {new_filename}")
-            return file_id, file_path
+            logger.info(f"File saved: {new_filename} ({size} bytes)")
+            return file_id, file_path, hasher.hexdigest()
             
+        except UploadTooLargeError:
+            temp_path.unlink(missing_ok=True)
+            logger.warning(f"Upload rejected, exceeds {max_size} bytes: {filename}")
+            raise
         except Exception as e:
+            temp_path.unlink(missing_ok=True)
             logger.error(f"Error saving file: {e}")
             raise
     
     @staticmethod
-    def extract_text_from_pdf(file_path: Path) -> str:
-        """Extract text from PDF file."""
+    def store_stream(source: BinaryIO, filename: str, max_size: Optional[int] = None) -> tuple[str, Path, str]:
+        """
+        Copy a readable binary stream into the upload directory (blocking).
+        
+        Same layout, hashing and atomic rename as save_upload_file; used for
+        archive members and local files.
+        
+        Args:
+            source: Stream to copy
+            filename: Original filename (its extension is kept)
+            max_size: Optional size limit in bytes
+            
+        Returns:
+            Tuple of (file_id, file_path, sha256 hex digest)
+            
+        Raises:
+            UploadTooLargeError: If the stream exceeds max_size
+        """
+        file_id = str(uuid.uuid4())
+        new_filename = f"{file_id}{Path(filename).suffix}"
+        file_path = settings.UPLOAD_DIR / new_filename
+        temp_dir = settings.UPLOAD_DIR / ".partial"
+        temp_dir.mkdir(exist_ok=True)
+        temp_path = temp_dir / f"{new_filename}.part"
+        
+        hasher = hashlib.sha256()
+        size = 0
         try:
-            reader = PdfReader(str(file_path))
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
-        except Exception as e:
-            logger.error(f"Error extracting PDF text: {e}")
+            with open(temp_path, 'wb') as f:
+                while True:
+                    chunk = source.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise UploadTooLargeError(max_size)
+                    hasher.update(chunk)
+                    f.write(chunk)
+            os.replace(temp_path, file_path)
+            return file_id, file_path, hasher.hexdigest()
+        except Exception:
+            temp_path.unlink(missing_ok=True)
             raise
     
     @staticmethod
-    def extract_text_from_docx(file_path: Path) -> str:
-        """Extract text from DOCX file."""
+    def extract_archive(
+        archive_path: Path,
+        max_bytes: Optional[int] = None,
+        max_members: Optional[int] = None
+    ) -> Tuple[List[Tuple[str, Path, str, str]], List[Dict], int]:
+        """
+        Store the supported documents inside a zip archive as individual uploads (blocking).
+        
+        Members are streamed out one at a time with MAX_UPLOAD_SIZE enforced on
+        each, and only their base names are used, so archive paths cannot
+        escape the upload directory. The optional caps bound what one archive
+        can write however small it is compressed (zip bombs): extraction
+        stops once max_members members have been looked at, and members
+        only get the part of max_bytes that earlier ones left.
+        
+        Args:
+            archive_path: Path to the zip file
+            max_bytes: Optional limit on the total bytes extracted
+            max_members: Optional limit on the number of members handled
+            
+        Returns:
+            Tuple of (stored files as (file_id, path, filename, sha256),
+            rejected members as {"filename", "reason"}, bytes extracted)
+        """
+        stored = []
+        rejected = []
+        written = 0
+        members = 0
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                filename = Path(info.filename).name
+                if info.is_dir() or not filename or filename.startswith('.') or '__MACOSX' in info.filename:
+                    continue
+                if max_members is not None and members >= max_members:
+                    rejected.append({"filename": filename, "reason": "Too many files; remaining archive members skipped"})
+                    break
+                members += 1
+                if Path(filename).suffix.lower() not in settings.ALLOWED_EXTENSIONS:
+                    rejected.append({"filename": filename, "reason": "File type not allowed"})
+                    continue
+                if info.file_size > settings.MAX_UPLOAD_SIZE:
+                    rejected.append({"filename": filename, "reason": "File too large"})
+                    continue
+                
+                limit = settings.MAX_UPLOAD_SIZE
+                if max_bytes is not None:
+                    limit = min(limit, max_bytes - written)
+                    if info.file_size > limit or limit <= 0:
+                        rejected.append({"filename": filename, "reason": "Bulk upload size limit reached"})
+                        continue
+                try:
+                    with archive.open(info) as member:
+                        file_id, file_path, sha256 = DocumentProcessor.store_stream(member, filename, limit)
+                    written += file_path.stat().st_size
+                    stored.append((file_id, file_path, filename, sha256))
+                except UploadTooLargeError:
+                    reason = "File too large" if limit == settings.MAX_UPLOAD_SIZE else "Bulk upload size limit reached"
+                    rejected.append({"filename": filename, "reason": reason})
+                except Exception as e:
+                    logger.error(f"Error extracting {filename} from archive: {e}")
+                    rejected.append({"filename": filename, "reason": "Could not extract file"})
+        return stored, rejected, written
+    
+    @staticmethod
+    def extract_many(file_paths: List[Path]) -> Iterator[Tuple[int, List[Tuple[str, Dict]], Optional[Exception]]]:
+        """
+        Extract the text segments of many files in parallel.
+        
+        Whole files are extracted on the extraction process pool, with a
+        bounded number in flight, and yielded as they finish. A failure only
+        affects its own file.
+        
+        Args:
+            file_paths: Files to extract
+            
+        Yields:
+            Tuples of (index into file_paths, segments, exception or None)
+        """
+        if settings.PDF_EXTRACT_PROCESSES <= 1:
+            for index, file_path in enumerate(file_paths):
+                try:
+                    yield index, list(DocumentProcessor.iter_text_segments(file_path)), None
+                except Exception as e:
+                    yield index, [], e
+            return
+        
+        pool = DocumentProcessor._get_pdf_pool()
+        pending = iter(enumerate(file_paths))
+        in_flight = {}
+        max_in_flight = settings.PDF_EXTRACT_PROCESSES * 2
+        
+        def submit_next() -> bool:
+            item = next(pending, None)
+            if item is None:
+                return False
+            index, file_path = item
+            in_flight[pool.submit(_extract_file_segments, str(file_path))] = index
+            return True
+        
         try:
-            doc = Document(str(file_path))
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text.strip()
-        except Exception as e:
-            logger.error(f"Error extracting DOCX text: {e}")
-            raise
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+            
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    submit_next()
+                    try:
+                        yield index, future.result(), None
+                    except Exception as e:
+                        yield index, [], e
+        finally:
+            for future in in_flight:
+                future.cancel()
     
     @staticmethod
-    def extract_text_from_txt(file_path: Path) -> str:
-        """Extract text from TXT file."""
+    def iter_pdf_pages(
+        file_path: Path,
+        progress: Optional[Callable[[int, int], None]] = None,
+        parallel: bool = True
+    ) -> Iterator[str]:
+        """
+        Yield the text of each PDF page, in order.
+        
+        Page ranges of PDF_PAGES_PER_TASK pages are extracted in parallel on
+        a process pool. Only a bounded window of ranges is in flight at once,
+        so memory use does not grow with the number of pages.
+        
+        Args:
+            file_path: Path to the PDF
+            progress: Optional callback receiving (pages_done, pages_total)
+            parallel: Use the process pool (off inside pool workers)
+            
+        Yields:
+            Text of each page
+        """
+        total_pages = len(PdfReader(str(file_path)).pages)
+        pages_per_task = max(settings.PDF_PAGES_PER_TASK, 1)
+        
+        if not parallel or settings.PDF_EXTRACT_PROCESSES <= 1 or total_pages <= pages_per_task:
+            reader = PdfReader(str(file_path))
+            for page_number, page in enumerate(reader.pages, start=1):
+                yield page.extract_text() or ""
+                if progress:
+                    progress(page_number, total_pages)
+            return
+        
+        pool = DocumentProcessor._get_pdf_pool()
+        ranges = iter(range(0, total_pages, pages_per_task))
+        in_flight = deque()
+        max_in_flight = settings.PDF_EXTRACT_PROCESSES * 2
+        pages_done = 0
+        
+        def submit_next() -> bool:
+            start = next(ranges, None)
+            if start is None:
+                return False
+            end = min(start + pages_per_task, total_pages)
+            in_flight.append(pool.submit(_extract_pdf_page_range, str(file_path), start, end))
+            return True
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        except Exception as e:
-            logger.error(f"Error extracting TXT text: {e}")
-            raise
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+            
+            while in_flight:
+                page_texts = in_flight.popleft().result()
+                submit_next()
+                for page_text in page_texts:
+                    pages_done += 1
+                    yield page_text
+                    if progress:
+                        progress(pages_done, total_pages)
+        finally:
+            for future in in_flight:
+                future.cancel()
     
     @staticmethod
     def extract_text_from_excel(file_path: Path) -> str:
         """Extract text from Excel file."""
         try:
+            import pandas as pd
+            
             df = pd.read_excel(file_path, sheet_name=None)
             text = ""
             for sheet_name, sheet_df in df.items():
@@ -94,31 +370,99 @@ class DocumentProcessor:
             raise
     
     @staticmethod
-    def extract_text(file_path: Path) -> str:
+    def iter_text_segments(
+        file_path: Path,
+        progress: Optional[Callable[[int, int], None]] = None,
+        parallel: bool = True
+    ) -> Iterator[Tuple[str, Dict]]:
         """
-        Extract text from file based on extension.
+        Yield a file's text as a stream of segments, without loading it all.
+        
+        PDFs yield pages ({'page': n}), DOCX files yield paragraphs, TXT files
+        yield blocks of lines and Excel files yield rows ({'sheet': name}).
         
         Args:
             file_path: Path to the file
+            progress: Optional callback receiving (pages_done, pages_total);
+                non-paged formats report a single page once fully read
+            parallel: Extract PDF pages on the process pool
             
-        Returns:
-            Extracted text content
+        Yields:
+            Tuples of (segment text, segment metadata)
         """
         extension = file_path.suffix.lower()
         
-        if extension == '.pdf':
-            return DocumentProcessor.extract_text_from_pdf(file_path)
-        elif extension == '.docx':
-            return DocumentProcessor.extract_text_from_docx(file_path)
-        elif extension == '.txt':
-            return DocumentProcessor.extract_text_from_txt(file_path)
-        elif extension in ['.xlsx', '.xls']:
-            return DocumentProcessor.extract_text_from_excel(file_path)
-        else:
-            raise ValueError(f"Unsupported file type: {extension}")
+        try:
+            if extension == '.pdf':
+                pages = DocumentProcessor.iter_pdf_pages(file_path, progress, parallel)
+                for page_number, page_text in enumerate(pages, start=1):
+                    yield page_text, {'page': page_number}
+                return
+            
+            if extension == '.docx':
+                doc = Document(str(file_path))
+                for paragraph in doc.paragraphs:
+                    yield paragraph.text, {}
+            elif extension == '.txt':
+                yield from DocumentProcessor._iter_txt_blocks(file_path)
+            elif extension == '.xlsx':
+                yield from DocumentProcessor._iter_xlsx_rows(file_path)
+            elif extension == '.xls':
+                yield DocumentProcessor.extract_text_from_excel(file_path), {}
+            else:
+                raise ValueError(f"Unsupported file type: {extension}")
+            
+            if progress:
+                progress(1, 1)
+        except Exception as e:
+            logger.error(f"Error extracting text segments from {file_path.name}: {e}")
+            raise
+    
+    @staticmethod
+    def _iter_txt_blocks(file_path: Path, block_size: int = 64 * 1024) -> Iterator[Tuple[str, Dict]]:
+        """Yield a text file in blocks of whole lines of roughly block_size characters."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            lines = []
+            size = 0
+            for line in f:
+                lines.append(line)
+                size += len(line)
+                if size >= block_size:
+                    yield "".join(lines).rstrip("\n"), {}
+                    lines = []
+                    size = 0
+            if lines:
+                yield "".join(lines).rstrip("\n"), {}
     
     @staticmethod
-    def get_file_metadata(file_path: Path, filename: str, file_id: str) -> Dict:
+    def _iter_xlsx_rows(file_path: Path) -> Iterator[Tuple[str, Dict]]:
+        """Yield each sheet's rows as "column: value" lines, reading in read-only mode."""
+        workbook = openpyxl.load_workbook(str(file_path), read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield f"=== Sheet: {sheet.title} ===", {'sheet': sheet.title}
+                headers = None
+                for row in sheet.iter_rows(values_only=True):
+                    if headers is None:
+                        headers = [str(cell) if cell is not None else "" for cell in row]
+                        continue
+                    cells = [
+                        f"{headers[i] if i < len(headers) and headers[i] else f'Column {i + 1}'}: {cell}"
+                        for i, cell in enumerate(row)
+                        if cell is not None and str(cell).strip()
+                    ]
+                    if cells:
+                        yield " | ".join(cells), {'sheet': sheet.title}
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def get_file_metadata(
+        file_path: Path,
+        filename: str,
+        file_id: str,
+        sha256: Optional[str] = None
+    ) -> Dict:
         """
         Get metadata for a file.
         
@@ -126,30 +470,43 @@ class DocumentProcessor:
             file_path: Path to the file
             filename: Original filename
             file_id: Unique file identifier
+            sha256: Optional content hash computed while saving
             
         Returns:
             Dictionary of metadata
         """
-        return {
+        metadata = {
             'file_id': file_id,
             'filename': filename,
             'file_type': file_path.suffix.lower(),
             'file_size': file_path.stat().st_size,
             'source': str(file_path)
         }
+        if sha256:
+            metadata['sha256'] = sha256
+        return metadata
     
     @staticmethod
-    async def delete_file(file_id: str) -> bool:
+    async def delete_file(file_id: str, file_path: Optional[Path] = None) -> bool:
         """
         Delete a file from disk.
         
         Args:
             file_id: The file ID to delete
+            file_path: Stored path of the file, if known (avoids a directory scan)
             
         Returns:
             True if successful
         """
         try:
+            if file_path is not None:
+                if file_path.is_file():
+                    file_path.unlink()
+                    logger.info(f"Deleted file: {file_path.name}")
+                    return True
+                logger.warning(f"File not found: {file_id}")
+                return False
+            
             # Find file with this ID
             for file_path in settings.UPLOAD_DIR.glob(f"{file_id}.*"):
                 file_path.unlink()
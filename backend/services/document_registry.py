@@ -0,0 +1,420 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from config import settings
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Document statuses
+DOC_PROCESSING = "processing"
+DOC_ACTIVE = "active"
+DOC_FAILED = "failed"
+
+# Sortable list fields and the columns they map to
+SORT_FIELDS = {
+    "upload_date": "uploaded_at",
+    "filename": "filename COLLATE NOCASE",
+    "size": "size",
+    "chunk_count": "chunk_count",
+    "status": "status",
+}
+
+_COLUMNS = "file_id, filename, file_type, size, sha256, path, status, chunk_count, error, uploaded_at"
+
+
+class DocumentRegistry:
+    """
+    SQLite registry of uploaded documents.
+
+    One row per file, written by the upload and ingestion pipeline, so
+    document listings are answered from a small indexed table instead of
+    scanning every chunk in the vector store or the upload directory. It
+    also maps each file_id to its stored path, and triggers keep a one-row
+    table of document and byte counters in step with every change, so
+    storage stats are a constant-time read. Failed documents (whose upload
+    has been removed) are not counted. Ingestion job progress is kept here
+    too, so every API worker can answer job status queries.
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Initialize the registry.
+
+        Args:
+            db_path: SQLite database file
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        # SQLite connections must not be used across fork (prefork server workers)
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                file_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                uploaded_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_uploaded_at ON documents (uploaded_at);
+            CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents (filename COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status);
+            
+            CREATE TABLE IF NOT EXISTS document_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                documents INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO document_stats (id, documents, bytes)
+                SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM documents WHERE status != 'failed';
+            
+            CREATE TRIGGER IF NOT EXISTS documents_stats_insert AFTER INSERT ON documents
+            WHEN NEW.status != 'failed'
+            BEGIN
+                UPDATE document_stats
+                SET documents = documents + 1, bytes = bytes + NEW.size WHERE id = 1;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS documents_stats_delete AFTER DELETE ON documents
+            WHEN OLD.status != 'failed'
+            BEGIN
+                UPDATE document_stats
+                SET documents = documents - 1, bytes = bytes - OLD.size WHERE id = 1;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS documents_stats_update AFTER UPDATE OF status, size ON documents
+            BEGIN
+                UPDATE document_stats
+                SET documents = documents - (OLD.status != 'failed') + (NEW.status != 'failed'),
+                    bytes = bytes
+                        - (CASE WHEN OLD.status != 'failed' THEN OLD.size ELSE 0 END)
+                        + (CASE WHEN NEW.status != 'failed' THEN NEW.size ELSE 0 END)
+                WHERE id = 1;
+            END;
+            
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                finished_at REAL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_finished_at ON ingestion_jobs (finished_at);
+            """
+        )
+        conn.commit()
+
+    def _forget_connections(self):
+        """Drop connections inherited from the parent process."""
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        document = dict(row)
+        document['uploaded_at'] = datetime.fromisoformat(document['uploaded_at'])
+        return document
+
+    def register(
+        self,
+        file_id: str,
+        filename: str,
+        path: Path,
+        size: int,
+        sha256: Optional[str] = None,
+        status: str = DOC_PROCESSING,
+        chunk_count: int = 0,
+        uploaded_at: Optional[datetime] = None
+    ):
+        """Add (or replace) a document."""
+        now = datetime.now().isoformat()
+        conn = self._connection()
+        with conn:
+            # REPLACE would skip the delete trigger, so replace explicitly
+            conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+            conn.execute(
+                f"INSERT INTO documents ({_COLUMNS}, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)",
+                (
+                    file_id, filename, Path(path).suffix.lower(), size, sha256, str(path),
+                    status, chunk_count, (uploaded_at.isoformat() if uploaded_at else now), now
+                )
+            )
+
+    def update_status(
+        self,
+        file_id: str,
+        status: str,
+        chunk_count: Optional[int] = None,
+        error: Optional[str] = None
+    ):
+        """Record the outcome of ingesting a document."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE documents SET status = ?, chunk_count = COALESCE(?, chunk_count), "
+                "error = ?, updated_at = ? WHERE file_id = ?",
+                (status, chunk_count, error, datetime.now().isoformat(), file_id)
+            )
+
+    def get_path(self, file_id: str) -> Optional[Path]:
+        """Get the stored path of a document's upload."""
+        row = self._connection().execute(
+            "SELECT path FROM documents WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        return Path(row[0]) if row is not None else None
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get the number of stored documents and their total size in bytes."""
+        documents, total_bytes = self._connection().execute(
+            "SELECT documents, bytes FROM document_stats WHERE id = 1"
+        ).fetchone()
+        return {"documents": documents, "bytes": total_bytes}
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """Get a document by file ID."""
+        row = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM documents WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        sort: str = "upload_date",
+        descending: bool = True,
+        status: Optional[str] = None
+    ) -> Tuple[List[Dict], int]:
+        """
+        Get a page of documents.
+
+        Args:
+            offset: Number of documents to skip
+            limit: Maximum number of documents to return (all if None)
+            sort: One of SORT_FIELDS
+            descending: Sort order
+            status: Only documents with this status
+
+        Returns:
+            Tuple of (documents, total matching documents)
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Cannot sort by {sort}; choose one of {', '.join(SORT_FIELDS)}")
+
+        where = "WHERE status = ?" if status else ""
+        params: List = [status] if status else []
+        conn = self._connection()
+
+        total = conn.execute(f"SELECT COUNT(*) FROM documents {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {_COLUMNS} FROM documents {where} "
+            f"ORDER BY {SORT_FIELDS[sort]} {'DESC' if descending else 'ASC'}, file_id "
+            "LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset]
+        ).fetchall()
+        return [self._to_dict(row) for row in rows], total
+
+    def count(self) -> int:
+        """Get the number of registered documents."""
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def delete(self, file_id: str) -> bool:
+        """Remove a document. Returns False if it was not registered."""
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,)).rowcount > 0
+
+    def clear(self):
+        """Remove every document."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("UPDATE document_stats SET documents = 0, bytes = 0 WHERE id = 1")
+
+    def save_job(self, job_id: str, kind: str, state: Dict, finished: bool = False):
+        """
+        Store a snapshot of an ingestion job's progress.
+
+        Args:
+            job_id: Job identifier
+            kind: Job type ("document" or "bulk")
+            state: The job's status dictionary (datetimes are stored as ISO strings)
+            finished: Whether the job has completed or failed
+        """
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingestion_jobs (job_id, kind, state, finished_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    job_id, kind, json.dumps(state, default=lambda value: value.isoformat()),
+                    now if finished else None, now
+                )
+            )
+
+    def get_job(self, job_id: str, kind: str) -> Optional[Dict]:
+        """Get the last stored snapshot of an ingestion job."""
+        row = self._connection().execute(
+            "SELECT state FROM ingestion_jobs WHERE job_id = ? AND kind = ?", (job_id, kind)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def prune_jobs(self, finished_before: float) -> int:
+        """Remove jobs that finished before a Unix timestamp. Returns the number removed."""
+        conn = self._connection()
+        with conn:
+            return conn.execute(
+                "DELETE FROM ingestion_jobs WHERE finished_at < ?", (finished_before,)
+            ).rowcount
+
+    def reconcile(self, upload_dir: Path, fix: bool = False, grace_seconds: float = 0) -> Dict:
+        """
+        Compare the registry with the upload directory and recount the stats.
+
+        Args:
+            upload_dir: Directory holding stored uploads
+            fix: Delete unregistered files, drop rows whose file is gone,
+                correct sizes and reset the counters
+            grace_seconds: Unregistered files modified more recently than
+                this are in-flight uploads (saved, not registered yet) and
+                are skipped rather than treated as orphans
+
+        Returns:
+            Report with orphan files, skipped recent files, missing file IDs,
+            size mismatches and the counters before and after
+        """
+        conn = self._connection()
+        stats_before = self.get_stats()
+        registered_paths = set()
+        missing: List[str] = []
+        size_mismatches: List[Dict] = []
+
+        rows = conn.execute(
+            "SELECT file_id, path, size FROM documents WHERE status != ?", (DOC_FAILED,)
+        ).fetchall()
+        for file_id, path, size in rows:
+            path = Path(path)
+            registered_paths.add(path.resolve())
+            if not path.is_file():
+                missing.append(file_id)
+                continue
+            actual_size = path.stat().st_size
+            if actual_size != size:
+                size_mismatches.append({"file_id": file_id, "registered": size, "actual": actual_size})
+
+        orphans = []
+        recent = []
+        cutoff = time.time() - grace_seconds
+        for path in upload_dir.iterdir():
+            if not path.is_file() or path.name == ".gitkeep" or path.resolve() in registered_paths:
+                continue
+            try:
+                modified = path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            (recent if modified > cutoff else orphans).append(path)
+
+        if fix:
+            with conn:
+                conn.executemany("DELETE FROM documents WHERE file_id = ?", [(file_id,) for file_id in missing])
+                conn.executemany(
+                    "UPDATE documents SET size = ? WHERE file_id = ?",
+                    [(m['actual'], m['file_id']) for m in size_mismatches]
+                )
+                conn.execute(
+                    "UPDATE document_stats SET "
+                    "documents = (SELECT COUNT(*) FROM documents WHERE status != 'failed'), "
+                    "bytes = (SELECT COALESCE(SUM(size), 0) FROM documents WHERE status != 'failed') "
+                    "WHERE id = 1"
+                )
+            for path in orphans:
+                path.unlink(missing_ok=True)
+            logger.info(
+                f"Reconciled document registry: removed {len(orphans)} orphan files "
+                f"and {len(missing)} missing documents, fixed {len(size_mismatches)} sizes"
+            )
+
+        return {
+            "orphan_files": [path.name for path in orphans],
+            "recent_unregistered_files": [path.name for path in recent],
+            "missing_files": missing,
+            "size_mismatches": size_mismatches,
+            "stats_before": stats_before,
+            "stats_after": self.get_stats(),
+            "fixed": fix,
+        }
+
+    def backfill(self, chunk_metadatas: Iterable[Dict]) -> int:
+        """
+        Register documents ingested before the registry existed.
+
+        Args:
+            chunk_metadatas: Metadata of every chunk in the vector store
+
+        Returns:
+            Number of documents added
+        """
+        documents: Dict[str, Dict] = {}
+        for metadata in chunk_metadatas:
+            file_id = metadata.get('file_id')
+            if not file_id:
+                continue
+            document = documents.get(file_id)
+            if document is None:
+                document = documents[file_id] = {"metadata": metadata, "chunks": 0}
+            document['chunks'] += 1
+
+        added = 0
+        for file_id, document in documents.items():
+            if self.get(file_id) is not None:
+                continue
+            metadata = document['metadata']
+            path = Path(metadata.get('source', ''))
+            uploaded_at = (
+                datetime.fromtimestamp(path.stat().st_ctime) if path.is_file() else datetime.now()
+            )
+            self.register(
+                file_id=file_id,
+                filename=metadata.get('filename', 'Unknown'),
+                path=path,
+                size=metadata.get('file_size', 0),
+                sha256=metadata.get('sha256'),
+                status=DOC_ACTIVE,
+                chunk_count=document['chunks'],
+                uploaded_at=uploaded_at
+            )
+            added += 1
+
+        if added:
+            logger.info(f"Registered {added} previously ingested documents")
+        return added
+
+# Global instance
+document_registry = DocumentRegistry(settings.DOCUMENT_REGISTRY_PATH)
@@ -0,0 +1,344 @@
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import sqlite3
+import sys
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKEND_DEFAULT = "sentence-transformers"  # fp32 PyTorch
+EMBEDDING_BACKEND_INT8 = "int8"  # PyTorch with dynamically int8-quantized Linear layers
+EMBEDDING_BACKEND_ONNX = "onnx"  # ONNX Runtime (sentence-transformers>=3.2 with optimum[onnxruntime])
+EMBEDDING_BACKENDS = (EMBEDDING_BACKEND_DEFAULT, EMBEDDING_BACKEND_INT8, EMBEDDING_BACKEND_ONNX)
+
+
+def chunk_store_model_key(model_name: str, backend: str) -> str:
+    """
+    Name chunk vectors are stored under.
+
+    Quantized or exported backends produce slightly different vectors, so
+    they get their own keys; the default backend keeps the bare model name
+    so existing stores stay valid.
+    """
+    return model_name if backend == EMBEDDING_BACKEND_DEFAULT else f"{model_name}@{backend}"
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Sentence-transformers encoder with a selectable CPU execution backend.
+
+    encode() sorts each call's texts by length before batching, so passing
+    a whole ingestion batch in one call keeps short chunks from being
+    padded to the longest chunk of the batch. Vectors are returned as
+    float32 arrays without a round trip through Python lists.
+    """
+
+    def __init__(self, model_name: str, backend: str = EMBEDDING_BACKEND_DEFAULT, batch_size: int = 64, threads: int = 0):
+        """
+        Load the model.
+
+        Args:
+            model_name: Sentence-transformers model name
+            backend: One of EMBEDDING_BACKENDS
+            batch_size: Texts per forward pass
+            threads: Intra-op threads (0 = library default); for the PyTorch
+                backends this is process-wide
+        """
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend}; choose one of {', '.join(EMBEDDING_BACKENDS)}")
+
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = max(batch_size, 1)
+
+        if backend == EMBEDDING_BACKEND_ONNX:
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            if threads > 0:
+                session_options.intra_op_num_threads = threads
+            self.model = SentenceTransformer(
+                model_name,
+                device="cpu",
+                backend="onnx",
+                model_kwargs={"provider": "CPUExecutionProvider", "session_options": session_options}
+            )
+            return
+
+        import torch
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if backend == EMBEDDING_BACKEND_INT8:
+            torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.model.eval()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as a float32 matrix, one row per text."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def compare_embeddings(baseline: SentenceTransformerEmbeddings, candidate: SentenceTransformerEmbeddings, texts: List[str], k: int = 5) -> Dict:
+    """
+    Check a candidate backend against the fp32 baseline.
+
+    Args:
+        baseline: Reference encoder (normally the default backend)
+        candidate: Encoder being evaluated
+        texts: Sample chunk texts
+        k: Neighbours compared per text
+
+    Returns:
+        Cosine similarity between the two vectors of each text, overlap of
+        each text's k nearest neighbours under both encoders, and the
+        throughput of each encoder
+    """
+    def timed(encoder):
+        started_at = time.perf_counter()
+        vectors = encoder.encode(texts)
+        return vectors, len(texts) / max(time.perf_counter() - started_at, 1e-9)
+
+    def normalize(vectors):
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    base_vectors, base_rate = timed(baseline)
+    candidate_vectors, candidate_rate = timed(candidate)
+    base_vectors = normalize(base_vectors)
+    candidate_vectors = normalize(candidate_vectors)
+    cosine = np.sum(base_vectors * candidate_vectors, axis=1)
+
+    k = min(k, len(texts) - 1)
+    overlap = None
+    if k > 0:
+        def neighbours(vectors):
+            scores = vectors @ vectors.T
+            np.fill_diagonal(scores, -np.inf)
+            return np.argsort(-scores, axis=1)[:, :k]
+
+        base_neighbours = neighbours(base_vectors)
+        candidate_neighbours = neighbours(candidate_vectors)
+        overlap = float(np.mean([
+            len(set(a) & set(b)) / k for a, b in zip(base_neighbours, candidate_neighbours)
+        ]))
+
+    return {
+        "texts": len(texts),
+        "baseline": baseline.backend,
+        "candidate": candidate.backend,
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "cosine_min": round(float(cosine.min()), 5),
+        f"top{k}_overlap": round(overlap, 4) if overlap is not None else None,
+        "baseline_texts_per_second": round(base_rate, 1),
+        "candidate_texts_per_second": round(candidate_rate, 1),
+    }
+
+
+class ChunkEmbeddingStore:
+    """
+    Persistent, content-addressed store of chunk embeddings.
+
+    Vectors are keyed by a SHA-256 of the embedding model name and the chunk
+    text, so identical chunks across uploads and document revisions are
+    only ever embedded once per model.
+    """
+
+    def __init__(self, db_path: Path, model_name: str):
+        """
+        Initialize the store.
+
+        Args:
+            db_path: SQLite database file
+            model_name: Name of the embedding model the vectors come from
+        """
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        """Get the content address of a chunk for this store's model."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Get the stored vectors for the given keys (missing keys are omitted)."""
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM chunk_embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: List[Tuple[str, np.ndarray]]):
+        """Store vectors by key."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def count(self) -> int:
+        """Get the number of stored vectors."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that avoids re-encoding repeated text.
+
+    Query vectors are kept in an in-process LRU cache of compact float32
+    arrays, capped by its approximate size in memory, so repeated searches
+    skip the encoder. Document (chunk) vectors go through an optional
+    persistent ChunkEmbeddingStore.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        max_size_mb: float,
+        chunk_store: Optional[ChunkEmbeddingStore] = None
+    ):
+        """
+        Initialize the wrapper.
+
+        Args:
+            base: Embeddings model doing the actual encoding
+            max_size_mb: Memory cap for cached query vectors
+            chunk_store: Optional persistent store for chunk vectors
+        """
+        self.base = base
+        self.chunk_store = chunk_store
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _entry_size(text: str, vector: np.ndarray) -> int:
+        return sys.getsizeof(text) + vector.nbytes
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, reusing stored vectors for previously seen chunks."""
+        vectors, _ = self.embed_documents_with_stats(texts)
+        return [vector.tolist() for vector in vectors]
+
+    def embed_documents_with_stats(self, texts: List[str]) -> Tuple[List[np.ndarray], int]:
+        """
+        Embed documents, reusing stored vectors for previously seen chunks.
+
+        Args:
+            texts: Chunk texts
+
+        Returns:
+            Tuple of (float32 vectors in input order, number served from the store)
+        """
+        if self.chunk_store is None:
+            return self._encode(texts), 0
+
+        keys = [self.chunk_store.key(text) for text in texts]
+        stored = self.chunk_store.get_many(keys)
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in stored and key not in missing:
+                missing[key] = text
+
+        if missing:
+            new_vectors = self._encode(list(missing.values()))
+            new_items = [
+                (key, np.asarray(vector, dtype=np.float32))
+                for key, vector in zip(missing.keys(), new_vectors)
+            ]
+            self.chunk_store.put_many(new_items)
+            stored.update(new_items)
+
+        cached = sum(1 for key in keys if key not in missing)
+        return [stored[key] for key in keys], cached
+
+    def _encode(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts with the base model as float32 vectors."""
+        if isinstance(self.base, SentenceTransformerEmbeddings):
+            return list(self.base.encode(texts))
+        return [np.asarray(v, dtype=np.float32) for v in self.base.embed_documents(texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the cached vector for repeated queries."""
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self._hits += 1
+                return vector.tolist()
+            self._misses += 1
+
+        vector = np.asarray(self.base.embed_query(text), dtype=np.float32)
+
+        if self.max_bytes > 0:
+            size = self._entry_size(text, vector)
+            with self._lock:
+                if text not in self._cache and size <= self.max_bytes:
+                    self._cache[text] = vector
+                    self._bytes += size
+                    while self._bytes > self.max_bytes:
+                        old_text, old_vector = self._cache.popitem(last=False)
+                        self._bytes -= self._entry_size(old_text, old_vector)
+                        self._evictions += 1
+
+        return vector.tolist()
+
+    def get_metrics(self) -> Dict:
+        """Get hit/miss counters and the cache's memory footprint."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._cache),
+                "size_mb": round(self._bytes / (1024 * 1024), 3),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 3),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+            }
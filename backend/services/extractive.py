@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sentence boundary: terminal punctuation followed by the start of a new sentence
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])["\')\]]?\s+(?=["\'(\[]?[A-Z0-9])')
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_LIST_ITEM_RE = re.compile(r'\n(?=\s*(?:[-*•]|\d+[.)])\s)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Shorter pieces (page numbers, stray headings) are not worth scoring
+MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split chunk text into sentences.
+
+    Paragraphs and list items are always separate; other line breaks are
+    treated as wrapping (as in extracted PDF text). A leading fragment that
+    starts mid-sentence (chunks overlap, so it is whole in the previous
+    chunk) is dropped.
+    """
+    sentences = []
+    for block in _PARAGRAPH_RE.split(text):
+        for item in _LIST_ITEM_RE.split(block):
+            item = _WHITESPACE_RE.sub(" ", item).strip()
+            if item:
+                sentences.extend(_SENTENCE_END_RE.split(item))
+
+    if sentences and sentences[0][:1].islower():
+        sentences = sentences[1:]
+    return [s.strip() for s in sentences if len(s.strip()) >= MIN_SENTENCE_CHARS]
+
+
+class ExtractiveAnswerer:
+    """
+    Answers from retrieved chunks without a language model.
+
+    Retrieved chunks are split into sentences, each sentence is scored by
+    cosine similarity to the query (one vectorized product over the
+    embedding model's vectors), and the best sentence is returned together
+    with neighbouring sentences of the same chunk that score nearly as
+    well, as one contiguous passage with its source. Sentence vectors are
+    kept in an in-process LRU cache, so popular chunks are not re-encoded.
+    """
+
+    def __init__(
+        self,
+        max_sentences: int,
+        max_chars: int,
+        extend_ratio: float = 0.85,
+        cache_size: int = 10000
+    ):
+        """
+        Initialize the answerer.
+
+        Args:
+            max_sentences: Longest passage, in sentences
+            max_chars: Longest passage, in characters
+            extend_ratio: A neighbouring sentence joins the passage if it
+                scores at least this fraction of the best sentence
+            cache_size: Sentence vectors kept in memory (0 disables)
+        """
+        self.max_sentences = max(max_sentences, 1)
+        self.max_chars = max_chars
+        self.extend_ratio = extend_ratio
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed_sentences(self, sentences: List[str], embeddings) -> np.ndarray:
+        """Embed sentences with the base encoder, reusing cached vectors."""
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for sentence in sentences:
+                vector = self._cache.get(sentence)
+                if vector is not None:
+                    self._cache.move_to_end(sentence)
+                    vectors[sentence] = vector
+
+        missing = [sentence for sentence in dict.fromkeys(sentences) if sentence not in vectors]
+        if missing:
+            base = embeddings.base
+            if hasattr(base, "encode"):
+                encoded = base.encode(missing)
+            else:
+                encoded = base.embed_documents(missing)
+            new_vectors = [np.asarray(vector, dtype=np.float32) for vector in encoded]
+            vectors.update(zip(missing, new_vectors))
+            if self.cache_size > 0:
+                with self._lock:
+                    for sentence, vector in zip(missing, new_vectors):
+                        self._cache[sentence] = vector
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        return np.vstack([vectors[sentence] for sentence in sentences])
+
+    def _grow(
+        self,
+        best: int,
+        positions: List[Tuple[int, int]],
+        by_position: Dict[Tuple[int, int], int],
+        sentences: List[str],
+        scores: np.ndarray
+    ) -> Tuple[float, int, int, int]:
+        """
+        Grow a passage around a sentence with neighbours from the same chunk.
+
+        Returns:
+            Tuple of (summed sentence scores, result index, first and last
+            sentence index within the result)
+        """
+        result_index, sentence_index = positions[best]
+        start = end = sentence_index
+        length = len(sentences[best])
+        total = float(scores[best])
+        while end - start + 1 < self.max_sentences:
+            candidates = []
+            for neighbour in (start - 1, end + 1):
+                i = by_position.get((result_index, neighbour))
+                if i is not None and scores[i] >= self.extend_ratio * scores[best]:
+                    candidates.append((scores[i], neighbour, i))
+            if not candidates:
+                break
+            _, neighbour, i = max(candidates)
+            if length + len(sentences[i]) + 1 > self.max_chars:
+                break
+            length += len(sentences[i]) + 1
+            total += float(scores[i])
+            start, end = min(start, neighbour), max(end, neighbour)
+        return total, result_index, start, end
+
+    def answer(
+        self,
+        query: str,
+        search_results: List[Dict],
+        embeddings,
+        min_score: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Find the passage that best answers a query.
+
+        Args:
+            query: Question (condensed, for follow-ups)
+            search_results: Retrieved chunks, most relevant first
+            embeddings: CachedEmbeddings of the vector store (its query
+                cache and base encoder are used; nothing is persisted)
+            min_score: Return None unless the best sentence scores at least this
+
+        Returns:
+            Dictionary with "text" (passage and source), "passage", "score",
+            "filename" and "elapsed_ms", or None
+        """
+        started_at = time.perf_counter()
+        # Every position is kept (overlapping chunks repeat sentences), so a
+        # passage can grow across the overlap; repeats are encoded once
+        sentences: List[str] = []
+        positions: List[Tuple[int, int]] = []  # (result, sentence within result)
+        for result_index, result in enumerate(search_results):
+            for sentence_index, sentence in enumerate(split_sentences(result['content'])):
+                sentences.append(sentence)
+                positions.append((result_index, sentence_index))
+        if not sentences:
+            return None
+
+        query_vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        matrix = self._embed_sentences(sentences, embeddings)
+        scores = matrix @ query_vector / np.maximum(
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector), 1e-12
+        )
+
+        best = int(np.argmax(scores))
+        if min_score is not None and scores[best] < min_score:
+            logger.info(f"Extractive answer skipped: best sentence score {scores[best]:.3f} < {min_score}")
+            return None
+
+        # The best sentence may appear in several overlapping chunks; grow a
+        # passage around each copy and keep the strongest
+        by_position = {position: i for i, position in enumerate(positions)}
+        result_index, start, end = max(
+            (self._grow(i, positions, by_position, sentences, scores)
+             for i in range(len(sentences)) if sentences[i] == sentences[best]),
+            key=lambda passage: passage[0]
+        )[1:]
+
+        passage = " ".join(
+            sentences[by_position[(result_index, n)]]
+            for n in range(start, end + 1)
+        )
+        if len(passage) > self.max_chars:
+            passage = passage[:self.max_chars].rsplit(" ", 1)[0] + "..."
+
+        metadata = search_results[result_index].get('metadata', {})
+        filename = metadata.get('filename', 'Unknown')
+        source = f"{filename}, page {metadata['page']}" if metadata.get('page') else filename
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        logger.info(
+            f"Extractive answer: {len(sentences)} sentences scored in {elapsed_ms:.1f}ms, "
+            f"best {scores[best]:.3f}"
+        )
+        return {
+            "text": f"{passage}\n\n(Source: {source})",
+            "passage": passage,
+            "score": float(scores[best]),
+            "filename": filename,
+            "elapsed_ms": round(elapsed_ms, 1),
+        }
@@ -0,0 +1,328 @@
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from config import settings
+import itertools
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# How often a waiting request checks for cancellation and its deadline
+POLL_SECONDS = 0.1
+
+# Retries on another process after a process dies mid-request (a prompt that
+# crashes its process should not take down every process)
+MAX_RETRIES = 1
+
+
+class InferenceUnavailableError(Exception):
+    """Raised when no inference process can take or finish a request."""
+
+
+class _ProcessLost(Exception):
+    """The process serving a request went away before producing any text."""
+
+
+def inference_socket_paths() -> List[Path]:
+    """Unix sockets of the configured inference processes."""
+    return [
+        settings.INFERENCE_SOCKET_DIR / f"inference-{i}.sock"
+        for i in range(max(settings.INFERENCE_PROCESSES, 1))
+    ]
+
+
+def request_health(socket_path: Path, timeout: float = 2.0) -> Dict:
+    """
+    Ask one inference process for its health over a short-lived connection.
+
+    Raises:
+        OSError: If the process does not answer within the timeout
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall(b'{"id": 0, "op": "health"}\n')
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Inference process closed the connection")
+    return json.loads(line)
+
+
+class _Connection:
+    """
+    One persistent, multiplexed connection to an inference process.
+
+    Any number of requests share the connection; a reader thread routes each
+    response line to the queue of the request whose ID it carries. Pending
+    requests are tracked per socket, so when a socket drops only the
+    requests sent on it are failed, not those already sent on its successor.
+    """
+
+    def __init__(self, socket_path: Path):
+        self.socket_path = socket_path
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._pending: Dict[int, "queue.Queue[Dict]"] = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def connect(self) -> socket.socket:
+        with self._state_lock:
+            return self._connect_locked()[0]
+
+    def _connect_locked(self):
+        """Open the socket if needed and return it with its pending requests. Caller holds the state lock."""
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(str(self.socket_path))
+            self._sock = sock
+            self._pending = {}
+            threading.Thread(
+                target=self._read,
+                args=(sock, self._pending),
+                name=f"inference-client-{self.socket_path.stem}",
+                daemon=True
+            ).start()
+        return self._sock, self._pending
+
+    def _read(self, sock: socket.socket, pending: Dict[int, "queue.Queue[Dict]"]):
+        """Route responses until the connection drops, then fail the requests sent on it."""
+        try:
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    message = json.loads(line)
+                    responses = pending.get(message.get("id"))
+                    if responses is not None:
+                        responses.put(message)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Lost connection to inference process {self.socket_path}: {e}")
+        finally:
+            with self._state_lock:
+                if self._sock is sock:
+                    self._sock = None
+                lost = list(pending.values())
+            sock.close()
+            for responses in lost:
+                responses.put({"event": "error", "detail": "Inference process disconnected", "disconnected": True})
+
+    def send(self, message: Dict):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        sock = self.connect()
+        with self._send_lock:
+            sock.sendall(data)
+
+    def start(self, message: Dict):
+        """
+        Send a request.
+
+        Returns:
+            Tuple of (request ID, queue receiving its responses)
+        """
+        request_id = next(self._ids)
+        responses: "queue.Queue[Dict]" = queue.Queue()
+        data = (json.dumps({**message, "id": request_id}) + "\n").encode("utf-8")
+        # Register on the socket the request is sent on, so only that
+        # socket's reader can fail it
+        with self._state_lock:
+            sock, pending = self._connect_locked()
+            pending[request_id] = responses
+        try:
+            with self._send_lock:
+                sock.sendall(data)
+        except OSError:
+            pending.pop(request_id, None)
+            raise
+        return request_id, responses
+
+    def finish(self, request_id: int):
+        # Request IDs are never reused, so a request from a dropped socket is simply not found
+        self._pending.pop(request_id, None)
+
+    def close(self):
+        with self._state_lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+
+class InferenceClient:
+    """
+    Generates text on separate inference processes (INFERENCE_MODE=remote).
+
+    Drop-in for GenerationBatcher on the API side: generate() blocks the
+    calling thread, streams text through on_text and honours cancel_event.
+    Requests go to the connected process with the fewest in flight, and a
+    request is retried on another process if its process dies before any
+    text was produced.
+    """
+
+    def __init__(self, socket_paths: List[Path], request_timeout: float):
+        """
+        Initialize the client. Connections are opened on first use.
+
+        Args:
+            socket_paths: Unix sockets of the inference processes
+            request_timeout: Seconds before a generation is cancelled and fails
+        """
+        self.request_timeout = request_timeout
+        self._connections = [_Connection(path) for path in socket_paths]
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._failed = 0
+        self._retried = 0
+
+    def generate(
+        self,
+        prompt: str,
+        on_text: Optional[Callable[[str], None]] = None,
+        cancel_event: Optional[threading.Event] = None
+    ) -> str:
+        """
+        Generate a completion (blocking).
+
+        Args:
+            prompt: Fully rendered prompt
+            on_text: Optional callback receiving text as it is decoded
+            cancel_event: Optional event; once set, generation stops early
+
+        Returns:
+            The generated text
+
+        Raises:
+            InferenceUnavailableError: If no process could finish the request
+        """
+        with self._lock:
+            self._requests += 1
+        tried = set()
+        retries = 0
+        while True:
+            connection = self._pick(tried)
+            if connection is None:
+                with self._lock:
+                    self._failed += 1
+                raise InferenceUnavailableError("No inference process is reachable")
+            tried.add(connection)
+
+            try:
+                return self._generate_on(connection, prompt, on_text, cancel_event)
+            except _ProcessLost:
+                retries += 1
+                if retries > MAX_RETRIES:
+                    with self._lock:
+                        self._failed += 1
+                    raise InferenceUnavailableError("Inference process failed while generating")
+                with self._lock:
+                    self._retried += 1
+            except InferenceUnavailableError:
+                with self._lock:
+                    self._failed += 1
+                raise
+
+    def _pick(self, tried: set) -> Optional[_Connection]:
+        """Get the least busy connection that can be opened, skipping those already tried."""
+        for connection in sorted(self._connections, key=lambda c: c.in_flight):
+            if connection in tried:
+                continue
+            try:
+                connection.connect()
+                return connection
+            except OSError:
+                tried.add(connection)
+        return None
+
+    def _generate_on(
+        self,
+        connection: _Connection,
+        prompt: str,
+        on_text: Optional[Callable[[str], None]],
+        cancel_event: Optional[threading.Event]
+    ) -> str:
+        try:
+            request_id, responses = connection.start(
+                {"op": "generate", "prompt": prompt, "stream": on_text is not None}
+            )
+        except OSError:
+            raise _ProcessLost()
+
+        def cancel():
+            try:
+                connection.send({"id": 0, "op": "cancel", "target": request_id})
+            except OSError:
+                pass
+
+        deadline = time.monotonic() + self.request_timeout
+        cancel_sent = False
+        produced = False
+        try:
+            while True:
+                try:
+                    message = responses.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    if time.monotonic() > deadline:
+                        cancel()
+                        raise InferenceUnavailableError("Inference request timed out")
+                    if cancel_event is not None and cancel_event.is_set() and not cancel_sent:
+                        # The process answers with whatever was generated so far
+                        cancel_sent = True
+                        cancel()
+                    continue
+
+                event = message.get("event")
+                if event == "token":
+                    produced = True
+                    if on_text is not None:
+                        on_text(message["text"])
+                elif event == "done":
+                    return message["text"]
+                elif event == "error":
+                    if message.get("disconnected") and not produced:
+                        raise _ProcessLost()
+                    raise InferenceUnavailableError(message.get("detail", "Inference failed"))
+        finally:
+            connection.finish(request_id)
+
+    def health(self) -> List[Dict]:
+        """Get the health of every inference process."""
+        report = []
+        for connection in self._connections:
+            try:
+                health = request_health(connection.socket_path)
+                health.pop("id", None)
+                health.pop("event", None)
+            except (OSError, ValueError) as e:
+                health = {"status": "unreachable", "error": str(e)}
+            report.append({"socket": str(connection.socket_path), **health})
+        return report
+
+    def get_metrics(self) -> Dict:
+        """Get client counters and the health of every inference process."""
+        with self._lock:
+            counters = {
+                "requests": self._requests,
+                "failed": self._failed,
+                "retried": self._retried,
+            }
+        return {
+            "mode": "remote",
+            **counters,
+            "in_flight": sum(c.in_flight for c in self._connections),
+            "processes": self.health(),
+        }
+
+    def shutdown(self):
+        """Close every connection."""
+        for connection in self._connections:
+            connection.close()
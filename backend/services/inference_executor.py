@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFullError(Exception):
+    """Raised when the inference executor cannot accept more work."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Bounded worker pool for blocking model calls (retrieval + generation)."""
+
+    def __init__(self, max_workers: int, max_queue_size: int, metrics_window: int = 1000):
+        """
+        Initialize the executor.
+
+        Args:
+            max_workers: Number of threads running inference concurrently
+            max_queue_size: Number of requests allowed to wait for a free worker
+            metrics_window: Number of recent samples kept for latency percentiles
+        """
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="inference"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._queue_wait: Deque[float] = deque(maxlen=metrics_window)
+        self._run_time: Deque[float] = deque(maxlen=metrics_window)
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> "asyncio.Future":
+        """
+        Schedule a blocking callable on the inference pool.
+
+        Admission is checked synchronously, so callers learn about a full
+        queue before they start producing a response.
+
+        Args:
+            func: Callable to execute
+            *args: Positional arguments for the callable
+            **kwargs: Keyword arguments for the callable
+
+        Returns:
+            Awaitable future resolving to the callable's return value
+
+        Raises:
+            InferenceQueueFullError: If all workers are busy and the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                self._rejected += 1
+                raise InferenceQueueFullError(settings.INFERENCE_RETRY_AFTER)
+            self._pending += 1
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._queue_wait.append(started_at - submitted_at)
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self._run_time.append(finished_at - started_at)
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+        def release(_future):
+            # Fires once whether the task finished or was cancelled while queued
+            with self._lock:
+                self._pending -= 1
+
+        future = self._executor.submit(task)
+        future.add_done_callback(release)
+        return asyncio.wrap_future(future)
+
+    @staticmethod
+    def _summarize(samples) -> Dict[str, float]:
+        """Summarize latency samples (seconds) as milliseconds."""
+        if not samples:
+            return {"avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        ordered = sorted(samples)
+        count = len(ordered)
+        return {
+            "avg_ms": round(sum(ordered) / count * 1000, 2),
+            "p50_ms": round(ordered[int(0.50 * (count - 1))] * 1000, 2),
+            "p95_ms": round(ordered[int(0.95 * (count - 1))] * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+    def get_metrics(self) -> Dict:
+        """Get queue depth, throughput counters and latency percentiles."""
+        with self._lock:
+            queue_wait = list(self._queue_wait)
+            run_time = list(self._run_time)
+            metrics = {
+                "workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "running": self._running,
+                "queued": max(self._pending - self._running, 0),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+        metrics["queue_wait"] = self._summarize(queue_wait)
+        metrics["run_time"] = self._summarize(run_time)
+        return metrics
+
+    def shutdown(self):
+        """Stop accepting work and wait for running tasks to finish."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+# Global instance
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue_size=settings.INFERENCE_QUEUE_SIZE
+)
@@ -0,0 +1,312 @@
+"""
+Out-of-process text generation (INFERENCE_MODE=remote).
+
+Each inference process loads the language model once and serves a
+JSON-lines protocol on a Unix socket. Every line carries an "id" chosen by
+the client, so any number of requests can be multiplexed over one
+connection:
+
+    -> {"id": 1, "op": "generate", "prompt": "...", "stream": true}
+    <- {"id": 1, "event": "token", "text": "..."}      (stream only, repeated)
+    <- {"id": 1, "event": "done", "text": "..."}       (or "error" with "detail")
+    -> {"id": 2, "op": "cancel", "target": 1}
+    -> {"id": 3, "op": "health"}
+    <- {"id": 3, "event": "health", "status": "ready", ...}
+
+Concurrent requests are generated together by a GenerationBatcher.
+InferenceSupervisor starts the processes, health-checks them and restarts
+any that exit, stop answering or hold a request for too long.
+
+Run with `python manage.py inference` (or `python -m services.inference_server --socket PATH`
+for a single process).
+"""
+from concurrent.futures import CancelledError
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+# Longest accepted request line (prompts are a few KB)
+MAX_LINE_BYTES = 4 * 1024 * 1024
+
+# Consecutive failed health checks before a process is restarted
+MAX_MISSED_HEALTH_CHECKS = 3
+
+
+class InferenceServer:
+    """Serves generation requests for one inference process."""
+
+    def __init__(self, socket_path: Path):
+        """
+        Initialize the server.
+
+        Args:
+            socket_path: Unix socket to listen on
+        """
+        self.socket_path = socket_path
+        self.status = STATUS_LOADING
+        self.error: Optional[str] = None
+        self.batcher = None
+        self._started: Dict[int, float] = {}  # id(cancel event) -> start time of active requests
+
+    def _load(self):
+        """Load the model and start the generation scheduler (runs on a thread)."""
+        try:
+            from config import settings
+            from services.batch_scheduler import GenerationBatcher
+            from services.llm_backends import GENERATION_KWARGS, load_causal_lm
+
+            model, tokenizer = load_causal_lm(
+                settings.LOCAL_LLM_MODEL,
+                settings.LLM_BACKEND,
+                settings.LLM_ARTIFACT_DIR,
+                threads=settings.LLM_THREADS
+            )
+            self.batcher = GenerationBatcher(
+                model=model,
+                tokenizer=tokenizer,
+                generation_kwargs=dict(GENERATION_KWARGS),
+                max_batch_size=settings.GENERATION_MAX_BATCH_SIZE,
+                max_wait_ms=settings.GENERATION_MAX_WAIT_MS
+            )
+            self.status = STATUS_READY
+            logger.info(f"Inference process {os.getpid()} ready on {self.socket_path}")
+        except Exception as e:
+            logger.error(f"Error loading language model: {e}")
+            self.error = str(e)
+            self.status = STATUS_FAILED
+
+    def health(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "status": self.status,
+            "error": self.error,
+            "pid": os.getpid(),
+            "active": len(self._started),
+            "oldest_active_seconds": round(max((now - t for t in self._started.values()), default=0.0), 1),
+            "batching": self.batcher.get_metrics() if self.batcher else None,
+        }
+
+    async def _generate(self, request: Dict, send, active: Dict[int, threading.Event]):
+        request_id = request.get("id")
+        if self.batcher is None:
+            send({"id": request_id, "event": "error", "detail": f"Language model {self.status}"})
+            return
+
+        loop = asyncio.get_running_loop()
+        cancel_event = threading.Event()
+        active[request_id] = cancel_event
+        self._started[id(cancel_event)] = time.monotonic()
+
+        on_text = None
+        if request.get("stream"):
+            # Called on the scheduler thread; queued ahead of the final result
+            def on_text(text: str):
+                loop.call_soon_threadsafe(send, {"id": request_id, "event": "token", "text": text})
+
+        try:
+            future = self.batcher.submit(request.get("prompt", ""), on_text, cancel_event)
+            try:
+                text = await asyncio.wrap_future(future)
+            except (asyncio.CancelledError, CancelledError):
+                if not cancel_event.is_set():
+                    raise
+                text = ""
+            send({"id": request_id, "event": "done", "text": text, "cancelled": cancel_event.is_set()})
+        except Exception as e:
+            logger.error(f"Error generating request {request_id}: {e}")
+            send({"id": request_id, "event": "error", "detail": str(e)})
+        finally:
+            active.pop(request_id, None)
+            self._started.pop(id(cancel_event), None)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one client connection until it closes."""
+        active: Dict[int, threading.Event] = {}
+        tasks = set()
+
+        def send(message: Dict):
+            if not writer.is_closing():
+                writer.write((json.dumps(message) + "\n").encode("utf-8"))
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    send({"id": None, "event": "error", "detail": "Invalid JSON"})
+                    continue
+
+                op = request.get("op")
+                if op == "generate":
+                    task = asyncio.create_task(self._generate(request, send, active))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif op == "cancel":
+                    cancel_event = active.get(request.get("target"))
+                    if cancel_event is not None:
+                        cancel_event.set()
+                elif op == "health":
+                    send({"id": request.get("id"), "event": "health", **self.health()})
+                else:
+                    send({"id": request.get("id"), "event": "error", "detail": f"Unknown op {op}"})
+                await writer.drain()
+        finally:
+            # The client is gone; stop generating for it
+            for cancel_event in active.values():
+                cancel_event.set()
+            writer.close()
+
+    async def serve(self):
+        """Load the model in the background and serve until SIGTERM/SIGINT."""
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, self._load)
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        self.socket_path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._handle, path=str(self.socket_path), limit=MAX_LINE_BYTES)
+
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stop.set)
+
+        async with server:
+            await stop.wait()
+
+        if self.batcher:
+            self.batcher.shutdown()
+        self.socket_path.unlink(missing_ok=True)
+
+
+class InferenceSupervisor:
+    """
+    Starts and watches a fixed set of inference processes.
+
+    A process is restarted when it exits, misses MAX_MISSED_HEALTH_CHECKS
+    health checks in a row once loaded, or holds a request longer than the
+    request timeout (a stuck generation).
+    """
+
+    def __init__(self, socket_paths: List[Path], health_interval: float, request_timeout: float):
+        """
+        Initialize the supervisor.
+
+        Args:
+            socket_paths: One Unix socket per inference process
+            health_interval: Seconds between health checks
+            request_timeout: Longest a single request may run
+        """
+        self.socket_paths = socket_paths
+        self.health_interval = health_interval
+        self.request_timeout = request_timeout
+        self._processes: Dict[Path, subprocess.Popen] = {}
+        self._missed: Dict[Path, int] = {}
+        self._loaded: Dict[Path, bool] = {}
+        self._stopping = False
+
+    def _start(self, socket_path: Path):
+        self._processes[socket_path] = subprocess.Popen(
+            [sys.executable, "-m", "services.inference_server", "--socket", str(socket_path)],
+            cwd=str(Path(__file__).resolve().parent.parent)
+        )
+        self._missed[socket_path] = 0
+        self._loaded[socket_path] = False
+        logger.info(f"Started inference process {self._processes[socket_path].pid} on {socket_path}")
+
+    def _restart(self, socket_path: Path, reason: str):
+        process = self._processes[socket_path]
+        logger.warning(f"Restarting inference process {process.pid} on {socket_path}: {reason}")
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        self._start(socket_path)
+
+    def _check(self, socket_path: Path):
+        from services.inference_client import request_health
+
+        process = self._processes[socket_path]
+        if process.poll() is not None:
+            self._restart(socket_path, f"exited with status {process.returncode}")
+            return
+
+        try:
+            health = request_health(socket_path, timeout=max(self.health_interval, 1.0))
+        except (OSError, ValueError) as e:
+            # Not listening yet, or the event loop is wedged
+            if self._loaded[socket_path]:
+                self._missed[socket_path] += 1
+                if self._missed[socket_path] >= MAX_MISSED_HEALTH_CHECKS:
+                    self._restart(socket_path, f"not answering health checks ({e})")
+            return
+
+        self._missed[socket_path] = 0
+        if health["status"] == STATUS_READY:
+            self._loaded[socket_path] = True
+        if health["oldest_active_seconds"] > self.request_timeout:
+            self._restart(socket_path, f"request running for {health['oldest_active_seconds']}s")
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def run(self) -> int:
+        """Start every process and supervise until SIGTERM/SIGINT."""
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        for socket_path in self.socket_paths:
+            self._start(socket_path)
+
+        while not self._stopping:
+            time.sleep(self.health_interval)
+            for socket_path in self.socket_paths:
+                if self._stopping:
+                    break
+                self._check(socket_path)
+
+        for process in self._processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self._processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        logger.info("Inference processes stopped")
+        return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run one inference process")
+    parser.add_argument("--socket", required=True, help="Unix socket to listen on")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(InferenceServer(Path(args.socket)).serve())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
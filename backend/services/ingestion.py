@@ -0,0 +1,528 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+from config import settings
+from services.document_processor import document_processor
+from services.document_registry import document_registry, DOC_ACTIVE, DOC_FAILED
+from services.vector_store import vector_store_service
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"  # Extraction, chunking and embedding run as a pipeline
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Minimum seconds between progress snapshots written to the document registry
+JOB_SAVE_INTERVAL = 1.0
+
+
+class IngestionJob:
+    """Progress of one document through the ingestion pipeline."""
+
+    kind = "document"
+
+    def __init__(self, file_id: str, file_path: Path, filename: str, sha256: Optional[str] = None):
+        self.job_id = str(uuid.uuid4())
+        self.file_id = file_id
+        self.file_path = file_path
+        self.filename = filename
+        self.sha256 = sha256
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.pages_total = 0
+        self.pages_parsed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.chunks_cached = 0
+        self.created_at = datetime.now()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.finished_monotonic: Optional[float] = None
+        self.saved_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate the remaining time from the page rate so far."""
+        if self.done:
+            return 0.0
+        if self.status != JOB_PROCESSING or not self.pages_parsed or not self.pages_total:
+            return None
+        elapsed = time.perf_counter() - self.started_at
+        remaining = self.pages_total - self.pages_parsed
+        return round(elapsed / self.pages_parsed * remaining, 1)
+
+    def to_dict(self) -> Dict:
+        elapsed = None
+        if self.started_at is not None:
+            end = self.finished_at if self.finished_at is not None else time.perf_counter()
+            elapsed = round(end - self.started_at, 2)
+
+        return {
+            "job_id": self.job_id,
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "pages_total": self.pages_total,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_cached": self.chunks_cached,
+            "created_at": self.created_at,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": self.eta_seconds(),
+        }
+
+
+class BulkFile:
+    """One file of a bulk ingestion job."""
+
+    def __init__(self, file_id: str, file_path: Path, filename: str, sha256: Optional[str] = None):
+        self.file_id = file_id
+        self.file_path = file_path
+        self.filename = filename
+        self.sha256 = sha256
+        self.status = JOB_QUEUED
+        self.error: Optional[str] = None
+        self.chunks = 0
+        self.cached = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "chunks": self.chunks,
+        }
+
+
+class BulkIngestionJob:
+    """Progress of a batch of documents ingested together."""
+
+    kind = "bulk"
+
+    def __init__(self, files: List[BulkFile], rejected: Optional[List[Dict]] = None):
+        self.job_id = str(uuid.uuid4())
+        self.files = files
+        self.rejected = rejected or []
+        self.status = JOB_QUEUED
+        self.chunks_embedded = 0
+        self.chunks_cached = 0
+        self.created_at = datetime.now()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.finished_monotonic: Optional[float] = None
+        self.saved_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    @property
+    def files_completed(self) -> int:
+        return sum(1 for f in self.files if f.status == JOB_COMPLETED)
+
+    @property
+    def files_failed(self) -> int:
+        return sum(1 for f in self.files if f.status == JOB_FAILED)
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate the remaining time from the file rate so far."""
+        if self.done:
+            return 0.0
+        finished = self.files_completed + self.files_failed
+        if self.status != JOB_PROCESSING or not finished:
+            return None
+        elapsed = time.perf_counter() - self.started_at
+        return round(elapsed / finished * (len(self.files) - finished), 1)
+
+    def to_dict(self) -> Dict:
+        elapsed = None
+        if self.started_at is not None:
+            end = self.finished_at if self.finished_at is not None else time.perf_counter()
+            elapsed = round(end - self.started_at, 2)
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "files_total": len(self.files),
+            "files_completed": self.files_completed,
+            "files_failed": self.files_failed,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_cached": self.chunks_cached,
+            "created_at": self.created_at,
+            "elapsed_seconds": elapsed,
+            "eta_seconds": self.eta_seconds(),
+            "files": [f.to_dict() for f in self.files],
+            "rejected": self.rejected,
+        }
+
+
+class IngestionService:
+    """
+    Background document ingestion.
+
+    Uploads are processed on a dedicated worker pool as a streaming
+    pipeline (extraction -> chunking -> batched embedding + Chroma insert),
+    so several documents can be ingested in parallel without holding HTTP
+    connections or blocking the event loop, memory stays bounded for large
+    files and the first chunks are searchable before the file is finished.
+
+    Running jobs live in the process that accepted the upload; snapshots of
+    their progress are saved to the document registry, so a job's status
+    can be read from any API worker.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        embed_batch_size: int,
+        job_retention_seconds: int,
+        bulk_embed_batch_size: int
+    ):
+        """
+        Initialize the service.
+
+        Args:
+            max_workers: Number of documents ingested concurrently
+            embed_batch_size: Chunks embedded and inserted per batch
+            job_retention_seconds: How long finished jobs stay queryable
+            bulk_embed_batch_size: Chunks embedded and inserted per batch in bulk jobs
+        """
+        self.embed_batch_size = embed_batch_size
+        self.job_retention_seconds = job_retention_seconds
+        self.bulk_embed_batch_size = bulk_embed_batch_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="ingestion"
+        )
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._bulk_jobs: Dict[str, BulkIngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        file_id: str,
+        file_path: Path,
+        filename: str,
+        sha256: Optional[str] = None
+    ) -> IngestionJob:
+        """
+        Queue a saved upload for ingestion.
+
+        Args:
+            file_id: Unique file identifier
+            file_path: Path of the saved upload
+            filename: Original filename
+            sha256: Optional content hash computed while saving
+
+        Returns:
+            The queued job
+        """
+        job = IngestionJob(file_id, file_path, filename, sha256)
+        document_registry.register(
+            file_id=file_id,
+            filename=filename,
+            path=file_path,
+            size=file_path.stat().st_size,
+            sha256=sha256
+        )
+        with self._lock:
+            self._prune_finished()
+            self._jobs[job.job_id] = job
+        self._save(job, force=True)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job's status, from its stored snapshot if it runs in another process."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return document_registry.get_job(job_id, IngestionJob.kind)
+
+    def list_jobs(self) -> List[IngestionJob]:
+        """Get all retained jobs, newest first."""
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at, reverse=True)
+
+    def create_bulk_job(
+        self,
+        files: List[Tuple[str, Path, str, Optional[str]]],
+        rejected: Optional[List[Dict]] = None
+    ) -> BulkIngestionJob:
+        """
+        Register saved uploads as one bulk job without starting it.
+
+        Args:
+            files: (file_id, file_path, filename, sha256) of each saved upload
+            rejected: Files skipped before saving, reported with the job
+
+        Returns:
+            The queued job
+        """
+        job = BulkIngestionJob([BulkFile(*f) for f in files], rejected)
+        for f in job.files:
+            document_registry.register(
+                file_id=f.file_id,
+                filename=f.filename,
+                path=f.file_path,
+                size=f.file_path.stat().st_size,
+                sha256=f.sha256
+            )
+        with self._lock:
+            self._prune_finished()
+            self._bulk_jobs[job.job_id] = job
+        self._save(job, force=True)
+        return job
+
+    def submit_bulk(
+        self,
+        files: List[Tuple[str, Path, str, Optional[str]]],
+        rejected: Optional[List[Dict]] = None
+    ) -> BulkIngestionJob:
+        """Queue saved uploads for ingestion as one bulk job."""
+        job = self.create_bulk_job(files, rejected)
+        self._executor.submit(self.run_bulk, job)
+        return job
+
+    def get_bulk_job(self, job_id: str) -> Optional[Dict]:
+        """Get a bulk job's status, from its stored snapshot if it runs in another process."""
+        with self._lock:
+            job = self._bulk_jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return document_registry.get_job(job_id, BulkIngestionJob.kind)
+
+    def _save(self, job, force: bool = False):
+        """
+        Save a job's progress to the document registry.
+
+        Progress updates are throttled to one write per JOB_SAVE_INTERVAL;
+        state changes pass force=True. Saving a finished job also removes
+        stored jobs past the retention window.
+        """
+        now = time.monotonic()
+        if not force and job.saved_at is not None and now - job.saved_at < JOB_SAVE_INTERVAL:
+            return
+        job.saved_at = now
+        try:
+            document_registry.save_job(job.job_id, job.kind, job.to_dict(), finished=job.done)
+            if job.done:
+                document_registry.prune_jobs(time.time() - self.job_retention_seconds)
+        except Exception as e:
+            logger.warning(f"Could not save progress of ingestion job {job.job_id}: {e}")
+
+    def _prune_finished(self):
+        """Forget finished jobs past the retention window. Caller holds the lock."""
+        cutoff = time.monotonic() - self.job_retention_seconds
+        for jobs in (self._jobs, self._bulk_jobs):
+            expired = [
+                job_id for job_id, job in jobs.items()
+                if job.finished_monotonic is not None and job.finished_monotonic < cutoff
+            ]
+            for job_id in expired:
+                del jobs[job_id]
+
+    def run_bulk(
+        self,
+        job: BulkIngestionJob,
+        progress: Optional[Callable[[BulkIngestionJob], None]] = None
+    ):
+        """
+        Ingest every file of a bulk job (blocking; also used by the CLI).
+
+        Files are extracted in parallel on the extraction process pool and
+        chunked as they finish. Chunks of several files are buffered and
+        embedded and written to Chroma in large shared batches, and the
+        lexical index is saved once at the end. If a shared batch fails, its
+        files are retried one by one so a bad file only fails itself.
+
+        Args:
+            job: Job created by create_bulk_job
+            progress: Optional callback invoked whenever a file finishes
+        """
+        job.started_at = time.perf_counter()
+        job.status = JOB_PROCESSING
+        self._save(job, force=True)
+        batch_size = self.bulk_embed_batch_size
+        pending: List[Tuple[BulkFile, List[str], List[Dict]]] = []
+        buffered = 0
+
+        def finish(f: BulkFile, error: Optional[str] = None):
+            if error is None:
+                f.status = JOB_COMPLETED
+                document_registry.update_status(f.file_id, DOC_ACTIVE, chunk_count=f.chunks)
+            else:
+                logger.error(f"Error ingesting document {f.filename}: {error}")
+                f.status = JOB_FAILED
+                f.error = error
+                f.chunks = 0
+                self._cleanup_failed_file(f.file_id, f.file_path)
+                document_registry.update_status(f.file_id, DOC_FAILED, chunk_count=0, error=error)
+            self._save(job)
+            if progress:
+                progress(job)
+
+        def insert(chunks: List[str], metadatas: List[Dict]):
+            result = vector_store_service.add_chunks(
+                chunks, metadatas, batch_size=batch_size, save_index=False
+            )
+            job.chunks_embedded += result['chunks']
+            job.chunks_cached += result['cached']
+
+        def flush():
+            nonlocal buffered
+            if not pending:
+                return
+            try:
+                insert(
+                    [chunk for _, chunks, _ in pending for chunk in chunks],
+                    [metadata for _, _, metadatas in pending for metadata in metadatas]
+                )
+                for f, _, _ in pending:
+                    finish(f)
+            except Exception as e:
+                logger.warning(f"Bulk batch failed, retrying its {len(pending)} files one by one: {e}")
+                for f, chunks, metadatas in pending:
+                    try:
+                        vector_store_service.delete_documents(f.file_id)
+                        insert(chunks, metadatas)
+                        finish(f)
+                    except Exception as file_error:
+                        finish(f, str(file_error))
+            pending.clear()
+            buffered = 0
+
+        try:
+            paths = [f.file_path for f in job.files]
+            for index, segments, error in document_processor.extract_many(paths):
+                f = job.files[index]
+                f.status = JOB_PROCESSING
+                if error is not None:
+                    finish(f, str(error))
+                    continue
+
+                metadata = document_processor.get_file_metadata(
+                    f.file_path, f.filename, f.file_id, f.sha256
+                )
+                chunks: List[str] = []
+                metadatas: List[Dict] = []
+                for chunk, segment_metadata in vector_store_service.chunker.chunks(segments):
+                    chunks.append(chunk)
+                    metadatas.append({**metadata, **segment_metadata, 'chunk_index': len(metadatas)})
+                if sum(len(chunk) for chunk in chunks) < 10:
+                    finish(f, "Could not extract text from the document or document is empty")
+                    continue
+
+                f.chunks = len(chunks)
+                pending.append((f, chunks, metadatas))
+                buffered += len(chunks)
+                if buffered >= batch_size:
+                    flush()
+
+            flush()
+            job.status = JOB_COMPLETED
+            logger.info(
+                f"Bulk ingestion finished: {job.files_completed} of {len(job.files)} files, "
+                f"{job.chunks_embedded} chunks ({job.chunks_cached} cached)"
+            )
+
+        except Exception as e:
+            logger.error(f"Bulk ingestion {job.job_id} failed: {e}")
+            job.status = JOB_FAILED
+            for f in job.files:
+                if f.status not in (JOB_COMPLETED, JOB_FAILED):
+                    finish(f, str(e))
+
+        finally:
+            try:
+                vector_store_service.lexical_index.save()
+            except Exception as e:
+                logger.error(f"Error saving lexical index after bulk ingestion: {e}")
+            job.finished_at = time.perf_counter()
+            job.finished_monotonic = time.monotonic()
+            self._save(job, force=True)
+
+    def _run(self, job: IngestionJob):
+        """Run one job through every pipeline stage."""
+        job.started_at = time.perf_counter()
+        try:
+            job.status = JOB_PROCESSING
+            self._save(job, force=True)
+
+            def on_page(pages_done: int, pages_total: int):
+                job.pages_parsed = pages_done
+                job.pages_total = pages_total
+                self._save(job)
+
+            def on_batch(chunks_done: int):
+                job.chunks_embedded = chunks_done
+                job.chunks_total = chunks_done
+                self._save(job)
+
+            metadata = document_processor.get_file_metadata(
+                job.file_path, job.filename, job.file_id, job.sha256
+            )
+            segments = document_processor.iter_text_segments(job.file_path, progress=on_page)
+
+            result = vector_store_service.add_document_stream(
+                segments,
+                metadata,
+                batch_size=self.embed_batch_size,
+                progress=on_batch
+            )
+            if result['characters'] < 10:
+                raise ValueError("Could not extract text from the document or document is empty")
+
+            job.chunks_total = result['chunks']
+            job.chunks_cached = result['cached']
+            document_registry.update_status(job.file_id, DOC_ACTIVE, chunk_count=result['chunks'])
+            job.status = JOB_COMPLETED
+            logger.info(f"Document ingested successfully: {job.filename}")
+
+        except Exception as e:
+            logger.error(f"Error ingesting document {job.filename}: {e}")
+            job.error = str(e)
+            job.status = JOB_FAILED
+            self._cleanup_failed_file(job.file_id, job.file_path)
+            document_registry.update_status(job.file_id, DOC_FAILED, chunk_count=0, error=job.error)
+
+        finally:
+            job.finished_at = time.perf_counter()
+            job.finished_monotonic = time.monotonic()
+            self._save(job, force=True)
+
+    @staticmethod
+    def _cleanup_failed_file(file_id: str, file_path: Path):
+        """Remove partially ingested chunks and the stored upload."""
+        try:
+            vector_store_service.delete_documents(file_id)
+            if file_path.exists():
+                file_path.unlink()
+        except Exception as e:
+            logger.error(f"Error cleaning up failed ingestion of {file_id}: {e}")
+
+    def shutdown(self):
+        """Wait for running jobs to finish and drop queued ones."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+# Global instance
+ingestion_service = IngestionService(
+    max_workers=settings.INGEST_WORKERS,
+    embed_batch_size=settings.INGEST_EMBED_BATCH_SIZE,
+    job_retention_seconds=settings.INGEST_JOB_RETENTION_SECONDS,
+    bulk_embed_batch_size=settings.BULK_EMBED_BATCH_SIZE
+)
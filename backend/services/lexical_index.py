@@ -0,0 +1,455 @@
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import fcntl
+import logging
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Postings are stored in array('I') buffers and scored through numpy views
+_UINT = np.dtype(f"u{array('I').itemsize}")
+
+# Words joined by -, _, / or . (SKUs, part numbers, versions, domains) stay one term
+_TOKEN_RE = re.compile(r"\w+(?:[-_./]\w+)*")
+_PART_RE = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was",
+    "were", "will", "with", "what", "which", "who", "how", "do", "does", "you",
+    "your", "we", "our", "i", "me", "my", "can", "about",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Compound tokens such as "AB-1234" are kept whole (so exact codes match)
+    and also indexed by their parts ("ab", "1234").
+    """
+    terms = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        term = match.group()
+        if term in STOPWORDS:
+            continue
+        terms.append(term)
+        if not term.isalnum():
+            terms.extend(part for part in _PART_RE.findall(term) if part not in STOPWORDS)
+    return terms
+
+
+def _to_array(values: np.ndarray) -> array:
+    result = array('I')
+    result.frombytes(np.ascontiguousarray(values, dtype=_UINT).tobytes())
+    return result
+
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over chunk texts.
+
+    Each term maps to two parallel array('I') buffers (document numbers and
+    term frequencies) instead of per-posting Python objects, and scoring
+    runs vectorized over numpy views of those buffers. Deleted chunks are
+    tombstoned and the postings are compacted once enough accumulate. The
+    index is persisted as one contiguous posting buffer plus offsets.
+
+    Every process (API workers, the ingest CLI) keeps its own copy. Saves
+    are serialized across processes with a lock file and merge with
+    whatever another process saved in the meantime, and searches reload
+    the file once another process has saved a newer version.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            path: File the index is persisted to
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        self._lock_path = path.with_name(path.name + ".lock")
+        self._synced_stamp: Optional[Tuple[int, int]] = None  # Saved file version this index matches
+        self._reset()
+        self._clear_pending()
+
+    def _reset(self):
+        self._doc_ids: List[str] = []  # Chunk ID per document number
+        self._doc_files: List[str] = []  # File ID per document number
+        self._doc_lengths = array('I')
+        self._alive = bytearray()
+        self._positions: Dict[str, int] = {}  # Chunk ID -> document number
+        self._file_docs: Dict[str, List[int]] = {}
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._live_docs = 0
+        self._live_length = 0
+        self._deleted = 0
+        self._dirty = False
+
+    def _clear_pending(self):
+        # Changes not saved yet, re-applied if another process saves first
+        self._pending_clear = False
+        self._pending_files: set = set()
+        self._pending_chunks: set = set()
+
+    @property
+    def count(self) -> int:
+        """Number of indexed (not deleted) chunks."""
+        with self._lock:
+            return self._live_docs
+
+    def add(self, chunk_ids: List[str], texts: List[str], file_ids: Iterable[Optional[str]]):
+        """
+        Index chunks.
+
+        Args:
+            chunk_ids: Vector store IDs of the chunks
+            texts: Chunk texts
+            file_ids: File each chunk belongs to
+        """
+        with self._lock:
+            for chunk_id, text, file_id in zip(chunk_ids, texts, file_ids):
+                if self._add_terms(chunk_id, file_id or "", Counter(tokenize(text))):
+                    self._pending_chunks.add(chunk_id)
+            self._dirty = True
+
+    def _add_terms(self, chunk_id: str, file_id: str, terms: Dict[str, int]) -> bool:
+        """Index one chunk from its term frequencies. Caller holds the lock."""
+        if chunk_id in self._positions:
+            return False
+        doc = len(self._doc_ids)
+        length = sum(terms.values())
+
+        self._doc_ids.append(chunk_id)
+        self._doc_files.append(file_id)
+        self._doc_lengths.append(length)
+        self._alive.append(1)
+        self._positions[chunk_id] = doc
+        self._file_docs.setdefault(file_id, []).append(doc)
+
+        for term, frequency in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('I'), array('I'))
+            postings[0].append(doc)
+            postings[1].append(frequency)
+
+        self._live_docs += 1
+        self._live_length += length
+        return True
+
+    def delete_file(self, file_id: str) -> int:
+        """
+        Remove every chunk of a file.
+
+        Returns:
+            Number of chunks removed
+        """
+        with self._lock:
+            removed = self._delete_file(file_id)
+            self._pending_files.add(file_id)
+            self._pending_chunks.difference_update(removed)
+            if removed:
+                self._dirty = True
+            return len(removed)
+
+    def _delete_file(self, file_id: str) -> List[str]:
+        """Remove a file's chunks and return their IDs. Caller holds the lock."""
+        removed = []
+        for doc in self._file_docs.pop(file_id, []):
+            if self._alive[doc]:
+                self._alive[doc] = 0
+                self._positions.pop(self._doc_ids[doc], None)
+                self._live_docs -= 1
+                self._live_length -= self._doc_lengths[doc]
+                self._deleted += 1
+                removed.append(self._doc_ids[doc])
+        if removed and self._deleted * 4 > len(self._doc_ids):
+            self._compact()
+        return removed
+
+    def clear(self):
+        """Remove everything."""
+        with self._lock:
+            self._reset()
+            self._clear_pending()
+            self._pending_clear = True
+            self._dirty = True
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Rank chunks by BM25 score; no embedding is needed.
+
+        Args:
+            query: Search query
+            k: Number of results to return
+
+        Returns:
+            List of (chunk ID, score), best first
+        """
+        terms = set(tokenize(query))
+        self._refresh()
+        with self._lock:
+            if not terms or not self._live_docs or k <= 0:
+                return []
+
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+            lengths = np.frombuffer(self._doc_lengths, dtype=_UINT)
+            average_length = max(self._live_length / self._live_docs, 1.0)
+
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs = np.frombuffer(postings[0], dtype=_UINT)
+                frequencies = np.frombuffer(postings[1], dtype=_UINT).astype(np.float32)
+                # Tombstoned postings slightly inflate df until the next compaction
+                idf = max(math.log(1 + (self._live_docs - len(docs) + 0.5) / (len(docs) + 0.5)), 0.0)
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+                scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+            scores[np.frombuffer(self._alive, dtype=np.uint8) == 0] = 0
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self._doc_ids[doc], float(scores[doc])) for doc in candidates]
+
+    def _compact(self):
+        """Drop tombstoned documents and renumber the rest. Caller holds the lock."""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        renumber = np.cumsum(alive) - 1
+
+        postings: Dict[str, Tuple[array, array]] = {}
+        for term, (docs, frequencies) in self._postings.items():
+            doc_view = np.frombuffer(docs, dtype=_UINT)
+            keep = alive[doc_view]
+            if keep.any():
+                postings[term] = (
+                    _to_array(renumber[doc_view[keep]]),
+                    _to_array(np.frombuffer(frequencies, dtype=_UINT)[keep]),
+                )
+            del doc_view
+
+        kept = np.flatnonzero(alive)
+        self._doc_ids = [self._doc_ids[doc] for doc in kept]
+        self._doc_files = [self._doc_files[doc] for doc in kept]
+        self._doc_lengths = _to_array(np.frombuffer(self._doc_lengths, dtype=_UINT)[kept])
+        self._alive = bytearray(b"\x01" * len(kept))
+        self._postings = postings
+        self._rebuild_lookups()
+        self._deleted = 0
+        logger.info(f"Compacted lexical index to {len(kept)} chunks")
+
+    def _rebuild_lookups(self):
+        """Recompute the chunk and file lookups from the document lists. Caller holds the lock."""
+        self._positions = {}
+        self._file_docs = {}
+        for doc, (chunk_id, file_id) in enumerate(zip(self._doc_ids, self._doc_files)):
+            if self._alive[doc]:
+                self._positions[chunk_id] = doc
+                self._file_docs.setdefault(file_id, []).append(doc)
+
+    def _export_docs(self, chunk_ids: Iterable[str]) -> List[Tuple[str, str, Dict[str, int]]]:
+        """
+        Recover chunks' term frequencies from the postings. Caller holds the lock.
+
+        Returns:
+            List of (chunk ID, file ID, term frequencies)
+        """
+        docs = {self._positions[chunk_id]: chunk_id for chunk_id in chunk_ids if chunk_id in self._positions}
+        if not docs:
+            return []
+        wanted = np.zeros(len(self._doc_ids), dtype=bool)
+        wanted[list(docs)] = True
+
+        terms: Dict[int, Dict[str, int]] = {doc: {} for doc in docs}
+        for term, (doc_buffer, frequency_buffer) in self._postings.items():
+            doc_view = np.frombuffer(doc_buffer, dtype=_UINT)
+            selected = np.flatnonzero(wanted[doc_view])
+            if len(selected):
+                frequencies = np.frombuffer(frequency_buffer, dtype=_UINT)[selected].tolist()
+                for doc, frequency in zip(doc_view[selected].tolist(), frequencies):
+                    terms[doc][term] = frequency
+            # Release the buffer so the array can grow again
+            del doc_view
+        return [(docs[doc], self._doc_files[doc], terms[doc]) for doc in sorted(docs)]
+
+    def _merge_saved(self):
+        """
+        Load the version another process saved and re-apply the changes
+        made here since this index was last synced. Caller holds the lock.
+        """
+        added = self._export_docs(self._pending_chunks)
+        state, _ = self._read_state()
+        if state is None or self._pending_clear:
+            self._reset()
+        else:
+            self._apply_state(state)
+        for file_id in self._pending_files:
+            self._delete_file(file_id)
+        for chunk_id, file_id, terms in added:
+            self._add_terms(chunk_id, file_id, terms)
+        logger.info(f"Merged lexical index with a version saved by another process ({self._live_docs} chunks)")
+
+    def _snapshot(self) -> Dict:
+        """Serializable copy of the index. Caller holds the lock."""
+        terms = list(self._postings)
+        offsets = array('Q', [0])
+        for term in terms:
+            offsets.append(offsets[-1] + len(self._postings[term][0]))
+        return {
+            "version": FORMAT_VERSION,
+            "doc_ids": list(self._doc_ids),
+            "doc_files": list(self._doc_files),
+            "doc_lengths": self._doc_lengths.tobytes(),
+            "alive": bytes(self._alive),
+            "terms": terms,
+            "offsets": offsets.tobytes(),
+            "docs": b"".join(self._postings[term][0].tobytes() for term in terms),
+            "frequencies": b"".join(self._postings[term][1].tobytes() for term in terms),
+            "live_length": self._live_length,
+            "deleted": self._deleted,
+        }
+
+    def _disk_stamp(self) -> Optional[Tuple[int, int]]:
+        """Identify the saved file's version (every save replaces the file, so the inode changes)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def save(self):
+        """
+        Persist the index if it changed since it was last saved or loaded.
+
+        Saves are serialized across threads and processes. If another
+        process saved since this index was last synced, its version is
+        loaded first and the changes made here are applied on top.
+        """
+        with self._save_lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self._lock:
+                if not self._dirty:
+                    return
+                if self._disk_stamp() != self._synced_stamp:
+                    self._merge_saved()
+                state = self._snapshot()
+                pending = (self._pending_clear, self._pending_files, self._pending_chunks)
+                self._clear_pending()
+                self._dirty = False
+
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if tmp_path:
+                    Path(tmp_path).unlink(missing_ok=True)
+                with self._lock:
+                    # Keep the changes pending for the next save
+                    self._pending_clear = self._pending_clear or pending[0]
+                    self._pending_files |= pending[1]
+                    self._pending_chunks |= pending[2]
+                    self._dirty = True
+                raise
+
+            with self._lock:
+                self._synced_stamp = self._disk_stamp()
+
+    def _read_state(self) -> Tuple[Optional[Dict], Optional[Tuple[int, int]]]:
+        """
+        Read the saved index.
+
+        Returns:
+            Tuple of (state, file version), or (None, None) if there is no
+            usable saved index
+        """
+        try:
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            logger.warning(f"Could not read lexical index, it will be rebuilt: {e}")
+            return None, None
+        if state.get("version") != FORMAT_VERSION:
+            logger.warning("Ignoring lexical index saved in an older format")
+            return None, None
+        return state, (stat.st_ino, stat.st_mtime_ns)
+
+    def _apply_state(self, state: Dict):
+        """Replace the index with a saved state. Caller holds the lock."""
+        offsets = array('Q')
+        offsets.frombytes(state["offsets"])
+        docs = array('I')
+        docs.frombytes(state["docs"])
+        frequencies = array('I')
+        frequencies.frombytes(state["frequencies"])
+
+        self._reset()
+        self._doc_ids = state["doc_ids"]
+        self._doc_files = state["doc_files"]
+        self._doc_lengths.frombytes(state["doc_lengths"])
+        self._alive = bytearray(state["alive"])
+        for i, term in enumerate(state["terms"]):
+            start, end = offsets[i], offsets[i + 1]
+            self._postings[term] = (docs[start:end], frequencies[start:end])
+        self._rebuild_lookups()
+        self._live_docs = len(self._positions)
+        self._live_length = state["live_length"]
+        self._deleted = state["deleted"]
+
+    def load(self) -> bool:
+        """
+        Load the persisted index, if there is one.
+
+        Skipped while this index has unsaved changes (save() merges instead).
+
+        Returns:
+            True if an index was loaded
+        """
+        state, stamp = self._read_state()
+        if state is None:
+            return False
+        with self._lock:
+            if self._dirty:
+                return False
+            try:
+                self._apply_state(state)
+            except Exception as e:
+                logger.warning(f"Could not load lexical index, it will be rebuilt: {e}")
+                self._reset()
+                return False
+            self._synced_stamp = stamp
+            logger.info(f"Loaded lexical index with {self._live_docs} chunks")
+            return True
+
+    def _refresh(self):
+        """Reload the index if another process saved a newer version."""
+        stamp = self._disk_stamp()
+        with self._lock:
+            if stamp is None or stamp == self._synced_stamp or self._dirty:
+                return
+        self.load()
@@ -0,0 +1,197 @@
+from pathlib import Path
+from typing import Dict, Tuple
+import fcntl
+import json
+import logging
+import os
+import re
+import shutil
+
+logger = logging.getLogger(__name__)
+
+BACKEND_TRANSFORMERS = "transformers"  # Full-precision PyTorch, loaded straight from the hub
+BACKEND_INT8 = "int8"  # PyTorch with dynamically int8-quantized Linear layers
+BACKEND_ONNX = "onnx"  # ONNX Runtime export with KV-cache (needs optimum[onnxruntime])
+LLM_BACKENDS = (BACKEND_TRANSFORMERS, BACKEND_INT8, BACKEND_ONNX)
+
+# Sampling settings shared by the pipeline, the streaming path and the inference server
+GENERATION_KWARGS = {
+    "max_new_tokens": 512,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "repetition_penalty": 1.15
+}
+
+MANIFEST_FILE = "manifest.json"
+INT8_MODEL_FILE = "model.pt"
+
+
+def artifact_dir(artifact_root: Path, model_name: str, backend: str) -> Path:
+    """Get the directory holding a model's converted artifacts for a backend."""
+    return artifact_root / f"{re.sub(r'[^A-Za-z0-9._-]+', '--', model_name)}-{backend}"
+
+
+def _library_versions(backend: str) -> Dict[str, str]:
+    """Versions the artifacts depend on; a mismatch means they must be converted again."""
+    import transformers
+
+    versions = {"transformers": transformers.__version__}
+    if backend == BACKEND_INT8:
+        import torch
+        versions["torch"] = torch.__version__
+    elif backend == BACKEND_ONNX:
+        import optimum.version
+        versions["optimum"] = optimum.version.__version__
+    return versions
+
+
+def _is_current(path: Path, model_name: str, backend: str) -> bool:
+    """Check whether converted artifacts exist and match this model and library versions."""
+    try:
+        manifest = json.loads((path / MANIFEST_FILE).read_text())
+    except (OSError, ValueError):
+        return False
+    return (
+        manifest.get("model") == model_name
+        and manifest.get("backend") == backend
+        and manifest.get("versions") == _library_versions(backend)
+    )
+
+
+def convert(model_name: str, backend: str, artifact_root: Path, force: bool = False) -> Path:
+    """
+    Convert a causal LM for a backend and cache the result on disk.
+
+    Safe to call from several processes at once: conversion happens under
+    a lock file, so one process converts and the others wait and then use
+    its result.
+
+    Args:
+        model_name: Hugging Face model name
+        backend: One of LLM_BACKENDS other than "transformers"
+        artifact_root: Directory converted models are cached in
+        force: Convert again even if current artifacts exist
+
+    Returns:
+        Directory holding the converted model and its tokenizer
+    """
+    if backend not in (BACKEND_INT8, BACKEND_ONNX):
+        raise ValueError(f"Nothing to convert for backend {backend}; choose int8 or onnx")
+
+    path = artifact_dir(artifact_root, model_name, backend)
+    if not force and _is_current(path, model_name, backend):
+        logger.info(f"Converted {backend} model already cached in {path}")
+        return path
+
+    artifact_root.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Another process may have finished converting while we waited
+        if not force and _is_current(path, model_name, backend):
+            logger.info(f"Converted {backend} model already cached in {path}")
+            return path
+        return _convert_locked(model_name, backend, path)
+
+
+def _convert_locked(model_name: str, backend: str, path: Path) -> Path:
+    """Convert into a private temp directory and swap it in. Caller holds the lock file."""
+    from transformers import AutoTokenizer
+
+    # Write to a private directory next to the target and swap it in once complete
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    logger.info(f"Converting {model_name} for the {backend} backend...")
+
+    try:
+        if backend == BACKEND_INT8:
+            import torch
+            from transformers import AutoModelForCausalLM
+
+            model = AutoModelForCausalLM.from_pretrained(
+                model_name, torch_dtype=torch.float32, low_cpu_mem_usage=True
+            )
+            model.eval()
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            torch.save(model, tmp_path / INT8_MODEL_FILE)
+        else:
+            from optimum.onnxruntime import ORTModelForCausalLM
+
+            model = ORTModelForCausalLM.from_pretrained(model_name, export=True, use_cache=True)
+            model.save_pretrained(tmp_path)
+
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_path)
+        (tmp_path / MANIFEST_FILE).write_text(json.dumps({
+            "model": model_name,
+            "backend": backend,
+            "versions": _library_versions(backend),
+        }, indent=2))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp_path.rename(path)
+    logger.info(f"Converted {backend} model saved to {path}")
+    return path
+
+
+def load_causal_lm(model_name: str, backend: str, artifact_root: Path, threads: int = 0) -> Tuple:
+    """
+    Load a causal LM and its tokenizer for CPU inference.
+
+    The int8 and onnx backends load the cached conversion, converting first
+    if it is missing or stale (run `python manage.py convert-llm` ahead of
+    deployment to keep that off the startup path).
+
+    Args:
+        model_name: Hugging Face model name
+        backend: One of LLM_BACKENDS
+        artifact_root: Directory converted models are cached in
+        threads: Intra-op threads per process (0 = library default)
+
+    Returns:
+        Tuple of (model, tokenizer); the model supports generate()
+    """
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {backend}; choose one of {', '.join(LLM_BACKENDS)}")
+
+    import torch
+    from transformers import AutoTokenizer
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+    if backend == BACKEND_TRANSFORMERS:
+        from transformers import AutoModelForCausalLM
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            device_map="cpu",
+            low_cpu_mem_usage=True
+        )
+        return model, tokenizer
+
+    path = convert(model_name, backend, artifact_root)
+    tokenizer = AutoTokenizer.from_pretrained(path)
+
+    if backend == BACKEND_INT8:
+        # The artifact is a pickled module written by convert()
+        model = torch.load(path / INT8_MODEL_FILE, weights_only=False)
+        model.eval()
+        return model, tokenizer
+
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    session_options = onnxruntime.SessionOptions()
+    if threads > 0:
+        session_options.intra_op_num_threads = threads
+    model = ORTModelForCausalLM.from_pretrained(
+        path,
+        use_cache=True,
+        provider="CPUExecutionProvider",
+        session_options=session_options
+    )
+    return model, tokenizer
@@ -0,0 +1,34 @@
+from typing import Dict
+from config import settings
+from services.document_registry import document_registry
+from services.vector_store import vector_store_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_storage(fix: bool = False) -> Dict:
+    """
+    Check the document registry, upload directory and vector store against each other.
+    
+    Documents that have chunks but no registry row are registered first, so
+    their uploads are not reported as orphans.
+    
+    Args:
+        fix: Delete orphan uploads (older than ORPHAN_GRACE_SECONDS), drop documents whose upload is gone
+            (including their chunks) and reset the storage counters
+        
+    Returns:
+        Reconciliation report (see DocumentRegistry.reconcile)
+    """
+    registered = document_registry.backfill(vector_store_service.iter_chunk_metadatas())
+    report = document_registry.reconcile(
+        settings.UPLOAD_DIR, fix=fix, grace_seconds=settings.ORPHAN_GRACE_SECONDS
+    )
+    report["registered_from_vector_store"] = registered
+    
+    if fix:
+        for file_id in report["missing_files"]:
+            vector_store_service.delete_documents(file_id)
+    
+    return report
@@ -0,0 +1,185 @@
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import gc
+import logging
+import os
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after starting is restarted with a delay
+MIN_WORKER_LIFETIME_SECONDS = 5
+
+
+def process_memory(pid: Optional[int] = None) -> Dict:
+    """
+    Get a process's memory use in MB (Linux).
+
+    "private_mb" is what the process costs on its own; "shared_mb" is
+    memory it shares with others, such as model weights inherited from a
+    prefork parent. "pss_mb" splits shared pages evenly between sharers.
+
+    Args:
+        pid: Process ID (this process if None)
+
+    Returns:
+        Dictionary with pid, rss_mb, pss_mb, shared_mb and private_mb
+        (only pid and rss_mb where /proc/<pid>/smaps_rollup is unavailable)
+    """
+    pid = pid or os.getpid()
+    fields: Dict[str, int] = {}
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+            name, value = line.split(":", 1)
+            fields[name] = int(value.split()[0])  # kB
+    except (OSError, ValueError):
+        import resource
+
+        if pid != os.getpid():
+            return {"pid": pid}
+        # Peak RSS; kB on Linux
+        return {"pid": pid, "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+    def mb(*names: str) -> float:
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        "pid": pid,
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+class PreforkServer:
+    """
+    Runs several uvicorn workers that share read-only model weights.
+
+    The parent optionally loads the model weights, freezes the garbage
+    collector's view of everything allocated so far (so collections in the
+    workers don't write to those pages) and then forks the workers. The
+    weights stay shared copy-on-write, so each extra worker only costs its
+    private memory. Database connections, thread pools and the generation
+    scheduler are created inside each worker, as are ONNX Runtime sessions
+    (they don't survive fork). Workers that die are restarted, and the
+    parent periodically logs each worker's memory.
+    """
+
+    def __init__(
+        self,
+        app: str,
+        host: str,
+        port: int,
+        workers: int,
+        preload: Optional[Callable[[], None]] = None,
+        memory_report_seconds: float = 0
+    ):
+        """
+        Initialize the server.
+
+        Args:
+            app: ASGI app import string, e.g. "main:app"
+            host: Address to bind
+            port: Port to bind
+            workers: Number of worker processes
+            preload: Loads shared state in the parent before forking
+            memory_report_seconds: Interval between worker memory reports (0 disables)
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(workers, 1)
+        self.preload = preload
+        self.memory_report_seconds = memory_report_seconds
+        self._children: Dict[int, float] = {}  # PID -> start time
+        self._stopping = False
+
+    def _spawn(self, config, sock):
+        """Fork one worker."""
+        pid = os.fork()
+        if pid == 0:
+            # Worker: serve until told to stop, never return to the parent's loop
+            import uvicorn
+
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            except BaseException:
+                logger.exception("Worker crashed")
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+        logger.info(f"Started worker {pid}")
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def memory_report(self) -> List[Dict]:
+        """Get the memory use of the parent and every worker."""
+        report = [{**process_memory(), "role": "parent"}]
+        report.extend({**process_memory(pid), "role": "worker"} for pid in self._children)
+        return report
+
+    def _log_memory(self):
+        report = self.memory_report()
+        for entry in report:
+            logger.info(f"Memory {entry}")
+        private = [entry["private_mb"] for entry in report[1:] if "private_mb" in entry]
+        if private:
+            logger.info(f"Average private memory per worker: {sum(private) / len(private):.1f} MB")
+
+    def run(self) -> int:
+        """Bind, preload, fork the workers and supervise them until stopped."""
+        if not hasattr(os, "fork"):
+            raise RuntimeError("The prefork server needs os.fork (Linux or macOS)")
+        import uvicorn
+
+        config = uvicorn.Config(self.app, host=self.host, port=self.port)
+        sock = config.bind_socket()
+
+        if self.preload:
+            started_at = time.perf_counter()
+            self.preload()
+            logger.info(f"Preloaded models in {time.perf_counter() - started_at:.1f}s: {process_memory()}")
+        # Objects allocated so far are never collected in the workers, so
+        # their pages are not dirtied by the collector
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+        for _ in range(self.workers):
+            self._spawn(config, sock)
+
+        next_report = time.monotonic() + self.memory_report_seconds
+        while self._children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if self.memory_report_seconds > 0 and time.monotonic() >= next_report:
+                    self._log_memory()
+                    next_report = time.monotonic() + self.memory_report_seconds
+                time.sleep(0.5)
+                continue
+
+            started = self._children.pop(pid, None)
+            if self._stopping or started is None:
+                continue
+            logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+            if not self._stopping:
+                self._spawn(config, sock)
+
+        sock.close()
+        logger.info("All workers stopped")
+        return 0
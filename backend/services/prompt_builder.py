@@ -0,0 +1,210 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = """You are a helpful AI assistant for a business website. Use the following context to answer the user's question. If you don't know the answer based on the context, say so politely.
+
+Context: {context}
+
+Question: {question}
+
+Answer: """
+
+CONVERSATIONAL_PROMPT_TEMPLATE = """You are a helpful AI assistant for a business website. Use the following context and the conversation so far to answer the user's question. If you don't know the answer based on the context, say so politely.
+
+Context: {context}
+
+Conversation so far:
+{history}
+
+Question: {question}
+
+Answer: """
+
+# Openings that mark a question as a continuation of the previous one
+FOLLOW_UP_PREFIXES = (
+    "and ", "also ", "but ", "or ", "so ", "then ",
+    "what about", "how about", "what else", "why not", "same for",
+)
+
+# Words that usually refer back to something mentioned earlier
+REFERRING_WORDS = frozenset({
+    "it", "its", "it's", "they", "them", "their", "theirs", "that", "this",
+    "those", "these", "he", "she", "him", "her", "his", "there", "one", "ones",
+})
+
+# Questions this short rarely stand on their own ("price?", "for teams?")
+MAX_ELLIPTIC_WORDS = 3
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used until a tokenizer is loaded."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+class TokenCounter:
+    """Counts and truncates text in model tokens, estimating until the tokenizer is loaded."""
+
+    def __init__(self):
+        self.tokenizer = None  # Set once the language model is loaded
+
+    def count(self, text: str) -> int:
+        """Count the tokens in a text."""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int, keep_end: bool = False) -> str:
+        """
+        Cut a text down to at most max_tokens tokens.
+
+        Args:
+            text: Text to cut
+            max_tokens: Token limit
+            keep_end: Keep the end of the text instead of the beginning
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)
+            if len(ids) <= max_tokens:
+                return text
+            ids = ids[-max_tokens:] if keep_end else ids[:max_tokens]
+            return self.tokenizer.decode(ids, skip_special_tokens=True)
+        max_chars = max_tokens * 4
+        if len(text) <= max_chars:
+            return text
+        return text[-max_chars:] if keep_end else text[:max_chars]
+
+
+class PromptBuilder:
+    """
+    Builds bounded, conversation-aware prompts.
+
+    Follow-up questions are condensed with the previous user turns into a
+    standalone retrieval query, and only as much recent history as fits the
+    token budget is included in the prompt, so prompt size (and therefore
+    prefill time) stays bounded however long a conversation runs.
+    """
+
+    def __init__(self, tokens: TokenCounter, history_token_budget: int, condense_max_turns: int):
+        """
+        Initialize the builder.
+
+        Args:
+            tokens: Token counter for the language model
+            history_token_budget: Maximum tokens of history included in a prompt
+            condense_max_turns: Previous user turns prepended to a follow-up query
+        """
+        self.tokens = tokens
+        self.history_token_budget = history_token_budget
+        self.condense_max_turns = condense_max_turns
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the model's tokenizer, or estimate them before it is loaded."""
+        return self.tokens.count(text)
+
+    @staticmethod
+    def is_follow_up(message: str) -> bool:
+        """Check whether a message likely depends on earlier turns."""
+        lowered = message.strip().lower()
+        if lowered.startswith(FOLLOW_UP_PREFIXES):
+            return True
+        words = _WORD_RE.findall(lowered)
+        if len(words) <= MAX_ELLIPTIC_WORDS:
+            return True
+        return any(word in REFERRING_WORDS for word in words)
+
+    def condense_query(self, message: str, history: List[Dict]) -> str:
+        """
+        Turn a follow-up into a standalone retrieval query.
+
+        Args:
+            message: The user's latest message
+            history: Recent messages, oldest first
+
+        Returns:
+            The message itself, or the previous user turns followed by it
+        """
+        if not history or self.condense_max_turns <= 0 or not self.is_follow_up(message):
+            return message
+
+        previous = [m['content'] for m in history if m['role'] == "user"][-self.condense_max_turns:]
+        if not previous:
+            return message
+        return " ".join(previous + [message])
+
+    def select_history(self, history: List[Dict]) -> Tuple[List[Dict], int]:
+        """
+        Pick the most recent messages that fit the history token budget.
+
+        Args:
+            history: Recent messages, oldest first
+
+        Returns:
+            Tuple of (selected messages oldest first, their token count)
+        """
+        selected: List[Dict] = []
+        used = 0
+        for message in reversed(history):
+            line = self._format_message(message)
+            tokens = self.count_tokens(line)
+            if used + tokens > self.history_token_budget:
+                if not selected and self.history_token_budget > 8:
+                    # Keep the tail of an oversized latest message rather than nothing
+                    content = self.tokens.truncate(
+                        message['content'], self.history_token_budget - 8, keep_end=True
+                    )
+                    truncated = {"role": message['role'], "content": content}
+                    selected.append(truncated)
+                    used = self.count_tokens(self._format_message(truncated))
+                break
+            selected.append(message)
+            used += tokens
+        selected.reverse()
+        return selected, used
+
+    @staticmethod
+    def _format_message(message: Dict) -> str:
+        speaker = "User" if message['role'] == "user" else "Assistant"
+        return f"{speaker}: {message['content']}"
+
+    def build(
+        self,
+        question: str,
+        context: str,
+        history: Optional[List[Dict]] = None
+    ) -> Tuple[str, Dict[str, int]]:
+        """
+        Render the prompt and count the tokens each part contributes.
+
+        Args:
+            question: The user's latest message
+            context: Retrieved context
+            history: Selected history messages, oldest first
+
+        Returns:
+            Tuple of (prompt, usage with history/context/question/prompt token counts)
+        """
+        if history:
+            history_text = "\n".join(self._format_message(m) for m in history)
+            prompt = CONVERSATIONAL_PROMPT_TEMPLATE.format(
+                context=context, history=history_text, question=question
+            )
+        else:
+            history_text = ""
+            prompt = PROMPT_TEMPLATE.format(context=context, question=question)
+
+        usage = {
+            "history_tokens": self.count_tokens(history_text),
+            "context_tokens": self.count_tokens(context),
+            "question_tokens": self.count_tokens(question),
+            "prompt_tokens": self.count_tokens(prompt),
+        }
+        return prompt, usage
@@ -0,0 +1,94 @@
+from typing import Dict, List, Tuple
+from services.startup import startup_tracker
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieved candidates with a small CPU cross-encoder.
+
+    Query/chunk pairs are scored in batches. If scoring would exceed the
+    latency cap, the remaining work is skipped and the candidates keep
+    their retrieval order, so reranking never holds up an answer for long.
+    The model is loaded on first use (or by warm_up()).
+    """
+
+    def __init__(self, model_name: str, batch_size: int, max_latency_ms: float):
+        """
+        Initialize the reranker.
+
+        Args:
+            model_name: Cross-encoder model name
+            batch_size: Query/chunk pairs scored per forward pass
+            max_latency_ms: Time budget for scoring one candidate pool
+        """
+        self.model_name = model_name
+        self.batch_size = max(batch_size, 1)
+        self.max_latency_ms = max_latency_ms
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The cross-encoder, or None if it could not be loaded."""
+        if self._model is None and not self._failed:
+            with self._lock:
+                if self._model is None and not self._failed:
+                    try:
+                        from sentence_transformers import CrossEncoder
+
+                        with startup_tracker.phase("reranker"):
+                            self._model = CrossEncoder(self.model_name, device="cpu")
+                    except Exception as e:
+                        logger.error(f"Error loading reranker, falling back to retrieval order: {e}")
+                        self._failed = True
+        return self._model
+
+    def warm_up(self):
+        """Load the model and score one pair."""
+        if self.model is not None:
+            self.model.predict([("warm-up", "warm-up")])
+
+    def rerank(self, query: str, candidates: List[Dict], top_k: int) -> Tuple[List[Dict], Dict]:
+        """
+        Pick the best candidates for a query.
+
+        Args:
+            query: Retrieval query
+            candidates: Retrieved chunks in retrieval order
+            top_k: Number of chunks to keep
+
+        Returns:
+            Tuple of (top_k chunks, info with "reranked" and "elapsed_ms")
+        """
+        started_at = time.perf_counter()
+        if len(candidates) <= 1 or self.model is None:
+            return candidates[:top_k], {"reranked": False, "elapsed_ms": 0.0}
+
+        pairs = [(query, candidate['content']) for candidate in candidates]
+        scores: List[float] = []
+        batch_ms = 0.0
+        for start in range(0, len(pairs), self.batch_size):
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            # Stop before a batch that would likely exceed the cap
+            if start and elapsed_ms + batch_ms > self.max_latency_ms:
+                logger.warning(
+                    f"Reranking exceeded {self.max_latency_ms:.0f}ms after {start}/{len(pairs)} "
+                    f"candidates; using retrieval order"
+                )
+                return candidates[:top_k], {"reranked": False, "elapsed_ms": round(elapsed_ms, 1)}
+
+            batch_started_at = time.perf_counter()
+            batch = pairs[start:start + self.batch_size]
+            scores.extend(float(score) for score in self.model.predict(batch, batch_size=len(batch)))
+            batch_ms = (time.perf_counter() - batch_started_at) * 1000
+
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        reranked = [{**candidates[i], 'rerank_score': scores[i]} for i in order]
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        return reranked, {"reranked": True, "elapsed_ms": round(elapsed_ms, 1)}
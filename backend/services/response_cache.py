@@ -0,0 +1,271 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from config import settings
+import logging
+import re
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Tuple[str, ...]]
+
+
+class _CacheEntry:
+    """A cached answer together with what it was generated from."""
+
+    __slots__ = ("response", "chunk_ids", "file_ids", "embedding", "expires_at")
+
+    def __init__(
+        self,
+        response: str,
+        chunk_ids: Tuple[str, ...],
+        file_ids: Set[str],
+        embedding: Optional[np.ndarray],
+        expires_at: float
+    ):
+        self.response = response
+        self.chunk_ids = chunk_ids
+        self.file_ids = file_ids
+        self.embedding = embedding
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of generated answers.
+
+    Entries are keyed on the normalized query plus the IDs of the retrieved
+    chunks, so an answer is only reused when it would be generated from
+    exactly the same context. Near-duplicate queries can optionally hit an
+    entry with the same chunk set when their embeddings are similar enough.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        semantic: bool = False,
+        similarity_threshold: float = 0.95
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached answers
+            ttl_seconds: Lifetime of an entry
+            semantic: Whether to match near-duplicate query embeddings
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[CacheKey, _CacheEntry]" = OrderedDict()
+        self._by_file: Dict[str, Set[CacheKey]] = {}
+        self._by_chunks: Dict[Tuple[str, ...], Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        query = re.sub(r"\s+", " ", query.strip().lower())
+        return query.rstrip("?!.,; ")
+
+    @staticmethod
+    def chunk_ids(search_results: List[Dict]) -> Tuple[str, ...]:
+        """Get a stable, order-independent identifier for a set of retrieved chunks."""
+        ids = []
+        for result in search_results:
+            metadata = result.get('metadata', {})
+            if 'file_id' in metadata and 'chunk_index' in metadata:
+                ids.append(f"{metadata['file_id']}:{metadata['chunk_index']}")
+            else:
+                ids.append(f"content:{hash(result.get('content', ''))}")
+        return tuple(sorted(ids))
+
+    def get(
+        self,
+        query: str,
+        chunk_ids: Tuple[str, ...],
+        query_embedding: Optional[List[float]] = None
+    ) -> Optional[str]:
+        """
+        Look up a cached answer.
+
+        Args:
+            query: User's query
+            chunk_ids: IDs of the chunks retrieved for the query
+            query_embedding: Optional query embedding for near-duplicate matching
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        key = (self.normalize_query(query), chunk_ids)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._exact_hits += 1
+                return entry.response
+
+            if self.semantic and query_embedding is not None:
+                vector = self._unit(query_embedding)
+                best_key, best_score = None, self.similarity_threshold
+                for candidate_key in list(self._by_chunks.get(chunk_ids, ())):
+                    candidate = self._entries[candidate_key]
+                    if candidate.expires_at <= now:
+                        self._remove(candidate_key)
+                        continue
+                    if candidate.embedding is None:
+                        continue
+                    score = float(np.dot(vector, candidate.embedding))
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self._semantic_hits += 1
+                    return self._entries[best_key].response
+
+            self._misses += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        chunk_ids: Tuple[str, ...],
+        response: str,
+        query_embedding: Optional[List[float]] = None
+    ):
+        """
+        Store a generated answer.
+
+        Args:
+            query: User's query
+            chunk_ids: IDs of the chunks the answer was generated from
+            response: Generated answer
+            query_embedding: Optional query embedding for near-duplicate matching
+        """
+        key = (self.normalize_query(query), chunk_ids)
+        file_ids = {chunk_id.split(":", 1)[0] for chunk_id in chunk_ids}
+        embedding = (
+            self._unit(query_embedding)
+            if self.semantic and query_embedding is not None else None
+        )
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = _CacheEntry(
+                response=response,
+                chunk_ids=chunk_ids,
+                file_ids=file_ids,
+                embedding=embedding,
+                expires_at=time.monotonic() + self.ttl_seconds
+            )
+            self._by_chunks.setdefault(chunk_ids, set()).add(key)
+            for file_id in file_ids:
+                self._by_file.setdefault(file_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self._evictions += 1
+
+    def invalidate_files(self, file_ids: Iterable[str]) -> int:
+        """
+        Drop every entry generated from chunks of the given files.
+
+        Args:
+            file_ids: IDs of added, changed or deleted files
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            for file_id in file_ids:
+                for key in list(self._by_file.get(file_id, ())):
+                    self._remove(key)
+                    removed += 1
+            self._invalidations += removed
+
+        if removed:
+            logger.info(f"Invalidated {removed} cached responses")
+        return removed
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_file.clear()
+            self._by_chunks.clear()
+
+    def _remove(self, key: CacheKey):
+        """Remove an entry and its index references. Caller holds the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        keys = self._by_chunks.get(entry.chunk_ids)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_chunks[entry.chunk_ids]
+
+        for file_id in entry.file_ids:
+            keys = self._by_file.get(file_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_file[file_id]
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        """Normalize a vector to unit length as float32."""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def get_metrics(self) -> Dict:
+        """Get hit/miss counters and the current size."""
+        with self._lock:
+            hits = self._exact_hits + self._semantic_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "semantic": self.semantic,
+                "exact_hits": self._exact_hits,
+                "semantic_hits": self._semantic_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+# Global instance
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    semantic=settings.RESPONSE_CACHE_SEMANTIC,
+    similarity_threshold=settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD
+)
@@ -0,0 +1,461 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from config import settings
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """
+    Storage for chat sessions and their message history.
+
+    Messages are append-only; history reads are paginated.
+    """
+
+    # Whether calls wait on I/O or locks (callers on the event loop run them in a thread)
+    blocking = False
+
+    @abstractmethod
+    def create_session(self, session_id: str):
+        """Create an empty session."""
+
+    @abstractmethod
+    def session_exists(self, session_id: str) -> bool:
+        """Check whether a session exists."""
+
+    @abstractmethod
+    def append_message(self, session_id: str, role: str, content: str):
+        """Append a message to an existing session (ignored for unknown sessions)."""
+
+    @abstractmethod
+    def get_history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get a page of a session's messages, oldest first.
+
+        Args:
+            session_id: The session ID
+            offset: Number of messages to skip
+            limit: Maximum number of messages to return (all if None)
+
+        Returns:
+            List of {"role", "content"} dictionaries
+        """
+
+    @abstractmethod
+    def count_messages(self, session_id: str) -> int:
+        """Get the number of messages in a session."""
+
+    @abstractmethod
+    def delete_session(self, session_id: str) -> bool:
+        """Delete a session and its messages. Returns False if it did not exist."""
+
+    @abstractmethod
+    def count_sessions(self) -> int:
+        """Get the number of sessions."""
+
+    @abstractmethod
+    def get_metrics(self) -> Dict:
+        """Get the number of live sessions and the store's footprint."""
+
+
+class _Message:
+    """Compact chat message record; roles are interned so every message shares one string."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = sys.intern(role)
+        self.content = content
+
+    def to_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content}
+
+
+class _Session:
+    """Messages of one in-memory session plus bookkeeping for eviction."""
+
+    __slots__ = ("messages", "size", "last_active")
+
+    def __init__(self, size: int):
+        self.messages: List[_Message] = []
+        self.size = size
+        self.last_active = time.monotonic()
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Process-local session store; sessions are lost on restart and not shared between workers.
+
+    Memory is bounded: sessions idle for longer than the TTL are dropped,
+    the least recently used sessions are evicted once the session count or
+    approximate total size exceeds its cap, and each session keeps only its
+    most recent messages. Under any number of unique visitors the store
+    therefore reaches a steady state.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 0,
+        max_sessions: int = 0,
+        max_size_mb: float = 0,
+        max_messages: int = 0
+    ):
+        """
+        Initialize the store. A limit of 0 disables it.
+
+        Args:
+            ttl_seconds: Idle time after which a session expires
+            max_sessions: Maximum number of live sessions
+            max_size_mb: Approximate memory cap for all sessions
+            max_messages: Messages kept per session (oldest are dropped first)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_messages = max_messages
+
+        # Least recently used first
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self._messages = 0
+        self._lock = threading.Lock()
+        self._expired = 0
+        self._evicted = 0
+        self._compacted = 0
+
+    @staticmethod
+    def _message_size(message: _Message) -> int:
+        # Record, content and the list slot pointing at it; interned roles are shared
+        return sys.getsizeof(message) + sys.getsizeof(message.content) + 8
+
+    def _get(self, session_id: str) -> Optional[_Session]:
+        """Get a live session and mark it as recently used. Caller holds the lock."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self._is_expired(session, time.monotonic()):
+            self._remove(session_id)
+            self._expired += 1
+            return None
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _is_expired(self, session: _Session, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - session.last_active > self.ttl_seconds
+
+    def _remove(self, session_id: str) -> Optional[_Session]:
+        """Drop a session and its accounting. Caller holds the lock."""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+            self._messages -= len(session.messages)
+        return session
+
+    def _evict(self):
+        """Drop expired sessions, then LRU sessions while over a cap. Caller holds the lock."""
+        now = time.monotonic()
+        # Sessions are ordered by last use, so expired ones are at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if not self._is_expired(session, now):
+                break
+            self._remove(session_id)
+            self._expired += 1
+
+        while len(self._sessions) > 1 and (
+            (self.max_sessions and len(self._sessions) > self.max_sessions)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._sessions)))
+            self._evicted += 1
+
+    def create_session(self, session_id: str):
+        with self._lock:
+            if self._get(session_id) is None:
+                size = sys.getsizeof(session_id) + sys.getsizeof(_Session(0)) + sys.getsizeof([])
+                session = _Session(size)
+                self._sessions[session_id] = session
+                self._bytes += size
+            self._evict()
+
+    def session_exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._get(session_id) is not None
+
+    def append_message(self, session_id: str, role: str, content: str):
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return
+
+            message = _Message(role, content)
+            size = self._message_size(message)
+            session.messages.append(message)
+            session.size += size
+            self._bytes += size
+            self._messages += 1
+
+            if self.max_messages and len(session.messages) > self.max_messages:
+                excess = len(session.messages) - self.max_messages
+                dropped = sum(self._message_size(m) for m in session.messages[:excess])
+                del session.messages[:excess]
+                session.size -= dropped
+                self._bytes -= dropped
+                self._messages -= excess
+                self._compacted += excess
+
+            self._evict()
+
+    def get_history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            end = None if limit is None else offset + limit
+            return [message.to_dict() for message in session.messages[offset:end]]
+
+    def count_messages(self, session_id: str) -> int:
+        with self._lock:
+            session = self._get(session_id)
+            return len(session.messages) if session is not None else 0
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id) is not None
+
+    def count_sessions(self) -> int:
+        with self._lock:
+            self._evict()
+            return len(self._sessions)
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            self._evict()
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "messages": self._messages,
+                "size_mb": round(self._bytes / (1024 * 1024), 3),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 3),
+                "max_sessions": self.max_sessions,
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "compacted_messages": self._compacted,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite-backed session store, shared by every worker process on a node.
+
+    Uses WAL mode so readers never block the single writer, and one
+    connection per thread. Idle sessions and the least recently active
+    sessions over the count cap are pruned periodically from the write path.
+    """
+
+    PRUNE_INTERVAL_SECONDS = 60
+    blocking = True
+
+    def __init__(self, db_path: Path, ttl_seconds: float = 0, max_sessions: int = 0):
+        """
+        Initialize the store. A limit of 0 disables it.
+
+        Args:
+            db_path: SQLite database file
+            ttl_seconds: Idle time after which a session expires
+            max_sessions: Maximum number of stored sessions
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        self._prune_lock = threading.Lock()
+        self._next_prune = 0.0
+        # SQLite connections must not be used across fork (prefork server workers)
+        os.register_at_fork(after_in_child=self._forget_connections)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                last_active TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions (last_active);
+            """
+        )
+        conn.commit()
+
+    def _forget_connections(self):
+        """Drop connections inherited from the parent process."""
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+        return conn
+
+    def _cutoff(self) -> Optional[str]:
+        """Get the last_active value before which sessions have expired."""
+        if self.ttl_seconds <= 0:
+            return None
+        return (datetime.now() - timedelta(seconds=self.ttl_seconds)).isoformat()
+
+    def _maybe_prune(self):
+        """Prune expired and excess sessions at most once per interval."""
+        now = time.monotonic()
+        with self._prune_lock:
+            if now < self._next_prune:
+                return
+            self._next_prune = now + self.PRUNE_INTERVAL_SECONDS
+        try:
+            self.prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Error pruning chat sessions: {e}")
+
+    def prune(self) -> int:
+        """
+        Delete expired sessions and the least recently active ones over the cap.
+
+        Returns:
+            Number of sessions deleted
+        """
+        conn = self._connection()
+        deleted = 0
+        with conn:
+            cutoff = self._cutoff()
+            if cutoff is not None:
+                deleted += conn.execute(
+                    "DELETE FROM sessions WHERE last_active < ?", (cutoff,)
+                ).rowcount
+            if self.max_sessions > 0:
+                deleted += conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN ("
+                    "SELECT session_id FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,)
+                ).rowcount
+            if deleted:
+                conn.execute(
+                    "DELETE FROM messages WHERE session_id NOT IN (SELECT session_id FROM sessions)"
+                )
+        if deleted:
+            logger.info(f"Pruned {deleted} chat sessions")
+        return deleted
+
+    def create_session(self, session_id: str):
+        now = datetime.now().isoformat()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, created_at, last_active) VALUES (?, ?, ?)",
+                (session_id, now, now)
+            )
+        self._maybe_prune()
+
+    def session_exists(self, session_id: str) -> bool:
+        cutoff = self._cutoff() or ""
+        row = self._connection().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ? AND last_active >= ?", (session_id, cutoff)
+        ).fetchone()
+        return row is not None
+
+    def append_message(self, session_id: str, role: str, content: str):
+        now = datetime.now().isoformat()
+        conn = self._connection()
+        with conn:
+            updated = conn.execute(
+                "UPDATE sessions SET last_active = ? WHERE session_id = ?",
+                (now, session_id)
+            ).rowcount
+            if updated:
+                conn.execute(
+                    "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    (session_id, role, content, now)
+                )
+
+    def get_history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        rows = self._connection().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id LIMIT ? OFFSET ?",
+            (session_id, -1 if limit is None else limit, offset)
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in rows]
+
+    def count_messages(self, session_id: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def delete_session(self, session_id: str) -> bool:
+        conn = self._connection()
+        with conn:
+            deleted = conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            ).rowcount
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        return deleted > 0
+
+    def count_sessions(self) -> int:
+        cutoff = self._cutoff() or ""
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_active >= ?", (cutoff,)
+        ).fetchone()[0]
+
+    def get_metrics(self) -> Dict:
+        conn = self._connection()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": self.count_sessions(),
+            "messages": conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0],
+            "size_mb": round(page_count * page_size / (1024 * 1024), 3),
+            "max_sessions": self.max_sessions,
+        }
+
+
+def create_session_store() -> SessionStore:
+    """Create the session store selected by SESSION_STORE."""
+    backend = settings.SESSION_STORE.lower()
+    if backend == "sqlite":
+        logger.info(f"Using SQLite session store at {settings.SESSION_DB_PATH}")
+        return SQLiteSessionStore(
+            settings.SESSION_DB_PATH,
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            max_sessions=settings.SESSION_MAX_COUNT
+        )
+    if backend == "memory":
+        return InMemorySessionStore(
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            max_sessions=settings.SESSION_MAX_COUNT,
+            max_size_mb=settings.SESSION_MAX_MB,
+            max_messages=settings.SESSION_MAX_MESSAGES
+        )
+    raise ValueError(f"Unsupported session store: {settings.SESSION_STORE}")
+
+# Global instance
+session_store = create_session_store()
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from typing import Dict, Optional
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PHASE_PENDING = "pending"
+PHASE_LOADING = "loading"
+PHASE_READY = "ready"
+PHASE_FAILED = "failed"
+
+
+class StartupTracker:
+    """Records the state and duration of each startup / model-loading phase."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Dict] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a phase and record whether it succeeded.
+
+        Args:
+            name: Phase name, e.g. "embedding_model"
+        """
+        started_at = time.perf_counter()
+        self.mark_loading(name)
+        try:
+            yield
+        except Exception as e:
+            self.record(name, time.perf_counter() - started_at, PHASE_FAILED, str(e))
+            raise
+        self.record(name, time.perf_counter() - started_at, PHASE_READY)
+
+    def mark_loading(self, name: str):
+        """Record that a phase has started."""
+        with self._lock:
+            self._phases[name] = {"status": PHASE_LOADING, "seconds": None, "error": None}
+
+    def record(self, name: str, seconds: float, status: str = PHASE_READY, error: Optional[str] = None):
+        """Record a finished phase."""
+        with self._lock:
+            self._phases[name] = {"status": status, "seconds": round(seconds, 3), "error": error}
+        logger.info(f"Startup phase '{name}' {status} in {seconds:.2f}s")
+
+    def status(self, name: str) -> str:
+        """Get the status of a phase."""
+        with self._lock:
+            return self._phases.get(name, {}).get("status", PHASE_PENDING)
+
+    def report(self) -> Dict[str, Dict]:
+        """Get every recorded phase."""
+        with self._lock:
+            return {name: dict(phase) for name, phase in self._phases.items()}
+
+# Global instance
+startup_tracker = StartupTracker()
@@ -1,84 +1,357 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, List, Dict, Optional, Tuple
 from config import settings
+from services.response_cache import response_cache
+from services.startup import startup_tracker
 import logging
+import threading
+import uuid
 
 logger = logging.getLogger(__name__)
 
 class VectorStoreService:
+    """
+    ChromaDB vector store with cached embeddings and a BM25 lexical index.
+    
+    The embedding model and the Chroma client are loaded on first use (or by
+    warm_up()), so importing this module stays cheap and does not pull in
+    torch or sentence-transformers. The lexical index is kept in step with
+    the collection on every add, delete and clear.
+    """
+    
     def __init__(self):
-        """Initialize the vector store with ChromaDB and embeddings."""
-        self.embedding_model = HuggingFaceEmbeddings(
+        """Set up lazy initialization; nothing heavy is loaded here."""
+        self._init_lock = threading.RLock()
+        self._embedding_model = None
+        self._preloaded_encoder = None
+        self._chunk_store = None
+        self._chroma_client = None
+        self._text_splitter = None
+        self._chunker = None
+        self._lexical_index = None
+    
+    def _load_encoder(self):
+        from services.embeddings import SentenceTransformerEmbeddings
+        
+        return SentenceTransformerEmbeddings(
             model_name=settings.EMBEDDING_MODEL,
-            model_kwargs={'device': 'cpu'}
+            backend=settings.EMBEDDING_BACKEND,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            threads=settings.EMBEDDING_THREADS
         )
+    
+    def preload_model(self):
+        """
+        Load only the embedding model weights (no database connections or threads).
         
-        self.chroma_client = chromadb.PersistentClient(
-            path=str(settings.CHROMA_DB_DIR)
-        )
+        Used by the prefork server before forking workers, which then share
+        the weights copy-on-write and open their own stores. ONNX Runtime
+        sessions don't survive fork (their thread pools stay behind in the
+        parent), so with the onnx backend each worker loads its own.
+        """
+        from services.embeddings import EMBEDDING_BACKEND_ONNX
         
-        self.vectorstore = Chroma(
-            client=self.chroma_client,
-            collection_name=settings.COLLECTION_NAME,
-            embedding_function=self.embedding_model
-        )
+        if settings.EMBEDDING_BACKEND == EMBEDDING_BACKEND_ONNX:
+            logger.info("Not preloading the ONNX embedding model; each worker loads its own")
+            return
+        with self._init_lock:
+            if self._preloaded_encoder is None and self._embedding_model is None:
+                self._preloaded_encoder = self._load_encoder()
+    
+    def _initialize_embeddings(self):
+        """Load the embedding model and chunk embedding store."""
+        from services.embeddings import CachedEmbeddings, ChunkEmbeddingStore, chunk_store_model_key
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP,
-            length_function=len,
-        )
+        with startup_tracker.phase("embedding_model"):
+            # Query vectors are cached, so repeated questions skip re-encoding
+            # on both the retriever and the direct search paths. Chunk vectors
+            # are stored by content, so duplicate uploads skip re-embedding.
+            self._chunk_store = ChunkEmbeddingStore(
+                db_path=settings.CHROMA_DB_DIR / "chunk_embeddings.sqlite3",
+                model_name=chunk_store_model_key(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND)
+            )
+            self._embedding_model = CachedEmbeddings(
+                self._preloaded_encoder or self._load_encoder(),
+                max_size_mb=settings.QUERY_EMBEDDING_CACHE_MB,
+                chunk_store=self._chunk_store
+            )
+    
+    def _initialize_chroma(self):
+        """Open the persistent Chroma client."""
+        import chromadb
+        
+        with startup_tracker.phase("vector_store"):
+            self._chroma_client = chromadb.PersistentClient(
+                path=str(settings.CHROMA_DB_DIR)
+            )
+            logger.info("Vector store initialized successfully")
+    
+    def _ensure_embeddings(self):
+        """Load the embedding model and chunk store if they are not loaded yet."""
+        if self._embedding_model is None:
+            with self._init_lock:
+                if self._embedding_model is None:
+                    self._initialize_embeddings()
+    
+    @property
+    def embedding_model(self):
+        self._ensure_embeddings()
+        return self._embedding_model
+    
+    @property
+    def chunk_store(self):
+        # Created together with the embedding model
+        self._ensure_embeddings()
+        return self._chunk_store
+    
+    @property
+    def chroma_client(self):
+        if self._chroma_client is None:
+            with self._init_lock:
+                if self._chroma_client is None:
+                    self._initialize_chroma()
+        return self._chroma_client
+    
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            with self._init_lock:
+                if self._text_splitter is None:
+                    from langchain.text_splitter import RecursiveCharacterTextSplitter
+                    
+                    self._text_splitter = RecursiveCharacterTextSplitter(
+                        chunk_size=settings.CHUNK_SIZE,
+                        chunk_overlap=settings.CHUNK_OVERLAP,
+                        length_function=len,
+                        add_start_index=True,
+                    )
+        return self._text_splitter
+    
+    @property
+    def chunker(self):
+        if self._chunker is None:
+            from services.chunking import StreamingChunker
+            
+            self._chunker = StreamingChunker(self.text_splitter, settings.CHUNK_SIZE)
+        return self._chunker
+    
+    @property
+    def collection(self):
+        """The Chroma collection holding document chunks."""
+        return self.chroma_client.get_or_create_collection(settings.COLLECTION_NAME)
+    
+    @property
+    def lexical_index(self):
+        if self._lexical_index is None:
+            with self._init_lock:
+                if self._lexical_index is None:
+                    self._lexical_index = self._load_lexical_index()
+        return self._lexical_index
+    
+    def _load_lexical_index(self):
+        """Load the persisted lexical index, rebuilding it if it is missing or out of date."""
+        from services.lexical_index import LexicalIndex
         
-        logger.info("Vector store initialized successfully")
+        with startup_tracker.phase("lexical_index"):
+            index = LexicalIndex(settings.CHROMA_DB_DIR / "lexical_index.bin")
+            index.load()
+            collection = self.collection
+            if index.count != collection.count():
+                logger.info("Rebuilding lexical index from the vector store")
+                index.clear()
+                page_size = 1000
+                for offset in range(0, collection.count(), page_size):
+                    page = collection.get(
+                        limit=page_size,
+                        offset=offset,
+                        include=["documents", "metadatas"]
+                    )
+                    index.add(
+                        page['ids'],
+                        page['documents'],
+                        [(m or {}).get('file_id') for m in page['metadatas']]
+                    )
+                index.save()
+        return index
+    
+    @property
+    def is_ready(self) -> bool:
+        """Whether the embedding model and Chroma client are loaded."""
+        return self._embedding_model is not None and self._chroma_client is not None
+    
+    def get_embedding_cache_metrics(self) -> Optional[Dict]:
+        """Get query embedding cache metrics, without loading the model."""
+        if self._embedding_model is None:
+            return None
+        return self._embedding_model.get_metrics()
     
-    def add_documents(self, texts: List[str], metadatas: List[Dict]) -> List[str]:
+    def warm_up(self):
+        """Load everything and run one query encoding so the first request is fast."""
+        self.collection
+        self.lexical_index
+        self.embedding_model.base.embed_query("warm-up")
+    
+    def add_chunks(
+        self,
+        chunks: List[str],
+        chunk_metadatas: List[Dict],
+        batch_size: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        save_index: bool = True
+    ) -> Dict:
         """
-        Add documents to the vector store.
+        Embed already-split chunks and insert them into the collection.
+        
+        Chunks whose text was embedded before (by the same model) reuse the
+        stored vector instead of being embedded again.
         
         Args:
-            texts: List of document texts
-            metadatas: List of metadata dictionaries for each document
+            chunks: Chunk texts
+            chunk_metadatas: Metadata for each chunk
+            batch_size: Chunks embedded and inserted per batch (all at once if None)
+            progress: Optional callback receiving (chunks_done, chunks_total)
+            save_index: Persist the lexical index afterwards (bulk callers save once at the end)
             
         Returns:
-            List of document IDs
+            Dictionary with chunk IDs and counts of cached vs newly embedded chunks
         """
-        try:
-            # Split texts into chunks
-            chunks = []
-            chunk_metadatas = []
-            
-            for text, metadata in zip(texts, metadatas):
-                text_chunks = self.text_splitter.split_text(text)
-                chunks.extend(text_chunks)
-                
-                # Add chunk index to metadata
-                for i, _ in enumerate(text_chunks):
-                    chunk_metadata = metadata.copy()
-                    chunk_metadata['chunk_index'] = i
-                    chunk_metadatas.append(chunk_metadata)
-            
-            # Add to vector store
-            ids = self.vectorstore.add_texts(
-                texts=chunks,
-                metadatas=chunk_metadatas
+        ids = []
+        cached = 0
+        batch_size = batch_size or max(len(chunks), 1)
+        collection = self.chroma_client.get_or_create_collection(settings.COLLECTION_NAME)
+        
+        for start in range(0, len(chunks), batch_size):
+            end = start + batch_size
+            batch_ids, batch_cached = self._embed_and_insert(
+                collection, chunks[start:end], chunk_metadatas[start:end]
             )
+            ids.extend(batch_ids)
+            cached += batch_cached
             
-            logger.info(f"Added {len(chunks)} chunks to vector store")
-            return ids
+            if progress:
+                progress(min(end, len(chunks)), len(chunks))
+        
+        if save_index:
+            self.lexical_index.save()
+        logger.info(
+            f"Added {len(chunks)} chunks to vector store "
+            f"({cached} cached, {len(chunks) - cached} newly embedded)"
+        )
+        
+        # Answers generated from replaced chunks of these files are stale
+        response_cache.invalidate_files(
+            {m['file_id'] for m in chunk_metadatas if 'file_id' in m}
+        )
+        return {
+            'ids': ids,
+            'chunks': len(chunks),
+            'cached': cached,
+            'embedded': len(chunks) - cached
+        }
+    
+    def add_document_stream(
+        self,
+        segments: Iterable[Tuple[str, Dict]],
+        metadata: Dict,
+        batch_size: int,
+        progress: Optional[Callable[[int], None]] = None
+    ) -> Dict:
+        """
+        Chunk, embed and insert a document from a stream of text segments.
+        
+        Chunks are produced incrementally (with CHUNK_SIZE/CHUNK_OVERLAP)
+        and embedded and inserted in batches of
+        batch_size, so memory stays bounded for huge documents and the first
+        chunks become searchable before the whole file has been processed.
+        
+        Args:
+            segments: (text, metadata) pairs such as pages, paragraphs or sheet rows;
+                segment metadata (e.g. page) is copied onto chunks starting in it
+            metadata: Document metadata added to every chunk
+            batch_size: Chunks embedded and inserted per batch
+            progress: Optional callback receiving the number of chunks inserted so far
             
-        except Exception as e:
-            logger.error(f"Error adding documents to vector store: {e}")
-            raise
+        Returns:
+            Dictionary with chunk IDs, counts of cached vs newly embedded chunks
+            and the number of characters chunked
+        """
+        collection = self.chroma_client.get_or_create_collection(settings.COLLECTION_NAME)
+        ids = []
+        cached = 0
+        characters = 0
+        batch_chunks: List[str] = []
+        batch_metadatas: List[Dict] = []
+        
+        def flush():
+            nonlocal cached
+            batch_ids, batch_cached = self._embed_and_insert(collection, batch_chunks, batch_metadatas)
+            ids.extend(batch_ids)
+            cached += batch_cached
+            batch_chunks.clear()
+            batch_metadatas.clear()
+            if progress:
+                progress(len(ids))
+        
+        for chunk, segment_metadata in self.chunker.chunks(segments):
+            chunk_metadata = {**metadata, **segment_metadata, 'chunk_index': len(ids) + len(batch_chunks)}
+            batch_chunks.append(chunk)
+            batch_metadatas.append(chunk_metadata)
+            characters += len(chunk)
+            if len(batch_chunks) >= batch_size:
+                flush()
+        
+        if batch_chunks:
+            flush()
+        
+        self.lexical_index.save()
+        logger.info(
+            f"Streamed {len(ids)} chunks into vector store "
+            f"({cached} cached, {len(ids) - cached} newly embedded)"
+        )
+        
+        if 'file_id' in metadata:
+            response_cache.invalidate_files([metadata['file_id']])
+        return {
+            'ids': ids,
+            'chunks': len(ids),
+            'cached': cached,
+            'embedded': len(ids) - cached,
+            'characters': characters
+        }
+    
+    def _embed_and_insert(
+        self,
+        collection,
+        chunks: List[str],
+        chunk_metadatas: List[Dict]
+    ) -> Tuple[List[str], int]:
+        """
+        Embed one batch of chunks and insert it into the collection.
+        
+        Returns:
+            Tuple of (inserted chunk IDs, number of vectors reused from the chunk store)
+        """
+        if not chunks:
+            return [], 0
+        
+        # Embed, reusing stored vectors for chunks seen before
+        embeddings, cached = self.embedding_model.embed_documents_with_stats(chunks)
+        
+        ids = [str(uuid.uuid4()) for _ in chunks]
+        collection.add(
+            ids=ids,
+            embeddings=[vector.tolist() for vector in embeddings],
+            metadatas=chunk_metadatas,
+            documents=chunks
+        )
+        self.lexical_index.add(ids, chunks, [m.get('file_id') for m in chunk_metadatas])
+        return ids, cached
     
     def similarity_search(
         self, 
         query: str, 
         k: int = 5,
-        filter: Optional[Dict] = None
+        filter: Optional[Dict] = None,
+        mode: Optional[str] = None
     ) -> List[Dict]:
         """
         Search for similar documents.
@@ -87,31 +360,103 @@ class VectorStoreService:
             query: Search query
             k: Number of results to return
             filter: Optional metadata filter
+            mode: "vector", "lexical" (BM25, no embedding call) or "hybrid"
+                (both, fused by reciprocal rank); defaults to SEARCH_MODE
             
         Returns:
             List of documents with scores
         """
+        mode = (mode or settings.SEARCH_MODE).lower()
         try:
-            results = self.vectorstore.similarity_search_with_score(
-                query=query,
-                k=k,
-                filter=filter
-            )
-            
-            formatted_results = []
-            for doc, score in results:
-                formatted_results.append({
-                    'content': doc.page_content,
-                    'metadata': doc.metadata,
-                    'similarity_score': float(score)
-                })
-            
-            return formatted_results
+            if mode == "lexical":
+                return self._lexical_search(query, k, filter)
+            if mode == "hybrid":
+                return self._hybrid_search(query, k, filter)
+            return self._vector_search(query, k, filter)
             
         except Exception as e:
             logger.error(f"Error performing similarity search: {e}")
             raise
     
+    def _vector_search(self, query: str, k: int, filter: Optional[Dict] = None) -> List[Dict]:
+        """Dense search; 'similarity_score' is the vector distance (lower is closer)."""
+        collection = self.collection
+        if collection.count() == 0:
+            return []
+        
+        results = collection.query(
+            query_embeddings=[self.embedding_model.embed_query(query)],
+            n_results=k,
+            where=filter,
+            include=["documents", "metadatas", "distances"]
+        )
+        
+        formatted_results = []
+        for chunk_id, content, metadata, distance in zip(
+            results['ids'][0],
+            results['documents'][0],
+            results['metadatas'][0],
+            results['distances'][0]
+        ):
+            formatted_results.append({
+                'id': chunk_id,
+                'content': content,
+                'metadata': metadata or {},
+                'similarity_score': float(distance)
+            })
+        
+        return formatted_results
+    
+    def _lexical_search(self, query: str, k: int, filter: Optional[Dict] = None) -> List[Dict]:
+        """BM25 search over the lexical index; 'bm25_score' is higher for better matches."""
+        # Over-fetch when filtering, since the index doesn't know chunk metadata
+        hits = self.lexical_index.search(query, k * 4 if filter else k)
+        if not hits:
+            return []
+        
+        chunks = self.collection.get(
+            ids=[chunk_id for chunk_id, _ in hits],
+            where=filter,
+            include=["documents", "metadatas"]
+        )
+        found = {
+            chunk_id: (content, metadata)
+            for chunk_id, content, metadata in zip(chunks['ids'], chunks['documents'], chunks['metadatas'])
+        }
+        
+        formatted_results = []
+        for chunk_id, score in hits:
+            if chunk_id not in found:
+                continue
+            content, metadata = found[chunk_id]
+            formatted_results.append({
+                'id': chunk_id,
+                'content': content,
+                'metadata': metadata or {},
+                'bm25_score': score
+            })
+            if len(formatted_results) >= k:
+                break
+        
+        return formatted_results
+    
+    def _hybrid_search(self, query: str, k: int, filter: Optional[Dict] = None) -> List[Dict]:
+        """Fuse dense and BM25 rankings with reciprocal rank fusion."""
+        candidates = k * settings.HYBRID_CANDIDATE_MULTIPLIER
+        rankings = [
+            self._vector_search(query, candidates, filter),
+            self._lexical_search(query, candidates, filter)
+        ]
+        
+        fused: Dict[str, Dict] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking):
+                entry = fused.setdefault(result['id'], {**result, 'fusion_score': 0.0})
+                entry.update({key: value for key, value in result.items() if key.endswith('_score')})
+                entry['fusion_score'] += 1.0 / (settings.HYBRID_RRF_K + rank + 1)
+        
+        return sorted(fused.values(), key=lambda r: r['fusion_score'], reverse=True)[:k]
+    
     def delete_documents(self, file_id: str) -> bool:
         """
         Delete all chunks associated with a file.
@@ -131,6 +476,10 @@ class VectorStoreService:
                 where={"file_id": file_id}
             )
             
+            response_cache.invalidate_files([file_id])
+            self.lexical_index.delete_file(file_id)
+            self.lexical_index.save()
+            
             if results['ids']:
                 collection.delete(ids=results['ids'])
                 logger.info(f"Deleted {len(results['ids'])} chunks for file {file_id}")
@@ -143,31 +492,22 @@ class VectorStoreService:
             logger.error(f"Error deleting documents: {e}")
             raise
     
-    def get_all_documents(self) -> List[Dict]:
-        """Get all documents in the vector store."""
-        try:
-            collection = self.chroma_client.get_collection(settings.COLLECTION_NAME)
-            results = collection.get()
-            
-            documents = []
-            for i, doc_id in enumerate(results['ids']):
-                documents.append({
-                    'id': doc_id,
-                    'content': results['documents'][i] if results['documents'] else '',
-                    'metadata': results['metadatas'][i] if results['metadatas'] else {}
-                })
-            
-            return documents
-            
-        except Exception as e:
-            logger.error(f"Error getting all documents: {e}")
-            return []
+    def iter_chunk_metadatas(self, page_size: int = 1000) -> Iterable[Dict]:
+        """Yield the metadata of every chunk, a page at a time and without chunk text."""
+        collection = self.collection
+        for offset in range(0, collection.count(), page_size):
+            page = collection.get(limit=page_size, offset=offset, include=["metadatas"])
+            for metadata in page['metadatas']:
+                yield metadata or {}
     
     def clear_collection(self) -> bool:
         """Clear all documents from the collection."""
         try:
             self.chroma_client.delete_collection(settings.COLLECTION_NAME)
             self.chroma_client.create_collection(settings.COLLECTION_NAME)
+            self.lexical_index.clear()
+            self.lexical_index.save()
+            response_cache.clear()
             logger.info("Collection cleared successfully")
             return True
         except Exception as e:
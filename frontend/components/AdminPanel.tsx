@@ -1,7 +1,7 @@
 'use client'
 
 import { useState, useRef } from 'react'
-import { loginAdmin, uploadDocument, getDocuments, deleteDocument } from '@/utils/api'
+import { loginAdmin, uploadDocument, getUploadJob, getDocuments, deleteDocument } from '@/utils/api'
 import styles from './AdminPanel.module.css'
 
 interface Document {
@@ -17,6 +17,7 @@ export default function AdminPanel() {
   const [username, setUsername] = useState('')
   const [password, setPassword] = useState('')
   const [documents, setDocuments] = useState<Document[]>([])
+  const [totalDocuments, setTotalDocuments] = useState(0)
   const [uploading, setUploading] = useState(false)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
@@ -45,11 +46,21 @@ export default function AdminPanel() {
     try {
       const response = await getDocuments()
       setDocuments(response.documents)
+      setTotalDocuments(response.total)
     } catch (error) {
       console.error('Error loading documents:', error)
     }
   }
 
+  const waitForIngestion = async (jobId: string) => {
+    while (true) {
+      const job = await getUploadJob(jobId)
+      if (job.status === 'completed') return
+      if (job.status === 'failed') throw new Error(job.error || 'Error processing file')
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+    }
+  }
+
   const handleFileUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0]
     if (!file) return
@@ -58,13 +69,16 @@ export default function AdminPanel() {
     setError('')
 
     try {
-      await uploadDocument(file)
+      const upload = await uploadDocument(file)
+      if (upload.job_id) {
+        await waitForIngestion(upload.job_id)
+      }
       if (fileInputRef.current) {
         fileInputRef.current.value = ''
       }
       loadDocuments()
     } catch (error: any) {
-      setError(error.response?.data?.detail || 'Error uploading file')
+      setError(error.response?.data?.detail || error.message || 'Error uploading file')
       console.error('Upload error:', error)
     } finally {
       setUploading(false)
@@ -156,7 +170,7 @@ export default function AdminPanel() {
 
       <div className={styles.documentsSection}>
         <h2>Uploaded Documents</h2>
-        <p className={styles.subtitle}>Total: {documents.length} documents</p>
+        <p className={styles.subtitle}>Total: {totalDocuments} documents</p>
 
         {documents.length === 0 ? (
           <div className={styles.emptyState}>
@@ -50,8 +50,15 @@ export const uploadDocument = async (file: File) => {
   return response.data
 }
 
-export const getDocuments = async () => {
-  const response = await api.get('/api/documents/list')
+export const getUploadJob = async (jobId: string) => {
+  const response = await api.get(`/api/documents/jobs/${jobId}`)
+  return response.data
+}
+
+export const getDocuments = async (
+  params: { offset?: number; limit?: number; sort?: string; order?: 'asc' | 'desc' } = {}
+) => {
+  const response = await api.get('/api/documents/list', { params })
   return response.data
 }
 